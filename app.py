@@ -5,8 +5,9 @@
 
 import os
 import atexit
-from app import create_app, db
+from app import create_app
 from app.services.scheduler import MonitorScheduler
+from config.config import Config
 
 # 创建Flask应用
 app = create_app()
@@ -14,12 +15,6 @@ app = create_app()
 # 创建调度器实例
 scheduler = MonitorScheduler(app)
 
-def init_database():
-    """初始化数据库"""
-    with app.app_context():
-        db.create_all()
-        print("Database initialized successfully")
-
 def start_monitoring():
     """启动监控调度器"""
     try:
@@ -40,11 +35,10 @@ def stop_monitoring():
 atexit.register(stop_monitoring)
 
 if __name__ == '__main__':
-    # 初始化数据库
-    init_database()
-
-    # 启动监控
-    start_monitoring()
+    # 数据库结构由迁移维护，启动前先执行 flask --app app db upgrade
+    # 启动监控（web模式下由独立的coordinator和worker进程执行）
+    if Config.MONITOR_MODE == 'embedded':
+        start_monitoring()
 
     # 运行Flask应用
     app.run(
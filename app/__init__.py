@@ -1,18 +1,48 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event
 from config.config import Config
 import json
 
 db = SQLAlchemy()
 migrate = Migrate()
 
+# SQLite允许的同步级别
+SQLITE_SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def configure_sqlite(engine, config):
+    """为SQLite的每个新连接设置WAL模式、同步级别和写锁等待时间"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    synchronous = config['SQLITE_SYNCHRONOUS']
+    if synchronous not in SQLITE_SYNCHRONOUS_LEVELS:
+        synchronous = 'NORMAL'
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL模式下写入不阻塞读取，检查进程批量写入时Web请求仍可查询
+        if config['SQLITE_WAL']:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        # WAL模式下NORMAL只在检查点同步磁盘，崩溃时最多丢失最后提交的事务，不会损坏数据库
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}")
+        cursor.close()
+
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
     db.init_app(app)
-    migrate.init_app(app, db)
+    # SQLite不支持大部分ALTER TABLE，自动生成的迁移使用批量模式（重建表）
+    migrate.init_app(app, db, render_as_batch=True)
+
+    with app.app_context():
+        configure_sqlite(db.engine, app.config)
 
     # 注册自定义过滤器
     @app.template_filter('from_json')
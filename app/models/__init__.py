@@ -1,5 +1,9 @@
 from .website import Website
 from .change_record import ChangeRecord
 from .keyword import Keyword
+from .snapshot import Snapshot
+from .notification_outbox import NotificationOutbox, NotificationSend
+from .check_history import CheckResult, CheckRollup, RollupWatermark
+from .check_job import CheckJob
 
-__all__ = ['Website', 'ChangeRecord', 'Keyword']
\ No newline at end of file
+__all__ = ['Website', 'ChangeRecord', 'Keyword', 'Snapshot', 'NotificationOutbox', 'NotificationSend', 'CheckResult', 'CheckRollup', 'RollupWatermark', 'CheckJob']
\ No newline at end of file
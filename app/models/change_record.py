@@ -8,12 +8,21 @@ class ChangeRecord(db.Model):
     website_id = db.Column(db.Integer, db.ForeignKey('websites.id'), nullable=False)
     change_type = db.Column(db.String(50), default='content_changed')  # content_changed, keyword_matched
     content_before = db.Column(db.Text)
-    content_after = db.Column(db.Text)
+    content_after = db.Column(db.Text)  # 内容预览，完整内容见快照
     diff_content = db.Column(db.Text)  # 存储差异内容
     matched_keywords = db.Column(db.Text)  # 匹配的关键词，JSON格式存储
-    notification_sent = db.Column(db.Boolean, default=False)
+    notification_sent = db.Column(db.Boolean, default=False)  # 由通知分发器在实际送达后更新
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # 按网站查看变化历史，以及全局按时间倒序的游标分页
+        db.Index('ix_change_records_website_id_created_at', 'website_id', 'created_at'),
+        db.Index('ix_change_records_created_at', 'created_at'),
+    )
+
+    # 关联关系
+    notifications = db.relationship('NotificationOutbox', backref='change_record', lazy=True, cascade='all, delete-orphan')
+
     def __repr__(self):
         return f'<ChangeRecord {self.id}: {self.change_type}>'
 
@@ -26,4 +35,18 @@ class ChangeRecord(db.Model):
             'matched_keywords': self.matched_keywords,
             'notification_sent': self.notification_sent,
             'created_at': self.created_at.isoformat()
+        }
+
+    def to_log_dict(self):
+        """日志页面和实时事件使用的格式"""
+        return {
+            'id': self.id,
+            'website_id': self.website_id,
+            'timestamp': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else '',
+            'website_name': self.website.name,
+            'website_url': self.website.url,
+            'change_type': self.change_type,
+            'notification_sent': self.notification_sent,
+            'matched_keywords': self.matched_keywords,
+            'created_at_iso': self.created_at.isoformat() if self.created_at else ''
         }
\ No newline at end of file
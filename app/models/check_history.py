@@ -0,0 +1,62 @@
+from datetime import datetime
+from app import db
+
+class CheckResult(db.Model):
+    """每次检查的原始结果，只追加写入，按保留期删除"""
+    __tablename__ = 'check_results'
+
+    id = db.Column(db.Integer, primary_key=True)
+    website_id = db.Column(db.Integer, nullable=False)
+    checked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    ok = db.Column(db.Boolean, nullable=False)
+    changed = db.Column(db.Boolean, default=False)
+    status_code = db.Column(db.SmallInteger)
+    latency_ms = db.Column(db.Integer)  # 完整响应耗时
+    ttfb_ms = db.Column(db.Integer)  # 首字节耗时
+    bytes = db.Column(db.Integer)
+    error_class = db.Column(db.String(50))  # 异常类型，如ConnectTimeout、HTTP 503
+    rolled_up = db.Column(db.Boolean, default=False, server_default=db.false())  # 是否已累加到汇总表
+
+    __table_args__ = (
+        db.Index('ix_check_results_website_id_checked_at', 'website_id', 'checked_at'),
+        db.Index('ix_check_results_rolled_up_id', 'rolled_up', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<CheckResult {self.website_id} @ {self.checked_at}: {"ok" if self.ok else self.error_class}>'
+
+
+class CheckRollup(db.Model):
+    """按分钟/小时/天汇总的检查统计，延迟分布以固定分桶的直方图保存"""
+    __tablename__ = 'check_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    website_id = db.Column(db.Integer, nullable=False)
+    resolution = db.Column(db.String(10), nullable=False)  # minute, hour, day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    checks = db.Column(db.Integer, default=0)
+    successes = db.Column(db.Integer, default=0)
+    changes = db.Column(db.Integer, default=0)
+    latency_count = db.Column(db.Integer, default=0)
+    latency_sum = db.Column(db.BigInteger, default=0)
+    latency_max = db.Column(db.Integer, default=0)
+    ttfb_sum = db.Column(db.BigInteger, default=0)
+    bytes_sum = db.Column(db.BigInteger, default=0)
+    latency_histogram = db.Column(db.Text)  # 各延迟分桶的计数，JSON数组
+    errors = db.Column(db.Text)  # 各错误类型的次数，JSON对象
+
+    __table_args__ = (
+        db.UniqueConstraint('website_id', 'resolution', 'bucket_start', name='uq_check_rollups_bucket'),
+        db.Index('ix_check_rollups_resolution_bucket_start', 'resolution', 'bucket_start'),
+    )
+
+    def __repr__(self):
+        return f'<CheckRollup {self.website_id} {self.resolution} {self.bucket_start}>'
+
+
+class RollupWatermark(db.Model):
+    """旧版本的汇总进度（已汇总到的原始结果ID），升级后迁移为rolled_up标记"""
+    __tablename__ = 'rollup_watermarks'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,34 @@
+from datetime import datetime
+from app import db
+
+class CheckJob(db.Model):
+    """手动检查任务，由调度器或worker在领取网站时执行"""
+    __tablename__ = 'check_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    website_id = db.Column(db.Integer, db.ForeignKey('websites.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    outcome = db.Column(db.String(20))  # changed, unchanged, failed
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_check_jobs_website_status', 'website_id', 'status'),
+    )
+
+    def __repr__(self):
+        return f'<CheckJob {self.id}: {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'website_id': self.website_id,
+            'status': self.status,
+            'outcome': self.outcome,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -5,8 +5,10 @@ class Keyword(db.Model):
     __tablename__ = 'keywords'
 
     id = db.Column(db.Integer, primary_key=True)
-    website_id = db.Column(db.Integer, db.ForeignKey('websites.id'), nullable=False)
+    website_id = db.Column(db.Integer, db.ForeignKey('websites.id'), nullable=False, index=True)
     keyword = db.Column(db.String(100), nullable=False)
+    match_mode = db.Column(db.String(20), default='plain', server_default='plain')  # plain子串, word整词, regex正则
+    case_sensitive = db.Column(db.Boolean, default=False, server_default=db.false())
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -17,6 +19,8 @@ class Keyword(db.Model):
         return {
             'id': self.id,
             'keyword': self.keyword,
+            'match_mode': self.match_mode or 'plain',
+            'case_sensitive': bool(self.case_sensitive),
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat()
         }
\ No newline at end of file
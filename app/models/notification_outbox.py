@@ -0,0 +1,33 @@
+from datetime import datetime
+from app import db
+
+class NotificationOutbox(db.Model):
+    __tablename__ = 'notification_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    change_record_id = db.Column(db.Integer, db.ForeignKey('change_records.id'), nullable=False, index=True)
+    website_id = db.Column(db.Integer, db.ForeignKey('websites.id'), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # 通知内容，JSON格式存储
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)  # 下次可发送时间，发送中时为租约到期时间
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+        db.Index('ix_notification_outbox_sent_at', 'sent_at'),
+    )
+
+    def __repr__(self):
+        return f'<NotificationOutbox {self.id}: {self.status}>'
+
+
+class NotificationSend(db.Model):
+    """Webhook发送额度的占用记录，多个进程共用同一限流窗口"""
+    __tablename__ = 'notification_sends'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sent_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    slots = db.Column(db.Integer, nullable=False, default=1)  # 占用的额度数，服务端限流时占满整个窗口
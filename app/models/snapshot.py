@@ -0,0 +1,15 @@
+from datetime import datetime
+from app import db
+
+class Snapshot(db.Model):
+    __tablename__ = 'snapshots'
+
+    content_hash = db.Column(db.String(64), primary_key=True)  # 内容SHA256，相同内容跨网站共用
+    codec = db.Column(db.String(10), nullable=False, default='zlib')  # 压缩方式：zlib / zstd
+    body = db.Column(db.LargeBinary, nullable=False)  # 压缩后的完整内容
+    size = db.Column(db.Integer)  # 压缩前字节数
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<Snapshot {self.content_hash[:12]}: {self.size} bytes>'
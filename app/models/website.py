@@ -1,22 +1,43 @@
 from datetime import datetime
 from app import db
+from config.config import Config
 
 class Website(db.Model):
     __tablename__ = 'websites'
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    url = db.Column(db.String(500), nullable=False, unique=True)
+    url = db.Column(db.String(500), nullable=False, index=True)  # 多个网站可以监控同一URL，抓取时合并
     check_interval = db.Column(db.Integer, default=300)  # 检查间隔(秒)
     is_active = db.Column(db.Boolean, default=True)
-    last_checked = db.Column(db.DateTime)
+    render_js = db.Column(db.Boolean, default=False, server_default=db.false())  # 是否使用浏览器渲染JS后再检测
+    wait_selector = db.Column(db.String(200))  # 渲染时等待出现的CSS选择器
+    dom_idle_ms = db.Column(db.Integer)  # 渲染时DOM静止多少毫秒视为加载完成
+    content_selector = db.Column(db.String(200))  # 只监控该CSS选择器匹配的区域
+    ignore_selectors = db.Column(db.Text)  # 忽略的CSS选择器，每行一个
+    ignore_patterns = db.Column(db.Text)  # 忽略的正则表达式，每行一个
+    last_checked = db.Column(db.DateTime, index=True)  # 实时事件流按该列读取最近的检查
     last_content_hash = db.Column(db.String(64))
+    last_raw_hash = db.Column(db.String(64))  # 上次响应原始字节的哈希，相同时跳过规范化和对比
+    hash_range = db.Column(db.String(50))  # 只对该字节范围计算原始哈希，如 0-65536
+    etag = db.Column(db.String(255))  # 服务器返回的ETag，用于条件请求
+    last_modified = db.Column(db.String(64))  # 服务器返回的Last-Modified
+    keywords_updated_at = db.Column(db.DateTime)  # 关键词最后修改时间，用于匹配器缓存失效
+    adaptive_interval = db.Column(db.Boolean, default=False, server_default=db.false())  # 按观察到的变化频率自动调整检查间隔
+    min_interval = db.Column(db.Integer)  # 自适应间隔下限(秒)，为空使用全局配置
+    max_interval = db.Column(db.Integer)  # 自适应间隔上限(秒)，为空使用全局配置
+    effective_interval = db.Column(db.Integer)  # 自适应模式当前使用的间隔(秒)
+    consecutive_failures = db.Column(db.Integer, default=0, server_default='0')  # 连续检查失败次数，用于退避和熔断
+    next_check_at = db.Column(db.DateTime, index=True)  # 下次检查时间，为空表示立即检查
+    lease_owner = db.Column(db.String(100))  # 正在检查该网站的进程
+    lease_expires_at = db.Column(db.DateTime)  # 租约过期时间，过期后可被其他进程领取
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # 关联关系
     change_records = db.relationship('ChangeRecord', backref='website', lazy=True, cascade='all, delete-orphan')
     keywords = db.relationship('Keyword', backref='website', lazy=True, cascade='all, delete-orphan')
+    check_jobs = db.relationship('CheckJob', backref='website', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Website {self.name}: {self.url}>'
@@ -28,6 +49,20 @@ class Website(db.Model):
             'url': self.url,
             'check_interval': self.check_interval,
             'is_active': self.is_active,
+            'render_js': bool(self.render_js),
+            'wait_selector': self.wait_selector,
+            'dom_idle_ms': self.dom_idle_ms,
+            'content_selector': self.content_selector,
+            'ignore_selectors': self.ignore_selectors,
+            'ignore_patterns': self.ignore_patterns,
+            'hash_range': self.hash_range,
+            'adaptive_interval': bool(self.adaptive_interval),
+            'min_interval': self.min_interval,
+            'max_interval': self.max_interval,
+            'effective_interval': self.effective_interval,
+            'consecutive_failures': self.consecutive_failures or 0,
+            'circuit_open': (self.consecutive_failures or 0) >= Config.CIRCUIT_BREAKER_THRESHOLD,
+            'next_check_at': self.next_check_at.isoformat() if self.next_check_at else None,
             'last_checked': self.last_checked.isoformat() if self.last_checked else None,
             'created_at': self.created_at.isoformat(),
             'keywords': [kw.to_dict() for kw in self.keywords]
@@ -1,13 +1,47 @@
-from flask import jsonify, request
+from flask import Response, current_app, jsonify, request
 from app.routes import main_bp
 from app import db
-from app.models import Website, ChangeRecord, Keyword
-from app.services.monitor import WebsiteMonitor
+from sqlalchemy.orm import selectinload
+from app.models import Website, ChangeRecord, Keyword, CheckJob
+from app.services.scheduler import request_checks, reschedule_website, unschedule_website
+from app.services.keyword_matcher import MATCH_MODES
+from app.services.adaptive import parse_schedule
+from app.services.stats import get_stats
+from app.services.event_bus import format_sse, get_event_bus
+from app.services.metrics import CONTENT_TYPE, get_metrics
+from app.services.check_history import get_check_history, parse_window
+from app.utils.http import conditional_json
+from app.utils.pagination import keyset_paginate
+from datetime import datetime
+
+def _add_keywords(website, keywords):
+    """添加关键词，每项可以是字符串或包含keyword/match_mode/case_sensitive的对象"""
+    for item in keywords:
+        if isinstance(item, dict):
+            keyword_text = (item.get('keyword') or '').strip()
+            match_mode = item.get('match_mode', 'plain')
+            case_sensitive = bool(item.get('case_sensitive', False))
+        else:
+            keyword_text = item.strip()
+            match_mode = 'plain'
+            case_sensitive = False
+
+        if keyword_text:
+            keyword = Keyword(
+                website_id=website.id,
+                keyword=keyword_text,
+                match_mode=match_mode if match_mode in MATCH_MODES else 'plain',
+                case_sensitive=case_sensitive
+            )
+            db.session.add(keyword)
+
+    website.keywords_updated_at = datetime.utcnow()
 
 @main_bp.route('/api/websites', methods=['GET'])
 def api_get_websites():
     """获取所有网站列表"""
-    websites = Website.query.all()
+    # 一次查询加载所有网站的关键词，避免逐个网站懒加载
+    websites = Website.query.options(selectinload(Website.keywords)).all()
     return jsonify([website.to_dict() for website in websites])
 
 @main_bp.route('/api/websites', methods=['POST'])
@@ -17,25 +51,38 @@ def api_create_website():
 
     if not data or not data.get('name') or not data.get('url'):
         return jsonify({'error': '网站名称和URL不能为空'}), 400
+    try:
+        check_interval, min_interval, max_interval = parse_schedule(
+            data.get('check_interval'), data.get('min_interval'), data.get('max_interval'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     website = Website(
         name=data['name'],
         url=data['url'],
-        check_interval=data.get('check_interval', 300),
-        is_active=data.get('is_active', True)
+        check_interval=check_interval,
+        is_active=data.get('is_active', True),
+        render_js=data.get('render_js', False),
+        adaptive_interval=data.get('adaptive_interval', False),
+        min_interval=min_interval,
+        max_interval=max_interval,
+        wait_selector=data.get('wait_selector') or None,
+        dom_idle_ms=data.get('dom_idle_ms'),
+        content_selector=data.get('content_selector') or None,
+        ignore_selectors=data.get('ignore_selectors') or None,
+        ignore_patterns=data.get('ignore_patterns') or None,
+        hash_range=data.get('hash_range') or None
     )
 
     db.session.add(website)
     db.session.flush()
 
     # 添加关键词
-    keywords = data.get('keywords', [])
-    for keyword_text in keywords:
-        if keyword_text.strip():
-            keyword = Keyword(website_id=website.id, keyword=keyword_text.strip())
-            db.session.add(keyword)
+    _add_keywords(website, data.get('keywords', []))
 
     db.session.commit()
+    reschedule_website(website)
+    get_stats().invalidate()
 
     return jsonify(website.to_dict()), 201
 
@@ -50,84 +97,253 @@ def api_update_website(website_id):
     """更新网站信息"""
     website = Website.query.get_or_404(website_id)
     data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({'error': '请求体必须是JSON对象'}), 400
+
+    # 先校验调度参数，未设置的字段沿用当前值
+    try:
+        schedule = dict(zip(('check_interval', 'min_interval', 'max_interval'), parse_schedule(
+            data.get('check_interval', website.check_interval),
+            data.get('min_interval', website.min_interval),
+            data.get('max_interval', website.max_interval)
+        )))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    schedule['adaptive_interval'] = bool(data.get('adaptive_interval', website.adaptive_interval))
 
     if data.get('name'):
         website.name = data['name']
-    if data.get('url'):
+    if data.get('url') and data['url'] != website.url:
         website.url = data['url']
-    if 'check_interval' in data:
-        website.check_interval = data['check_interval']
+        # URL变更后旧的校验器和失败计数不再适用
+        website.etag = None
+        website.last_modified = None
+        website.last_raw_hash = None
+        website.consecutive_failures = 0
+    for field, value in schedule.items():
+        if field in data and value != getattr(website, field):
+            setattr(website, field, value)
+            # 调度参数变更后自适应间隔从新的检查间隔重新学习
+            website.effective_interval = None
     if 'is_active' in data:
         website.is_active = data['is_active']
+    if 'render_js' in data:
+        website.render_js = data['render_js']
+    if 'wait_selector' in data:
+        website.wait_selector = data['wait_selector'] or None
+    if 'dom_idle_ms' in data:
+        website.dom_idle_ms = data['dom_idle_ms']
+    for field in ('content_selector', 'ignore_selectors', 'ignore_patterns', 'hash_range'):
+        if field in data and (data[field] or None) != getattr(website, field):
+            setattr(website, field, data[field] or None)
+            # 规则变更后下次检查完整抓取并重新规范化，不使用条件请求或原始哈希跳过
+            website.etag = None
+            website.last_modified = None
+            website.last_raw_hash = None
 
     # 更新关键词
     if 'keywords' in data:
         Keyword.query.filter_by(website_id=website_id).delete()
-        for keyword_text in data['keywords']:
-            if keyword_text.strip():
-                keyword = Keyword(website_id=website.id, keyword=keyword_text.strip())
-                db.session.add(keyword)
+        _add_keywords(website, data['keywords'])
 
     db.session.commit()
+    reschedule_website(website)
+    get_stats().invalidate()
     return jsonify(website.to_dict())
 
 @main_bp.route('/api/websites/<int:website_id>', methods=['DELETE'])
 def api_delete_website(website_id):
     """删除网站"""
     website = Website.query.get_or_404(website_id)
+    get_check_history().purge_website(website_id)
     db.session.delete(website)
     db.session.commit()
+    unschedule_website(website_id)
+    get_stats().invalidate()
     return jsonify({'message': '网站删除成功'})
 
 @main_bp.route('/api/websites/<int:website_id>/check', methods=['POST'])
 def api_check_website(website_id):
-    """手动检查网站"""
-    website = Website.query.get_or_404(website_id)
-    monitor = WebsiteMonitor()
+    """手动检查网站：提交后台检查任务，立即返回任务ID"""
+    Website.query.get_or_404(website_id)
+    job = request_checks([website_id])[website_id]
+    return jsonify({'success': True, 'message': '检查任务已提交', 'job': job.to_dict()}), 202
 
+@main_bp.route('/api/websites/check', methods=['POST'])
+def api_check_websites():
+    """批量手动检查：传入website_ids时检查指定网站，all为true或不传website_ids时检查所有活跃网站"""
+    data = request.get_json(silent=True) or {}
+    website_ids = data.get('website_ids')
+    check_all = data.get('all', False)
+    if not isinstance(check_all, bool):
+        return jsonify({'success': False, 'error': 'all必须是布尔值'}), 400
+    if website_ids is not None:
+        if check_all:
+            return jsonify({'success': False, 'error': 'all和website_ids不能同时指定'}), 400
+        if not isinstance(website_ids, list) or not all(isinstance(website_id, int) for website_id in website_ids):
+            return jsonify({'success': False, 'error': 'website_ids必须是网站ID数组'}), 400
+        # 空数组多半是调用方筛选后没有剩余网站，不能当作检查全部
+        if not website_ids:
+            return jsonify({'success': False, 'error': 'website_ids不能为空，检查所有活跃网站请传入 {"all": true}'}), 400
+
+    query = db.select(Website.id)
+    if website_ids is not None:
+        query = query.where(Website.id.in_(website_ids))
+    else:
+        query = query.where(Website.is_active.is_(True))
+    existing_ids = db.session.execute(query.order_by(Website.id)).scalars().all()
+    if not existing_ids:
+        return jsonify({'success': False, 'error': '没有可检查的网站'}), 404
+
+    jobs = request_checks(existing_ids)
+    return jsonify({
+        'success': True,
+        'message': f'已提交 {len(jobs)} 个检查任务',
+        'jobs': [job.to_dict() for job in jobs.values()]
+    }), 202
+
+@main_bp.route('/api/check_jobs/<int:job_id>', methods=['GET'])
+def api_get_check_job(job_id):
+    """查询手动检查任务状态"""
+    return jsonify(CheckJob.query.get_or_404(job_id).to_dict())
+
+@main_bp.route('/api/check_jobs', methods=['GET'])
+def api_get_check_jobs():
+    """批量查询任务状态，ids为逗号分隔的任务ID"""
     try:
-        result = monitor.monitor_website(website)
-        return jsonify({'success': result, 'message': '检查完成'})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        job_ids = [int(job_id) for job_id in request.args.get('ids', '').split(',') if job_id.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids格式错误，示例：1,2,3'}), 400
+    if len(job_ids) > 500:
+        return jsonify({'error': '一次最多查询500个任务'}), 400
+
+    jobs = CheckJob.query.filter(CheckJob.id.in_(job_ids)).order_by(CheckJob.id).all() if job_ids else []
+    return jsonify([job.to_dict() for job in jobs])
+
+@main_bp.route('/api/websites/<int:website_id>/uptime', methods=['GET'])
+def api_website_uptime(website_id):
+    """网站可用率，window参数如 1h / 24h / 30d"""
+    Website.query.get_or_404(website_id)
+    window = parse_window(request.args.get('window'))
+    if window is None:
+        return jsonify({'error': 'window格式错误，示例：1h、24h、7d'}), 400
+
+    result = get_check_history().uptime(website_id, window)
+    result.update({'website_id': website_id, 'window': request.args.get('window', '24h')})
+    return jsonify(result)
+
+@main_bp.route('/api/websites/<int:website_id>/latency', methods=['GET'])
+def api_website_latency(website_id):
+    """网站响应延迟统计（平均值、最大值和p50/p90/p95/p99）"""
+    Website.query.get_or_404(website_id)
+    window = parse_window(request.args.get('window'))
+    if window is None:
+        return jsonify({'error': 'window格式错误，示例：1h、24h、7d'}), 400
+
+    result = get_check_history().latency(website_id, window)
+    result.update({'website_id': website_id, 'window': request.args.get('window', '24h')})
+    return jsonify(result)
 
 @main_bp.route('/api/changes', methods=['GET'])
 def api_get_changes():
-    """获取变化记录"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    """获取变化记录
+
+    默认使用游标分页：传入上次返回的next_cursor获取更早的记录，
+    prev_cursor配合direction=prev获取更新的记录。传入page时仍按页码分页（深页较慢）。
+    """
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
     website_id = request.args.get('website_id', type=int)
 
     query = ChangeRecord.query
     if website_id:
         query = query.filter_by(website_id=website_id)
 
-    changes = query.order_by(ChangeRecord.created_at.desc())\
-                   .paginate(
-                       page=page,
-                       per_page=per_page,
-                       error_out=False
-                   )
+    if 'page' in request.args and 'cursor' not in request.args:
+        changes = query.order_by(ChangeRecord.created_at.desc(), ChangeRecord.id.desc())\
+                       .paginate(
+                           page=request.args.get('page', 1, type=int),
+                           per_page=per_page,
+                           error_out=False
+                       )
+
+        return jsonify({
+            'changes': [change.to_dict() for change in changes.items],
+            'total': changes.total,
+            'pages': changes.pages,
+            'current_page': changes.page
+        })
+
+    changes = keyset_paginate(
+        query, ChangeRecord, per_page,
+        cursor=request.args.get('cursor'),
+        direction=request.args.get('direction', 'next')
+    )
 
     return jsonify({
         'changes': [change.to_dict() for change in changes.items],
-        'total': changes.total,
-        'pages': changes.pages,
-        'current_page': changes.page
+        'next_cursor': changes.next_cursor,
+        'prev_cursor': changes.prev_cursor,
+        'has_more': changes.has_next
     })
 
 @main_bp.route('/api/status', methods=['GET'])
 def api_status():
-    """获取系统状态"""
-    website_count = Website.query.count()
-    active_website_count = Website.query.filter_by(is_active=True).count()
-    recent_changes_count = ChangeRecord.query.filter(
-        ChangeRecord.created_at >= db.func.date('now', '-1 day')
-    ).count()
+    """获取系统状态（来自内存中的统计缓存，支持ETag）"""
+    stats, etag = get_stats().snapshot()
 
-    return jsonify({
-        'total_websites': website_count,
-        'active_websites': active_website_count,
-        'recent_changes': recent_changes_count,
+    return conditional_json(etag, lambda: {
+        'total_websites': stats['total_websites'],
+        'active_websites': stats['active_websites'],
+        'recent_changes': stats['recent_changes'],
         'status': 'running'
-    })
\ No newline at end of file
+    })
+
+@main_bp.route('/metrics', methods=['GET'])
+def api_metrics():
+    """Prometheus格式的运行指标（本进程）"""
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'error': '指标接口未启用'}), 404
+    return Response(get_metrics().expose(), content_type=CONTENT_TYPE)
+
+@main_bp.route('/api/events', methods=['GET'])
+def api_events():
+    """实时事件流（SSE）：新的变化记录、网站检查结果和通知状态
+
+    重连时浏览器自动携带Last-Event-ID，补发该ID之后及回看窗口内的变化记录，客户端按ID去重；
+    首次连接可通过last_event_id参数指定已加载的最新记录。
+    """
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', type=int)
+
+    bus = get_event_bus(current_app._get_current_object())
+    subscriber = bus.subscribe()
+    backlog = bus.backlog(last_event_id) if last_event_id is not None else []
+    keepalive = bus.config.SSE_KEEPALIVE_SECONDS
+
+    def stream():
+        # 补发过的记录不再重复发送；其余事件已由事件总线去重，较小的ID可能晚到，不能按ID大小过滤
+        sent_ids = set()
+        try:
+            yield 'retry: 5000\n\n'
+            for event, data, event_id in backlog:
+                yield format_sse(event, data, event_id)
+                sent_ids.add(event_id)
+
+            while not subscriber.overflowed:
+                message = subscriber.get(timeout=keepalive)
+                if message is None:
+                    # 心跳注释，及时发现已断开的连接
+                    yield ': keepalive\n\n'
+                    continue
+                event, data, event_id = message
+                if event_id in sent_ids:
+                    continue
+                yield format_sse(event, data, event_id)
+        finally:
+            bus.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -1,14 +1,21 @@
 from flask import render_template, request, redirect, url_for, flash, send_from_directory, jsonify
 from app.routes import main_bp
 from app import db
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
 from app.models import Website, ChangeRecord, Keyword
+from app.services.scheduler import reschedule_website, unschedule_website
+from app.services.stats import get_stats
+from app.services.adaptive import parse_schedule
+from app.services.check_history import get_check_history
+from app.utils.http import conditional_json
+from app.utils.pagination import keyset_paginate
 from datetime import datetime
 import os
 
 @main_bp.route('/')
 def index():
     """主页 - 显示所有网站监控状态"""
-    websites = Website.query.all()
+    websites = Website.query.options(selectinload(Website.keywords)).all()
     return render_template('index.html', websites=websites)
 
 @main_bp.route('/website/<int:website_id>')
@@ -28,15 +35,31 @@ def add_website():
     if request.method == 'POST':
         name = request.form.get('name')
         url = request.form.get('url')
-        check_interval = int(request.form.get('check_interval', 300))
         keywords = request.form.get('keywords', '').split(',')
 
         if not name or not url:
             flash('网站名称和URL不能为空', 'error')
             return render_template('add_website.html')
+        try:
+            check_interval, min_interval, max_interval = parse_schedule(
+                request.form.get('check_interval'), request.form.get('min_interval'),
+                request.form.get('max_interval'))
+        except ValueError as e:
+            flash(str(e), 'error')
+            return render_template('add_website.html')
 
         # 创建网站
-        website = Website(name=name, url=url, check_interval=check_interval)
+        website = Website(name=name, url=url, check_interval=check_interval,
+                          render_js='render_js' in request.form,
+                          adaptive_interval='adaptive_interval' in request.form,
+                          min_interval=min_interval,
+                          max_interval=max_interval,
+                          wait_selector=request.form.get('wait_selector', '').strip() or None,
+                          dom_idle_ms=request.form.get('dom_idle_ms', type=int),
+                          content_selector=request.form.get('content_selector', '').strip() or None,
+                          ignore_selectors=request.form.get('ignore_selectors', '').strip() or None,
+                          ignore_patterns=request.form.get('ignore_patterns', '').strip() or None,
+                          hash_range=request.form.get('hash_range', '').strip() or None)
         db.session.add(website)
         db.session.flush()  # 获取website.id
 
@@ -46,8 +69,11 @@ def add_website():
             if keyword_text:
                 keyword = Keyword(website_id=website.id, keyword=keyword_text)
                 db.session.add(keyword)
+        website.keywords_updated_at = datetime.utcnow()
 
         db.session.commit()
+        reschedule_website(website)
+        get_stats().invalidate()
         flash('网站添加成功', 'success')
         return redirect(url_for('main.index'))
 
@@ -59,23 +85,57 @@ def edit_website(website_id):
     website = Website.query.get_or_404(website_id)
 
     if request.method == 'POST':
+        try:
+            check_interval, min_interval, max_interval = parse_schedule(
+                request.form.get('check_interval'), request.form.get('min_interval'),
+                request.form.get('max_interval'))
+        except ValueError as e:
+            flash(str(e), 'error')
+            return render_template('edit_website.html', website=website)
+
         website.name = request.form.get('name')
-        website.url = request.form.get('url')
-        website.check_interval = int(request.form.get('check_interval', 300))
+        url = request.form.get('url')
+        if url != website.url:
+            # URL变更后旧的校验器和失败计数不再适用
+            website.etag = None
+            website.last_modified = None
+            website.last_raw_hash = None
+            website.consecutive_failures = 0
+        website.url = url
+
+        schedule = (check_interval, 'adaptive_interval' in request.form, min_interval, max_interval)
+        if schedule != (website.check_interval, bool(website.adaptive_interval),
+                        website.min_interval, website.max_interval):
+            # 调度参数变更后自适应间隔从新的检查间隔重新学习
+            website.effective_interval = None
+        website.check_interval, website.adaptive_interval, website.min_interval, website.max_interval = schedule
         website.is_active = 'is_active' in request.form
-
-        # 删除现有关键词
-        Keyword.query.filter_by(website_id=website_id).delete()
-
-        # 添加新关键词
-        keywords = request.form.get('keywords', '').split(',')
-        for keyword_text in keywords:
-            keyword_text = keyword_text.strip()
-            if keyword_text:
-                keyword = Keyword(website_id=website.id, keyword=keyword_text)
-                db.session.add(keyword)
+        website.render_js = 'render_js' in request.form
+        website.wait_selector = request.form.get('wait_selector', '').strip() or None
+        website.dom_idle_ms = request.form.get('dom_idle_ms', type=int)
+        rules = tuple(request.form.get(field, '').strip() or None
+                      for field in ('content_selector', 'ignore_selectors', 'ignore_patterns', 'hash_range'))
+        if rules != (website.content_selector, website.ignore_selectors, website.ignore_patterns, website.hash_range):
+            # 规则变更后下次检查完整抓取并重新规范化，不使用条件请求或原始哈希跳过
+            website.etag = None
+            website.last_modified = None
+            website.last_raw_hash = None
+        website.content_selector, website.ignore_selectors, website.ignore_patterns, website.hash_range = rules
+
+        # 表单只编辑关键词文本：保留的关键词沿用API设置的匹配方式和大小写，删除去掉的，新增的按普通匹配添加
+        keywords = [text.strip() for text in request.form.get('keywords', '').split(',') if text.strip()]
+        existing = {keyword.keyword: keyword for keyword in website.keywords}
+        for keyword_text, keyword in existing.items():
+            if keyword_text not in keywords:
+                db.session.delete(keyword)
+        for keyword_text in dict.fromkeys(keywords):
+            if keyword_text not in existing:
+                db.session.add(Keyword(website_id=website.id, keyword=keyword_text))
+        website.keywords_updated_at = datetime.utcnow()
 
         db.session.commit()
+        reschedule_website(website)
+        get_stats().invalidate()
         flash('网站信息更新成功', 'success')
         return redirect(url_for('main.website_detail', website_id=website_id))
 
@@ -85,21 +145,23 @@ def edit_website(website_id):
 def delete_website(website_id):
     """删除网站"""
     website = Website.query.get_or_404(website_id)
+    get_check_history().purge_website(website_id)
     db.session.delete(website)
     db.session.commit()
+    unschedule_website(website_id)
+    get_stats().invalidate()
     flash('网站删除成功', 'success')
     return redirect(url_for('main.index'))
 
 @main_bp.route('/changes')
 def changes_list():
-    """变化记录列表页"""
-    page = request.args.get('page', 1, type=int)
-    changes = ChangeRecord.query.order_by(ChangeRecord.created_at.desc())\
-                                .paginate(
-                                    page=page,
-                                    per_page=20,
-                                    error_out=False
-                                )
+    """变化记录列表页（游标分页）"""
+    changes = keyset_paginate(
+        ChangeRecord.query.options(joinedload(ChangeRecord.website)),
+        ChangeRecord, 20,
+        cursor=request.args.get('cursor'),
+        direction=request.args.get('direction', 'next')
+    )
     return render_template('changes_list.html', changes=changes)
 
 @main_bp.route('/logs')
@@ -109,48 +171,41 @@ def logs():
 
 @main_bp.route('/api/logs')
 def api_logs():
-    """获取最新日志"""
+    """获取最新日志，没有新变化或通知状态更新时返回304"""
     limit = request.args.get('limit', 50, type=int)
+    stats, _ = get_stats().snapshot()
+    # 只取决于变化记录和通知状态，其他网站的检查不影响日志内容
+    etag = f"{stats['last_change_id']}-{stats['recent_changes']}-{stats['notifications_sent']}-{limit}"
+
+    def build():
+        # 获取最新的变化记录作为日志，按主键倒序避免对created_at排序
+        records = ChangeRecord.query.join(Website)\
+                                    .options(contains_eager(ChangeRecord.website))\
+                                    .order_by(ChangeRecord.id.desc())\
+                                    .limit(limit).all()
+
+        logs = [record.to_log_dict() for record in records]
+
+        return {
+            'success': True,
+            'logs': logs,
+            'total': len(logs)
+        }
 
-    # 获取最新的变化记录作为日志
-    records = ChangeRecord.query.join(Website)\
-                                .order_by(ChangeRecord.created_at.desc())\
-                                .limit(limit).all()
-
-    logs = []
-    for record in records:
-        logs.append({
-            'id': record.id,
-            'timestamp': record.created_at.strftime('%Y-%m-%d %H:%M:%S') if record.created_at else '',
-            'website_name': record.website.name,
-            'website_url': record.website.url,
-            'change_type': record.change_type,
-            'notification_sent': record.notification_sent,
-            'matched_keywords': record.matched_keywords,
-            'created_at_iso': record.created_at.isoformat() if record.created_at else ''
-        })
-
-    return jsonify({
-        'success': True,
-        'logs': logs,
-        'total': len(logs)
-    })
+    return conditional_json(etag, build)
 
 @main_bp.route('/api/system/status')
 def system_status():
-    """获取系统状态"""
-    active_websites = Website.query.filter_by(is_active=True).count()
-    total_websites = Website.query.count()
-
-    # 获取最后一次检查时间
-    last_record = ChangeRecord.query.order_by(ChangeRecord.created_at.desc()).first()
-    last_check = last_record.created_at if last_record else None
+    """获取系统状态（来自内存中的统计缓存，支持ETag）"""
+    stats, etag = get_stats().snapshot()
+    last_check = stats['last_check']
 
-    return jsonify({
+    return conditional_json(etag, lambda: {
         'success': True,
         'data': {
-            'active_websites': active_websites,
-            'total_websites': total_websites,
+            'active_websites': stats['active_websites'],
+            'total_websites': stats['total_websites'],
+            'recent_changes': stats['recent_changes'],
             'last_check': last_check.strftime('%H:%M:%S') if last_check else None,
             'status': 'online',
             'timestamp': datetime.utcnow().isoformat()
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app import db
+from app.models import ChangeRecord
+from app.services.lease import DEFAULT_CHECK_INTERVAL, check_interval_of, next_check_time, positive_interval
+from config.config import Config
+
+# 单次检查的结果
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+
+
+def parse_schedule(check_interval, min_interval=None, max_interval=None):
+    """校验调度参数，返回 (检查间隔, 最小间隔, 最大间隔)，无效时抛出ValueError
+
+    最小/最大间隔为None或空字符串表示不设置
+    """
+    if check_interval is None or check_interval == '':
+        check_interval = DEFAULT_CHECK_INTERVAL
+    values = []
+    for name, value in (('检查间隔', check_interval), ('最小间隔', min_interval), ('最大间隔', max_interval)):
+        if value is None or value == '':
+            values.append(None)
+            continue
+        interval = positive_interval(value)
+        if interval is None or str(interval) != str(value).strip():
+            raise ValueError(f'{name}必须是正整数秒数')
+        values.append(interval)
+    if values[1] is not None and values[2] is not None and values[1] > values[2]:
+        raise ValueError('最小间隔不能大于最大间隔')
+    return tuple(values)
+
+
+class ScheduleState:
+    """检查前记录的调度字段；检查过程中会话可能回滚，检查后不再读取网站对象"""
+
+    __slots__ = ('id', 'check_interval', 'adaptive', 'min_interval', 'max_interval',
+                 'effective_interval', 'failures')
+
+    def __init__(self, website):
+        self.id = website.id
+        self.check_interval = website.check_interval
+        self.adaptive = bool(website.adaptive_interval)
+        self.min_interval = website.min_interval
+        self.max_interval = website.max_interval
+        self.effective_interval = website.effective_interval
+        self.failures = website.consecutive_failures or 0
+
+
+class SchedulePlanner:
+    """根据检查结果计算下次检查时间
+
+    自适应模式：发生变化时间隔减半，无变化时按倍数增长，并以历史变化记录估算的
+    平均变化间隔的一半为上限，始终限制在网站的上下限之内。
+    所有网站连续失败时按指数退避，达到阈值后熔断，只按探测间隔重试，成功一次即恢复。
+    """
+
+    def __init__(self):
+        self.config = Config()
+
+    def _bounds(self, state):
+        lower = check_interval_of(state.min_interval or self.config.ADAPTIVE_MIN_INTERVAL)
+        upper = max(positive_interval(state.max_interval) or self.config.ADAPTIVE_MAX_INTERVAL, lower)
+        return lower, upper
+
+    def learned_ceilings(self, website_ids, now=None):
+        """按历史变化记录估算各网站的检查间隔上限，变化次数不足的网站不限制"""
+        if not website_ids:
+            return {}
+        since = (now or datetime.utcnow()) - timedelta(days=self.config.ADAPTIVE_HISTORY_DAYS)
+        rows = db.session.execute(
+            db.select(ChangeRecord.website_id, func.count(ChangeRecord.id),
+                      func.min(ChangeRecord.created_at), func.max(ChangeRecord.created_at))
+            .where(ChangeRecord.website_id.in_(website_ids), ChangeRecord.created_at >= since)
+            .group_by(ChangeRecord.website_id)
+        ).all()
+
+        ceilings = {}
+        for website_id, count, first, last in rows:
+            if count < max(self.config.ADAPTIVE_MIN_SAMPLES, 2):
+                continue
+            mean_gap = (last - first).total_seconds() / (count - 1)
+            # 每个平均变化周期至少检查两次
+            ceilings[website_id] = mean_gap / 2
+        return ceilings
+
+    def adaptive_interval(self, state, outcome, ceiling=None):
+        lower, upper = self._bounds(state)
+        interval = state.effective_interval or check_interval_of(state.check_interval)
+        if outcome == CHANGED:
+            interval /= 2
+        elif outcome == UNCHANGED:
+            interval *= self.config.ADAPTIVE_BACKOFF_FACTOR
+        if ceiling is not None:
+            interval = min(interval, ceiling)
+        return int(min(max(interval, lower), upper))
+
+    def failure_delay(self, interval, failures):
+        """第failures次连续失败后的等待秒数"""
+        if failures >= self.config.CIRCUIT_BREAKER_THRESHOLD:
+            return max(self.config.CIRCUIT_OPEN_SECONDS, interval)
+        return min(interval * 2 ** (failures - 1), max(self.config.FAILURE_BACKOFF_MAX, interval))
+
+    def plan(self, states, outcomes, now=None):
+        """返回 {网站ID: 需要更新的字段}，包含下次检查时间；outcomes中缺少的网站按原间隔重排"""
+        now = now or datetime.utcnow()
+        ceilings = self.learned_ceilings(
+            [state.id for state in states if state.adaptive and outcomes.get(state.id) in (CHANGED, UNCHANGED)],
+            now
+        )
+
+        updates = {}
+        for state in states:
+            outcome = outcomes.get(state.id)
+            values = {}
+            interval = check_interval_of(state.check_interval)
+
+            if state.adaptive:
+                if outcome in (CHANGED, UNCHANGED):
+                    interval = self.adaptive_interval(state, outcome, ceilings.get(state.id))
+                    values['effective_interval'] = interval
+                elif state.effective_interval:
+                    interval = state.effective_interval
+
+            if outcome == FAILED:
+                failures = state.failures + 1
+                values['consecutive_failures'] = failures
+                if failures == self.config.CIRCUIT_BREAKER_THRESHOLD:
+                    print(f"Circuit opened for website {state.id} after {failures} consecutive failures")
+                interval = self.failure_delay(interval, failures)
+            elif outcome is not None and state.failures:
+                values['consecutive_failures'] = 0
+                if state.failures >= self.config.CIRCUIT_BREAKER_THRESHOLD:
+                    print(f"Circuit closed for website {state.id}")
+
+            values['next_check_at'] = next_check_time(interval, now)
+            updates[state.id] = values
+        return updates
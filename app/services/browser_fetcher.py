@@ -1,137 +1,314 @@
 import asyncio
+import atexit
+import threading
+import time
+from urllib.parse import urlsplit
 from playwright.async_api import async_playwright
 from bs4 import BeautifulSoup
-import os
+from app.utils.event_loop import BackgroundLoop, InflightRequests
+from app.services.normalizer import html_parser
+from app.services.parse_pool import get_parse_pool
+from app.services.metrics import get_metrics
+from config.config import Config
+
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-accelerated-2d-canvas',
+    '--no-first-run',
+    '--no-zygote',
+    '--disable-gpu'
+]
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# 在页面中等待DOM连续quietMs毫秒没有变化，最长等待maxMs毫秒
+DOM_IDLE_SCRIPT = '''({quietMs, maxMs}) => new Promise(resolve => {
+    let timer = null;
+    const observer = new MutationObserver(() => {
+        clearTimeout(timer);
+        timer = setTimeout(done, quietMs);
+    });
+    const deadline = setTimeout(done, maxMs);
+    function done() {
+        observer.disconnect();
+        clearTimeout(timer);
+        clearTimeout(deadline);
+        resolve();
+    }
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    timer = setTimeout(done, quietMs);
+})'''
+
+
+class _ContextSlot:
+    """池中的一个浏览器上下文及其复用的页面"""
 
-class BrowserFetcher:
     def __init__(self):
-        self.playwright = None
-        self.browser = None
         self.context = None
+        self.page = None
+        self.pages_served = 0
+        self.generation = 0
 
-    async def start_browser(self):
-        """启动浏览器"""
+    async def close(self):
         try:
-            self.playwright = await async_playwright().start()
+            if self.context:
+                await self.context.close()
+        except Exception as e:
+            print(f"Error closing browser context: {str(e)}")
+        self.context = None
+        self.page = None
+        self.pages_served = 0
 
-            # 尝试启动Chromium
-            self.browser = await self.playwright.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-accelerated-2d-canvas',
-                    '--no-first-run',
-                    '--no-zygote',
-                    '--disable-gpu'
-                ]
-            )
 
-            # 创建上下文
-            self.context = await self.browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            )
+class BrowserPool:
+    """长期运行的Chromium浏览器及固定数量的上下文池
 
-            return True
+    所有协程都运行在专用的事件循环线程中。每个上下文复用一个页面，
+    处理满max_pages_per_context次后整体回收；浏览器崩溃时自动重新启动。
+    """
 
-        except Exception as e:
-            print(f"Failed to start browser: {str(e)}")
-            return False
+    def __init__(self, size=None, max_pages_per_context=None, page_timeout=None):
+        config = Config()
+        self.size = size or config.BROWSER_POOL_SIZE
+        self.max_pages_per_context = max_pages_per_context or config.BROWSER_MAX_PAGES_PER_CONTEXT
+        self.page_timeout = page_timeout or config.BROWSER_PAGE_TIMEOUT
+        self.ready_timeout = config.BROWSER_READY_TIMEOUT
+        self.default_dom_idle_ms = config.BROWSER_DOM_IDLE_MS
+        self.blocked_resource_types = set(config.BROWSER_BLOCKED_RESOURCE_TYPES)
+        self.blocked_domains = tuple(config.BROWSER_BLOCKED_DOMAINS)
+        self.loop = BackgroundLoop('browser-pool')
+        # 进行中的渲染，同一页面的并发渲染请求共享结果
+        self._inflight = InflightRequests()
 
-    async def fetch_content(self, url, wait_time=5000):
-        """获取动态网站内容"""
-        if not self.context:
-            if not await self.start_browser():
-                return None
+        self.playwright = None
+        self.browser = None
+        self._generation = 0
+        self._slots = None
+        self._all_slots = []
+        self._launch_lock = None
 
-        try:
-            page = await self.context.new_page()
+        self.metrics = get_metrics()
+        self.metrics.gauge('monitor_browser_pool_contexts', '浏览器池上下文数（total/busy）', ['state'],
+                           collect=self._usage)
 
-            # 设置超时时间
-            page.set_default_timeout(30000)
+    def _usage(self):
+        busy = self.size - self._slots.qsize() if self._slots is not None else 0
+        return {('total',): self.size, ('busy',): busy}
 
-            # 访问页面
-            await page.goto(url, wait_until='networkidle')
+    async def _ensure_browser(self):
+        """确保浏览器在运行，断开连接时重新启动"""
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+            self._slots = asyncio.Queue()
+            self._all_slots = [_ContextSlot() for _ in range(self.size)]
+            for slot in self._all_slots:
+                self._slots.put_nowait(slot)
 
-            # 等待页面加载完成
-            await page.wait_for_timeout(wait_time)
+        if self.browser and self.browser.is_connected():
+            return
 
-            # 获取页面内容
-            content = await page.content()
+        async with self._launch_lock:
+            if self.browser and self.browser.is_connected():
+                return
 
-            # 关闭页面
-            await page.close()
+            if self.browser is not None:
+                print("Browser disconnected, restarting")
+            await self._shutdown_browser()
 
-            # 解析内容
-            soup = BeautifulSoup(content, 'html.parser')
+            self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+            self._generation += 1
+            self.metrics.browser_launches.inc()
+            print(f"Browser pool started (size={self.size})")
 
-            # 移除脚本和样式标签
-            for script in soup(["script", "style"]):
-                script.decompose()
+    async def _prepare_slot(self, slot):
+        """按需创建或回收上下文和页面"""
+        if (slot.context is not None and
+                (slot.generation != self._generation or
+                 slot.pages_served >= self.max_pages_per_context)):
+            await slot.close()
 
-            # 获取纯文本内容
-            text_content = soup.get_text()
+        if slot.context is None:
+            slot.context = await self.browser.new_context(
+                viewport={'width': 1920, 'height': 1080},
+                user_agent=USER_AGENT
+            )
+            slot.generation = self._generation
+            if self.blocked_resource_types or self.blocked_domains:
+                await slot.context.route('**/*', self._handle_route)
 
-            # 清理空白字符
-            lines = (line.strip() for line in text_content.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            clean_text = ' '.join(chunk for chunk in chunks if chunk)
+        if slot.page is None or slot.page.is_closed():
+            slot.page = await slot.context.new_page()
+            slot.page.set_default_timeout(self.page_timeout)
 
-            # 获取标题和meta信息
-            title = soup.find('title')
-            title_text = title.get_text() if title else ""
+    def _is_blocked(self, request):
+        """判断请求是否属于被屏蔽的资源类型或域名"""
+        if request.resource_type in self.blocked_resource_types:
+            return True
+        host = urlsplit(request.url).hostname or ''
+        return any(host == domain or host.endswith('.' + domain) for domain in self.blocked_domains)
 
-            # 提取meta标签内容
-            meta_content = []
-            for meta in soup.find_all('meta', {'name': ['description', 'keywords', 'author']}):
-                content_attr = meta.get('content', '')
-                if content_attr:
-                    meta_content.append(content_attr)
+    async def _handle_route(self, route):
+        """拦截图片、字体、媒体和第三方追踪请求"""
+        try:
+            if self._is_blocked(route.request):
+                await route.abort()
+            else:
+                await route.continue_()
+        except Exception:
+            # 页面已关闭时路由可能已失效
+            pass
 
-            # 合并所有内容
-            combined_content = f"{title_text} {clean_text} {' '.join(meta_content)}"
+    async def _wait_until_ready(self, page, wait_selector=None, dom_idle_ms=None):
+        """等待选择器出现，或DOM在指定时间内不再变化"""
+        try:
+            if wait_selector:
+                await page.wait_for_selector(wait_selector, state='attached', timeout=self.ready_timeout)
+            else:
+                quiet_ms = dom_idle_ms or self.default_dom_idle_ms
+                await page.evaluate(DOM_IDLE_SCRIPT, {'quietMs': quiet_ms, 'maxMs': self.ready_timeout})
+        except Exception as e:
+            # 未就绪时仍使用当前内容，避免整个检查失败
+            print(f"Page not ready within {self.ready_timeout}ms: {str(e)}")
+
+    async def render(self, url, wait_selector=None, dom_idle_ms=None):
+        """渲染页面并返回HTML，失败返回None；相同页面正在渲染时等待其结果"""
+        key = (url, wait_selector, dom_idle_ms)
+        return await self._inflight.run(key, lambda: self._render(url, wait_selector, dom_idle_ms))
+
+    async def _render(self, url, wait_selector=None, dom_idle_ms=None):
+        await self._ensure_browser()
 
-            return combined_content
+        slot = await self._slots.get()
+        started = time.perf_counter()
+        try:
+            await self._prepare_slot(slot)
+            page = slot.page
+
+            # 访问页面，DOM解析完成后按就绪条件等待
+            await page.goto(url, wait_until='domcontentloaded')
+            await self._wait_until_ready(page, wait_selector, dom_idle_ms)
+
+            content = await page.content()
+            slot.pages_served += 1
+            return content
 
         except Exception as e:
-            print(f"Error fetching content from {url}: {str(e)}")
+            print(f"Error rendering {url}: {str(e)}")
+            # 页面或上下文可能已损坏，丢弃后下次重新创建
+            await slot.close()
             return None
 
-    async def close_browser(self):
-        """关闭浏览器"""
+        finally:
+            self.metrics.render_seconds.observe(time.perf_counter() - started)
+            self._slots.put_nowait(slot)
+
+    async def _shutdown_browser(self):
         try:
-            if self.context:
-                await self.context.close()
             if self.browser:
                 await self.browser.close()
+        except Exception as e:
+            print(f"Error closing browser: {str(e)}")
+        try:
             if self.playwright:
                 await self.playwright.stop()
         except Exception as e:
-            print(f"Error closing browser: {str(e)}")
+            print(f"Error stopping playwright: {str(e)}")
+        self.browser = None
+        self.playwright = None
 
-    def fetch_content_sync(self, url, wait_time=5000):
-        """同步版本的内容获取"""
-        async def fetch_with_new_browser():
-            # 为每个请求创建新的浏览器实例
-            browser_fetcher = BrowserFetcher()
-            try:
-                content = await browser_fetcher.fetch_content(url, wait_time)
-                return content
-            finally:
-                await browser_fetcher.close_browser()
+    async def close(self):
+        """关闭所有上下文和浏览器"""
+        for slot in self._all_slots:
+            await slot.close()
+        await self._shutdown_browser()
 
+    def shutdown(self):
+        """同步关闭浏览器池及其事件循环线程"""
         try:
-            # 创建新的事件循环
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            self.loop.run(self.close(), timeout=30)
+        except Exception as e:
+            print(f"Error shutting down browser pool: {str(e)}")
+        self.loop.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """获取进程内共享的浏览器池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def extract_text(content):
+    """从渲染后的HTML中提取标题、正文和meta信息"""
+    # 解析内容
+    soup = BeautifulSoup(content, html_parser())
 
-            try:
-                return loop.run_until_complete(fetch_with_new_browser())
-            finally:
-                loop.close()
+    # 移除脚本和样式标签
+    for script in soup(["script", "style"]):
+        script.decompose()
 
+    # 获取纯文本内容
+    text_content = soup.get_text()
+
+    # 清理空白字符
+    lines = (line.strip() for line in text_content.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    clean_text = ' '.join(chunk for chunk in chunks if chunk)
+
+    # 获取标题和meta信息
+    title = soup.find('title')
+    title_text = title.get_text() if title else ""
+
+    # 提取meta标签内容
+    meta_content = []
+    for meta in soup.find_all('meta', {'name': ['description', 'keywords', 'author']}):
+        content_attr = meta.get('content', '')
+        if content_attr:
+            meta_content.append(content_attr)
+
+    # 合并所有内容
+    return f"{title_text} {clean_text} {' '.join(meta_content)}"
+
+
+class BrowserFetcher:
+    def __init__(self, pool=None):
+        self.pool = pool or get_browser_pool()
+
+    def extract_text(self, content):
+        """从渲染后的HTML中提取标题、正文和meta信息"""
+        return extract_text(content)
+
+    async def fetch_content(self, url, wait_selector=None, dom_idle_ms=None):
+        """获取动态网站内容（在浏览器池的事件循环中运行）"""
+        content = await self.pool.render(url, wait_selector, dom_idle_ms)
+        if content is None:
+            return None
+
+        # 文本提取是CPU密集操作，放到解析进程池中，不阻塞浏览器事件循环也不占用GIL
+        return await asyncio.wrap_future(get_parse_pool().submit(extract_text, content))
+
+    def submit_render(self, url, wait_selector=None, dom_idle_ms=None):
+        """提交渲染任务，Future结果为渲染后的完整HTML"""
+        return self.pool.loop.submit(self.pool.render(url, wait_selector, dom_idle_ms))
+
+    def submit(self, url, wait_selector=None, dom_idle_ms=None):
+        """提交到浏览器池的事件循环，返回concurrent.futures.Future"""
+        return self.pool.loop.submit(self.fetch_content(url, wait_selector, dom_idle_ms))
+
+    def fetch_content_sync(self, url, wait_selector=None, dom_idle_ms=None):
+        """同步版本的内容获取"""
+        try:
+            return self.submit(url, wait_selector, dom_idle_ms).result()
         except Exception as e:
             print(f"Error in sync fetch: {str(e)}")
-            return None
\ No newline at end of file
+            return None
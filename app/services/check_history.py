@@ -0,0 +1,338 @@
+import json
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from app import db
+from app.models import CheckResult, CheckRollup, RollupWatermark
+from config.config import Config
+
+# 延迟直方图的分桶上界（毫秒），最后一个桶收纳更慢的请求
+LATENCY_BUCKETS = [50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000, 20000, 60000]
+
+RESOLUTIONS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1)
+}
+
+# 每次汇总处理的原始结果上限
+ROLLUP_BATCH_SIZE = 5000
+
+WATERMARK_NAME = 'check_results'
+
+
+def bucket_start(moment, resolution):
+    if resolution == 'minute':
+        return moment.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def latency_bucket(latency_ms):
+    for index, upper in enumerate(LATENCY_BUCKETS):
+        if latency_ms <= upper:
+            return index
+    return len(LATENCY_BUCKETS)
+
+
+def parse_window(value, default='24h'):
+    """解析 30m / 24h / 7d 形式的时间窗口"""
+    value = (value or default).strip().lower()
+    units = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+    try:
+        return timedelta(**{units[value[-1]]: int(value[:-1])})
+    except (KeyError, ValueError):
+        return None
+
+
+def resolution_for(window):
+    """按查询窗口选择汇总粒度，使每次查询读取的行数基本固定"""
+    if window <= timedelta(hours=6):
+        return 'minute'
+    if window <= timedelta(days=14):
+        return 'hour'
+    return 'day'
+
+
+class _Aggregate:
+    """一个汇总桶的内存累加器"""
+
+    def __init__(self):
+        self.checks = 0
+        self.successes = 0
+        self.changes = 0
+        self.latency_count = 0
+        self.latency_sum = 0
+        self.latency_max = 0
+        self.ttfb_sum = 0
+        self.bytes_sum = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.errors = defaultdict(int)
+
+    def add(self, row):
+        self.checks += 1
+        self.successes += 1 if row.ok else 0
+        self.changes += 1 if row.changed else 0
+        if row.latency_ms is not None:
+            self.latency_count += 1
+            self.latency_sum += row.latency_ms
+            self.latency_max = max(self.latency_max, row.latency_ms)
+            self.histogram[latency_bucket(row.latency_ms)] += 1
+        self.ttfb_sum += row.ttfb_ms or 0
+        self.bytes_sum += row.bytes or 0
+        if row.error_class:
+            self.errors[row.error_class] += 1
+
+    def merge_into(self, rollup):
+        rollup.checks = (rollup.checks or 0) + self.checks
+        rollup.successes = (rollup.successes or 0) + self.successes
+        rollup.changes = (rollup.changes or 0) + self.changes
+        rollup.latency_count = (rollup.latency_count or 0) + self.latency_count
+        rollup.latency_sum = (rollup.latency_sum or 0) + self.latency_sum
+        rollup.latency_max = max(rollup.latency_max or 0, self.latency_max)
+        rollup.ttfb_sum = (rollup.ttfb_sum or 0) + self.ttfb_sum
+        rollup.bytes_sum = (rollup.bytes_sum or 0) + self.bytes_sum
+
+        histogram = json.loads(rollup.latency_histogram) if rollup.latency_histogram else [0] * len(self.histogram)
+        rollup.latency_histogram = json.dumps([a + b for a, b in zip(histogram, self.histogram)])
+
+        errors = json.loads(rollup.errors) if rollup.errors else {}
+        for error_class, count in self.errors.items():
+            errors[error_class] = errors.get(error_class, 0) + count
+        rollup.errors = json.dumps(errors) if errors else None
+
+
+def _percentile(histogram, total, fraction, latency_max):
+    """在直方图分桶内线性插值估算百分位"""
+    if not total:
+        return None
+    target = fraction * total
+    seen = 0
+    for index, count in enumerate(histogram):
+        if not count:
+            continue
+        if seen + count >= target:
+            lower = LATENCY_BUCKETS[index - 1] if index > 0 else 0
+            upper = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else latency_max
+            upper = min(upper, latency_max) if latency_max else upper
+            return round(lower + (upper - lower) * (target - seen) / count)
+        seen += count
+    return latency_max
+
+
+class CheckHistory:
+    """检查历史的时序存储
+
+    原始结果先缓存在内存中，每轮检查结束后批量插入；汇总任务读取rolled_up为假的结果，
+    同时累加到分钟、小时、天三个粒度并在同一事务中标记为已汇总，各粒度按保留期删除。查询按窗口选择粒度，
+    读取的行数与历史长度无关。
+    """
+
+    def __init__(self):
+        self.config = Config()
+        self.enabled = self.config.CHECK_HISTORY_ENABLED
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def record(self, website_id, result, changed=False):
+        """记录一次检查结果（FetchResult），写入缓冲区"""
+        if not self.enabled:
+            return
+        ok = result is not None and result.ok
+        row = {
+            'website_id': website_id,
+            'checked_at': datetime.utcnow(),
+            'ok': ok,
+            'changed': changed,
+            'status_code': result.status_code if result else None,
+            'latency_ms': result.elapsed_ms if result else None,
+            'ttfb_ms': result.ttfb_ms if result else None,
+            'bytes': result.size if result else None,
+            'error_class': None if ok else ((result.error_class if result else None) or 'FetchError')
+        }
+        with self._lock:
+            self._buffer.append(row)
+
+    def flush(self):
+        """批量写入缓冲区中的原始结果"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+
+        try:
+            db.session.execute(db.insert(CheckResult), rows)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error writing check history: {str(e)}")
+            return 0
+        return len(rows)
+
+    def _migrate_watermark(self):
+        """旧版本按ID水位汇总：水位以内的原始结果标记为已汇总，之后的等待汇总"""
+        watermark = db.session.get(RollupWatermark, WATERMARK_NAME)
+        if watermark is None:
+            return
+        for rolled_up in (True, False):
+            db.session.execute(
+                db.update(CheckResult)
+                .where(CheckResult.rolled_up.is_(None))
+                .where(CheckResult.id <= watermark.value if rolled_up else CheckResult.id > watermark.value)
+                .values(rolled_up=rolled_up)
+                .execution_options(synchronize_session=False)
+            )
+        db.session.delete(watermark)
+        db.session.commit()
+        print("Migrated check history rollup watermark")
+
+    def rollup(self):
+        """将尚未汇总的原始结果累加到各粒度的汇总表，返回处理的行数
+
+        按rolled_up标记而不是ID水位选取：多个进程写入时，ID较小的行可能晚于较大的行提交
+        """
+        self._migrate_watermark()
+        rows = CheckResult.query.filter(CheckResult.rolled_up.is_(False))\
+                                .order_by(CheckResult.id).limit(ROLLUP_BATCH_SIZE).all()
+        if not rows:
+            return 0
+
+        aggregates = defaultdict(_Aggregate)
+        for row in rows:
+            for resolution in RESOLUTIONS:
+                aggregates[(row.website_id, resolution, bucket_start(row.checked_at, resolution))].add(row)
+
+        for resolution in RESOLUTIONS:
+            keys = [key for key in aggregates if key[1] == resolution]
+            existing = {
+                (rollup.website_id, rollup.resolution, rollup.bucket_start): rollup
+                for rollup in CheckRollup.query.filter(
+                    CheckRollup.resolution == resolution,
+                    CheckRollup.website_id.in_({key[0] for key in keys}),
+                    CheckRollup.bucket_start.in_({key[2] for key in keys})
+                )
+            }
+            for key in keys:
+                rollup = existing.get(key)
+                if rollup is None:
+                    rollup = CheckRollup(website_id=key[0], resolution=key[1], bucket_start=key[2])
+                    db.session.add(rollup)
+                aggregates[key].merge_into(rollup)
+
+        # 与汇总结果在同一事务中标记已汇总，多个进程同时汇总同一批时只有一个能提交
+        ids = [row.id for row in rows]
+        result = db.session.execute(
+            db.update(CheckResult)
+            .where(CheckResult.id.in_(ids))
+            .where(CheckResult.rolled_up.is_(False))
+            .values(rolled_up=True)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(ids):
+            db.session.rollback()
+            return 0
+
+        db.session.commit()
+        return len(rows)
+
+    def prune(self):
+        """按保留期删除原始结果和各粒度的汇总"""
+        now = datetime.utcnow()
+        deleted = db.session.execute(
+            db.delete(CheckResult)
+            .where(CheckResult.checked_at < now - timedelta(hours=self.config.CHECK_RAW_RETENTION_HOURS))
+            .where(CheckResult.rolled_up.is_(True))
+        ).rowcount
+
+        retention = {
+            'minute': timedelta(days=self.config.CHECK_MINUTE_RETENTION_DAYS),
+            'hour': timedelta(days=self.config.CHECK_HOUR_RETENTION_DAYS),
+            'day': timedelta(days=self.config.CHECK_DAY_RETENTION_DAYS)
+        }
+        for resolution, keep in retention.items():
+            if not keep:
+                continue
+            deleted += db.session.execute(
+                db.delete(CheckRollup)
+                .where(CheckRollup.resolution == resolution)
+                .where(CheckRollup.bucket_start < now - keep)
+            ).rowcount
+
+        db.session.commit()
+        print(f"Pruned {deleted} check history rows")
+        return deleted
+
+    def purge_website(self, website_id):
+        """删除网站时清除其检查历史（不自动提交）"""
+        db.session.execute(db.delete(CheckResult).where(CheckResult.website_id == website_id))
+        db.session.execute(db.delete(CheckRollup).where(CheckRollup.website_id == website_id))
+
+    def _rollups(self, website_id, window):
+        resolution = resolution_for(window)
+        since = bucket_start(datetime.utcnow() - window, resolution)
+        rollups = CheckRollup.query.filter(
+            CheckRollup.website_id == website_id,
+            CheckRollup.resolution == resolution,
+            CheckRollup.bucket_start >= since
+        ).all()
+        return resolution, rollups
+
+    def uptime(self, website_id, window):
+        """窗口内的可用率"""
+        resolution, rollups = self._rollups(website_id, window)
+        checks = sum(rollup.checks or 0 for rollup in rollups)
+        successes = sum(rollup.successes or 0 for rollup in rollups)
+
+        errors = defaultdict(int)
+        for rollup in rollups:
+            for error_class, count in json.loads(rollup.errors or '{}').items():
+                errors[error_class] += count
+
+        return {
+            'resolution': resolution,
+            'checks': checks,
+            'successes': successes,
+            'changes': sum(rollup.changes or 0 for rollup in rollups),
+            'uptime': round(successes * 100.0 / checks, 3) if checks else None,
+            'errors': dict(errors)
+        }
+
+    def latency(self, website_id, window):
+        """窗口内的延迟统计和百分位（由直方图估算）"""
+        resolution, rollups = self._rollups(website_id, window)
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        count = total = ttfb = 0
+        latency_max = 0
+        for rollup in rollups:
+            for index, value in enumerate(json.loads(rollup.latency_histogram or '[]')):
+                histogram[index] += value
+            count += rollup.latency_count or 0
+            total += rollup.latency_sum or 0
+            ttfb += rollup.ttfb_sum or 0
+            latency_max = max(latency_max, rollup.latency_max or 0)
+
+        return {
+            'resolution': resolution,
+            'samples': count,
+            'avg_ms': round(total / count) if count else None,
+            'avg_ttfb_ms': round(ttfb / count) if count else None,
+            'max_ms': latency_max if count else None,
+            'p50_ms': _percentile(histogram, count, 0.50, latency_max),
+            'p90_ms': _percentile(histogram, count, 0.90, latency_max),
+            'p95_ms': _percentile(histogram, count, 0.95, latency_max),
+            'p99_ms': _percentile(histogram, count, 0.99, latency_max)
+        }
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_check_history():
+    """获取进程内共享的检查历史存储"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = CheckHistory()
+        return _history
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import CheckJob, Website
+from app.services.adaptive import FAILED
+from config.config import Config
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+JOB_FAILED = 'failed'
+OPEN_STATUSES = (PENDING, RUNNING)
+
+
+def pending_website_ids():
+    """有待执行手动检查任务的网站ID子查询（停用的网站也可以手动检查）"""
+    return db.select(CheckJob.website_id).where(CheckJob.status == PENDING)
+
+
+class CheckJobQueue:
+    """手动检查任务
+
+    Web请求只创建任务并把网站标记为立即到期，检查由调度器或worker在下一个周期
+    通过租约领取后执行，请求立即返回任务ID供轮询。同一网站已有未完成的任务时直接复用。
+    """
+
+    def __init__(self):
+        self.config = Config()
+
+    def submit(self, website_ids):
+        """为网站创建检查任务，返回 {网站ID: 任务}；已有未完成任务的网站复用原任务"""
+        website_ids = list(dict.fromkeys(website_ids))
+        if not website_ids:
+            return {}
+
+        jobs = {}
+        for job in CheckJob.query.filter(CheckJob.website_id.in_(website_ids), CheckJob.status.in_(OPEN_STATUSES))\
+                                 .order_by(CheckJob.id):
+            jobs.setdefault(job.website_id, job)
+
+        new_ids = [website_id for website_id in website_ids if website_id not in jobs]
+        if new_ids:
+            now = datetime.utcnow()
+            for website_id in new_ids:
+                jobs[website_id] = CheckJob(website_id=website_id, status=PENDING, created_at=now)
+                db.session.add(jobs[website_id])
+            # 网站立即到期，下一次领取时优先检查
+            db.session.execute(
+                db.update(Website)
+                .where(Website.id.in_(new_ids))
+                .values(next_check_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        return {website_id: jobs[website_id] for website_id in website_ids}
+
+    def start(self, website_ids):
+        """领取到网站租约后，将其待执行的任务标记为执行中"""
+        if not website_ids:
+            return
+        db.session.execute(
+            db.update(CheckJob)
+            .where(CheckJob.website_id.in_(list(website_ids)), CheckJob.status == PENDING)
+            .values(status=RUNNING, started_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    def finish(self, website_ids, outcomes, error=None):
+        """检查结束后完成网站的未完成任务；检查期间新提交的任务也由本次结果完成"""
+        by_outcome = {}
+        for website_id in website_ids:
+            by_outcome.setdefault(outcomes.get(website_id, FAILED), []).append(website_id)
+
+        now = datetime.utcnow()
+        for outcome, ids in by_outcome.items():
+            failed = outcome == FAILED
+            db.session.execute(
+                db.update(CheckJob)
+                .where(CheckJob.website_id.in_(ids), CheckJob.status.in_(OPEN_STATUSES))
+                .values(status=JOB_FAILED if failed else DONE, outcome=outcome, finished_at=now,
+                        error=(error or '抓取或处理失败') if failed else None)
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+
+    def prune(self):
+        """删除已完成的旧任务，长时间未执行的任务（如没有运行worker）标记为失败"""
+        now = datetime.utcnow()
+        expired = db.session.execute(
+            db.update(CheckJob)
+            .where(CheckJob.status.in_(OPEN_STATUSES),
+                   CheckJob.created_at < now - timedelta(seconds=self.config.CHECK_JOB_TIMEOUT))
+            .values(status=JOB_FAILED, outcome=FAILED, error='任务超时未执行', finished_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = db.session.execute(
+            db.delete(CheckJob)
+            .where(CheckJob.status.notin_(OPEN_STATUSES),
+                   CheckJob.finished_at < now - timedelta(hours=self.config.CHECK_JOB_RETENTION_HOURS))
+        )
+        db.session.commit()
+        if expired.rowcount or deleted.rowcount:
+            print(f"Expired {expired.rowcount} and pruned {deleted.rowcount} check job(s)")
+        return deleted.rowcount
@@ -0,0 +1,148 @@
+import difflib
+import re
+from config.config import Config
+
+# 超长行（如压缩后的单行HTML）按标签结尾或句末标点再切分
+TOKEN_SPLIT_PATTERN = re.compile(r'(?<=[>。！？!?；;])')
+LONG_LINE_LENGTH = 200
+# 差异输出中单行最多保留的字符数
+MAX_OUTPUT_LINE_LENGTH = 300
+
+
+def _clip(block):
+    if len(block) <= MAX_OUTPUT_LINE_LENGTH:
+        return block
+    return block[:MAX_OUTPUT_LINE_LENGTH] + '...'
+
+
+class DiffResult:
+    """结构化的差异结果"""
+
+    def __init__(self, text='', added=0, removed=0, regions=None, truncated=False):
+        self.text = text
+        self.added = added  # 新增的文本块数
+        self.removed = removed  # 删除的文本块数
+        self.regions = regions or []  # [(类型, 旧起始, 旧块数, 新起始, 新块数)]
+        self.truncated = truncated
+
+    @property
+    def changed_regions(self):
+        return sum(1 for region in self.regions if region[0] == 'replace')
+
+    def summary(self):
+        """生成变化摘要"""
+        if not self.regions:
+            return "内容发生变化"
+
+        parts = []
+        inserted = sum(1 for region in self.regions if region[0] == 'insert')
+        deleted = sum(1 for region in self.regions if region[0] == 'delete')
+        if inserted:
+            parts.append(f"新增 {inserted} 处")
+        if deleted:
+            parts.append(f"删除 {deleted} 处")
+        if self.changed_regions:
+            parts.append(f"修改 {self.changed_regions} 处")
+
+        return f"{'，'.join(parts)}（+{self.added} / -{self.removed} 行）"
+
+    def to_dict(self):
+        return {
+            'added': self.added,
+            'removed': self.removed,
+            'changed_regions': self.changed_regions,
+            'regions': len(self.regions),
+            'truncated': self.truncated
+        }
+
+
+class DiffEngine:
+    """有输出上限的差异引擎
+
+    先剥离相同的前缀和后缀，只对中间部分按文本块做比较；
+    中间部分过大时直接视为一处整体替换，避免SequenceMatcher的平方级开销。
+    """
+
+    def __init__(self, max_output_lines=None, max_compare_blocks=None):
+        config = Config()
+        self.max_output_lines = max_output_lines or config.DIFF_MAX_OUTPUT_LINES
+        self.max_compare_blocks = max_compare_blocks or config.DIFF_MAX_COMPARE_BLOCKS
+
+    def tokenize(self, text):
+        """按行切分文本块，超长行继续切分"""
+        blocks = []
+        for line in text.splitlines():
+            if len(line) <= LONG_LINE_LENGTH:
+                blocks.append(line)
+            else:
+                blocks.extend(piece for piece in TOKEN_SPLIT_PATTERN.split(line) if piece)
+        return blocks
+
+    def _opcodes(self, old_blocks, new_blocks):
+        """只对去掉公共前后缀后的中间部分计算差异"""
+        prefix = 0
+        limit = min(len(old_blocks), len(new_blocks))
+        while prefix < limit and old_blocks[prefix] == new_blocks[prefix]:
+            prefix += 1
+
+        suffix = 0
+        limit -= prefix
+        while suffix < limit and old_blocks[-1 - suffix] == new_blocks[-1 - suffix]:
+            suffix += 1
+
+        old_middle = old_blocks[prefix:len(old_blocks) - suffix]
+        new_middle = new_blocks[prefix:len(new_blocks) - suffix]
+
+        if not old_middle and not new_middle:
+            return []
+        if not old_middle:
+            return [('insert', prefix, prefix, prefix, prefix + len(new_middle))]
+        if not new_middle:
+            return [('delete', prefix, prefix + len(old_middle), prefix, prefix)]
+        if len(old_middle) + len(new_middle) > self.max_compare_blocks:
+            return [('replace', prefix, prefix + len(old_middle), prefix, prefix + len(new_middle))]
+
+        matcher = difflib.SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+        return [
+            (tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal'
+        ]
+
+    def diff(self, old_text, new_text):
+        """比较两段文本，输出不超过max_output_lines行"""
+        old_blocks = self.tokenize(old_text or '')
+        new_blocks = self.tokenize(new_text or '')
+
+        result = DiffResult()
+        lines = ['--- Previous', '+++ Current']
+        budget = self.max_output_lines
+
+        for tag, i1, i2, j1, j2 in self._opcodes(old_blocks, new_blocks):
+            result.regions.append((tag, i1, i2 - i1, j1, j2 - j1))
+            result.removed += i2 - i1
+            result.added += j2 - j1
+
+            # 截断后只统计区域，不再格式化任何行
+            if result.truncated:
+                continue
+
+            remaining = budget - len(lines)
+            if remaining <= 0:
+                result.truncated = True
+                continue
+
+            # 只格式化输出上限内的行，整页替换时也不会先生成全部差异行
+            lines.append(f'@@ -{i1 + 1},{i2 - i1} +{j1 + 1},{j2 - j1} @@')
+            remaining -= 1
+            old_count = min(i2 - i1, remaining)
+            lines.extend(f'-{_clip(block)}' for block in old_blocks[i1:i1 + old_count])
+            remaining -= old_count
+            new_count = min(j2 - j1, remaining)
+            lines.extend(f'+{_clip(block)}' for block in new_blocks[j1:j1 + new_count])
+            if old_count < i2 - i1 or new_count < j2 - j1:
+                result.truncated = True
+
+        if result.truncated:
+            lines.append('... 差异过长，已截断')
+        result.text = '\n'.join(lines) if result.regions else ''
+        return result
@@ -0,0 +1,202 @@
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from app import db
+from config.config import Config
+
+# 续传时最多补发的变化记录数
+MAX_BACKLOG = 200
+
+
+def format_sse(event, data, event_id=None):
+    """按Server-Sent Events格式编码一条事件"""
+    message = ''
+    if event_id is not None:
+        message += f'id: {event_id}\n'
+    message += f'event: {event}\n'
+    message += f'data: {json.dumps(data, ensure_ascii=False)}\n\n'
+    return message
+
+
+class Subscriber:
+    """一个SSE连接的事件队列"""
+
+    def __init__(self, maxsize=1000):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """进程内事件总线
+
+    每个进程只有一个后台线程读取最近的变化记录、检查结果和通知状态，
+    再分发给本进程的所有SSE连接，数据库读取量与连接数无关。
+
+    不按主键或时间水位增量读取：多个进程写入时ID较小的行可能较晚提交，
+    检查时间也在批量写入前就已确定。每次重新读取最近SSE_LOOKBACK_SECONDS秒内的行
+    （均走索引），按已发送的键去重。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.config = Config()
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # 回看窗口内已发送的事件：键 -> 时间，超出窗口后清除
+        self._seen_changes = {}
+        self._seen_checks = {}
+        self._seen_notifications = {}
+
+    def subscribe(self):
+        """注册连接，需要时先定位再启动跟踪线程，保证之后的续传查询不会漏掉记录"""
+        subscriber = Subscriber()
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._prime()
+                self._thread = threading.Thread(target=self._run, name='event-tail', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data, event_id=None):
+        message = (event, data, event_id)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.queue.put_nowait(message)
+            except queue.Full:
+                # 客户端消费过慢时断开，重连后按Last-Event-ID续传
+                subscriber.overflowed = True
+                self.unsubscribe(subscriber)
+
+    def _since(self):
+        return datetime.utcnow() - timedelta(seconds=self.config.SSE_LOOKBACK_SECONDS)
+
+    @staticmethod
+    def _unseen(seen, rows, since):
+        """清除超出窗口的键，返回尚未发送的行并记为已发送；rows为 (键, 时间, 行)"""
+        for key in [key for key, moment in seen.items() if moment < since]:
+            del seen[key]
+        fresh = []
+        for key, moment, row in rows:
+            if key not in seen:
+                seen[key] = moment
+                fresh.append(row)
+        return fresh
+
+    def _recent_changes(self, since):
+        from app.models import ChangeRecord
+
+        rows = db.session.execute(
+            db.select(ChangeRecord.id, ChangeRecord.created_at)
+            .where(ChangeRecord.created_at >= since).order_by(ChangeRecord.id)
+        ).all()
+        return [(row.id, row.created_at, row.id) for row in rows]
+
+    def _recent_checks(self, since):
+        from app.models import Website
+
+        rows = db.session.execute(
+            db.select(Website.id, Website.name, Website.last_checked).where(Website.last_checked >= since)
+        ).all()
+        return [((row.id, row.last_checked), row.last_checked, row) for row in rows]
+
+    def _recent_notifications(self, since):
+        from app.models import NotificationOutbox
+
+        rows = db.session.execute(
+            db.select(NotificationOutbox.id, NotificationOutbox.change_record_id, NotificationOutbox.sent_at)
+            .where(NotificationOutbox.sent_at >= since, NotificationOutbox.status == 'sent')
+        ).all()
+        return [(row.id, row.sent_at, row) for row in rows]
+
+    def _prime(self):
+        """从当前位置开始跟踪：窗口内已有的事件视为已发送"""
+        since = self._since()
+        self._seen_changes, self._seen_checks, self._seen_notifications = {}, {}, {}
+        self._unseen(self._seen_changes, self._recent_changes(since), since)
+        self._unseen(self._seen_checks, self._recent_checks(since), since)
+        self._unseen(self._seen_notifications, self._recent_notifications(since), since)
+
+    def _poll(self):
+        from app.models import ChangeRecord
+
+        since = self._since()
+        change_ids = self._unseen(self._seen_changes, self._recent_changes(since), since)
+        if change_ids:
+            records = ChangeRecord.query.options(joinedload(ChangeRecord.website))\
+                                        .filter(ChangeRecord.id.in_(change_ids))\
+                                        .order_by(ChangeRecord.id).all()
+            for record in records:
+                self.publish('change', record.to_log_dict(), record.id)
+
+        for row in self._unseen(self._seen_checks, self._recent_checks(since), since):
+            self.publish('check', {
+                'website_id': row.id,
+                'website_name': row.name,
+                'last_checked': row.last_checked.strftime('%Y-%m-%d %H:%M'),
+                'last_check_time': row.last_checked.strftime('%H:%M:%S')
+            })
+
+        for row in self._unseen(self._seen_notifications, self._recent_notifications(since), since):
+            self.publish('notification', {'change_record_id': row.change_record_id, 'notification_sent': True})
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                time.sleep(self.config.SSE_POLL_SECONDS)
+                with self._lock:
+                    if not self._subscribers:
+                        # 没有连接时停止跟踪，下次连接时重新定位
+                        self._thread = None
+                        return
+                try:
+                    self._poll()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error polling events: {str(e)}")
+                finally:
+                    db.session.remove()
+
+    def backlog(self, last_event_id):
+        """断线重连时补发Last-Event-ID之后的变化记录
+
+        回看窗口内的记录也一并补发（其中可能有晚于该ID提交的较小ID），由客户端按ID去重
+        """
+        from app.models import ChangeRecord
+
+        records = ChangeRecord.query.options(joinedload(ChangeRecord.website))\
+                                    .filter(or_(ChangeRecord.id > last_event_id,
+                                                ChangeRecord.created_at >= self._since()))\
+                                    .order_by(ChangeRecord.id).limit(MAX_BACKLOG).all()
+        return [('change', record.to_log_dict(), record.id) for record in records]
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_event_bus(app):
+    """获取进程内共享的事件总线"""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = EventBus(app)
+        return _bus
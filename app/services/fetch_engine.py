@@ -0,0 +1,565 @@
+import asyncio
+import atexit
+import codecs
+import contextlib
+import hashlib
+import ipaddress
+import re
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpcore
+import httpx
+
+from app.utils.event_loop import BackgroundLoop, InflightRequests
+from app.services.metrics import get_metrics
+from config.config import Config
+
+try:
+    import h2  # noqa: F401  HTTP/2需要安装h2（pip install httpx[http2]）
+except ImportError:
+    h2 = None
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'DNT': '1',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+# 没有校验器时要求中间缓存回源；带校验器时交给CDN/代理按If-None-Match/If-Modified-Since重新验证
+NO_CACHE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Pragma': 'no-cache'
+}
+
+
+# 未声明编码时在响应开头查找<meta charset>的字节数
+CHARSET_SNIFF_BYTES = 4096
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_.:-]+)', re.IGNORECASE)
+
+# httpcore跟踪事件对应的抓取阶段
+TRACE_PHASES = {
+    'connection.connect_tcp': 'connect',
+    'connection.start_tls': 'tls',
+}
+
+# httpcore异常对应的httpx异常，子类在前
+HTTPCORE_EXCEPTIONS = (
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.ProxyError, httpx.ProxyError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+)
+
+
+def _elapsed_ms(started):
+    return int((time.perf_counter() - started) * 1000)
+
+
+def parse_byte_range(value):
+    """解析 "起始-结束" 形式的字节范围（结束可省略，不含结束字节），格式错误时返回None"""
+    if not value:
+        return None
+    try:
+        start, _, end = value.strip().partition('-')
+        start = int(start or 0)
+        end = int(end) if end.strip() else None
+    except ValueError:
+        return None
+    if start < 0 or (end is not None and end <= start):
+        return None
+    return start, end
+
+
+class ResponseTooLarge(Exception):
+    """响应体超过FETCH_MAX_BYTES"""
+
+
+class StreamingBody:
+    """逐块读取响应体：限制总字节数，增量解码为文本，同时增量计算原始字节哈希
+
+    hash_range为 (起始, 结束) 时只对该字节范围计算哈希，范围读完即可判断是否变化
+    """
+
+    def __init__(self, max_bytes, encoding=None, hash_range=None):
+        self.max_bytes = max_bytes
+        self.encoding = encoding
+        self.hash_range = hash_range
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self._decoder = None
+        self._pending = b''
+        self._parts = []
+
+    @property
+    def range_complete(self):
+        """指定范围的字节已全部读取"""
+        return self.hash_range is not None and self.hash_range[1] is not None and self.size >= self.hash_range[1]
+
+    @property
+    def raw_hash(self):
+        return self._hasher.hexdigest()
+
+    def _detect_encoding(self, head):
+        if head.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        candidates = [self.encoding]
+        match = META_CHARSET_PATTERN.search(head[:CHARSET_SNIFF_BYTES])
+        if match:
+            candidates.append(match.group(1).decode('ascii', 'ignore'))
+        for candidate in candidates:
+            if not candidate:
+                continue
+            try:
+                return codecs.lookup(candidate).name
+            except LookupError:
+                continue
+        return 'utf-8'
+
+    def _hash(self, chunk, offset):
+        if self.hash_range is None:
+            self._hasher.update(chunk)
+            return
+        start, end = self.hash_range
+        lower = max(start - offset, 0)
+        upper = len(chunk) if end is None else min(end - offset, len(chunk))
+        if lower < upper:
+            self._hasher.update(chunk[lower:upper])
+
+    def _decode(self, data, final=False):
+        if self._decoder is None:
+            # 响应头没有声明编码时，先攒够开头的字节再判断编码
+            if not self.encoding and len(data) < CHARSET_SNIFF_BYTES and not final:
+                self._pending = data
+                return
+            self._decoder = codecs.getincrementaldecoder(self._detect_encoding(data))(errors='replace')
+        self._parts.append(self._decoder.decode(data, final))
+
+    def feed(self, chunk):
+        offset = self.size
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise ResponseTooLarge(f'response body exceeds {self.max_bytes} bytes')
+        self._hash(chunk, offset)
+
+        data = self._pending + chunk if self._pending else chunk
+        self._pending = b''
+        self._decode(data)
+
+    def finish(self):
+        """返回解码后的完整文本"""
+        self._decode(self._pending, final=True)
+        self._pending = b''
+        return ''.join(self._parts)
+
+
+class FetchResult:
+    """单次抓取的结果"""
+
+    def __init__(self, url, status_code=None, content=None, etag=None, last_modified=None, error=None,
+                 error_class=None, elapsed_ms=None, ttfb_ms=None, size=None, raw_hash=None, raw_unchanged=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.error = error
+        self.error_class = error_class  # 异常类型，HTTP错误为 "HTTP 状态码"
+        self.elapsed_ms = elapsed_ms  # 完整响应耗时
+        self.ttfb_ms = ttfb_ms  # 收到响应头的耗时
+        self.size = size  # 响应体字节数
+        self.raw_hash = raw_hash  # 原始字节（或指定字节范围）的哈希
+        self.raw_unchanged = raw_unchanged  # 原始哈希与上次相同，未读取完整内容
+
+    @property
+    def not_modified(self):
+        """服务器返回304，内容与上次相同"""
+        return self.status_code == 304
+
+    @property
+    def unchanged(self):
+        """服务器返回304或原始字节哈希与上次相同，无需规范化和对比"""
+        return self.not_modified or self.raw_unchanged
+
+    @property
+    def ok(self):
+        return self.error is None and (self.content is not None or self.unchanged)
+
+
+class TokenBucket:
+    """单主机令牌桶：平均每秒rate个请求，允许burst个突发（仅在抓取事件循环中使用，无需加锁）"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """预约一个令牌，返回需要等待的秒数；令牌不足时允许透支，排队的请求按顺序错开"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    """带DNS缓存的网络后端：同一主机的解析结果缓存ttl秒，连接失败时换下一个地址并清除缓存"""
+
+    def __init__(self, backend, ttl):
+        self._backend = backend
+        self.ttl = ttl
+        self._cache = {}
+        self.metrics = get_metrics()
+
+    async def _resolve(self, host, port):
+        try:
+            ipaddress.ip_address(host)
+            return [host]
+        except ValueError:
+            pass
+
+        entry = self._cache.get(host)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+
+        started = time.perf_counter()
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        self.metrics.fetch_phase_seconds.labels('dns').observe(time.perf_counter() - started)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[host] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        if not self.ttl:
+            return await self._backend.connect_tcp(host, port, timeout=timeout, local_address=local_address,
+                                                   socket_options=socket_options)
+        try:
+            addresses = await self._resolve(host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+
+        error = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(address, port, timeout=timeout, local_address=local_address,
+                                                       socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        self._cache.pop(host, None)
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds):
+        await self._backend.sleep(seconds)
+
+
+@contextlib.contextmanager
+def _map_httpcore_exceptions(request):
+    """将httpcore异常转换为对应的httpx异常，调用方按httpx异常类型统计错误"""
+    try:
+        yield
+    except Exception as e:
+        for core_class, http_class in HTTPCORE_EXCEPTIONS:
+            if isinstance(e, core_class):
+                raise http_class(str(e), request=request) from e
+        raise
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream, request):
+        self._stream = stream
+        self._request = request
+
+    async def __aiter__(self):
+        with _map_httpcore_exceptions(self._request):
+            async for chunk in self._stream:
+                yield chunk
+
+    async def aclose(self):
+        if hasattr(self._stream, 'aclose'):
+            await self._stream.aclose()
+
+
+class PoolTransport(httpx.AsyncBaseTransport):
+    """基于httpcore.AsyncConnectionPool的传输层
+
+    httpx.AsyncHTTPTransport不能指定网络后端，这里自行创建连接池，
+    通过公开的network_backend参数使用带DNS缓存的后端
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    async def handle_async_request(self, request):
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(scheme=request.url.raw_scheme, host=request.url.raw_host,
+                             port=request.url.port, target=request.url.raw_path),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions
+        )
+        with _map_httpcore_exceptions(request):
+            response = await self._pool.handle_async_request(core_request)
+        return httpx.Response(status_code=response.status, headers=response.headers,
+                              stream=_ResponseStream(response.stream, request), extensions=response.extensions)
+
+    async def aclose(self):
+        await self._pool.aclose()
+
+
+class FetchClient:
+    """进程内共享的抓取客户端
+
+    长期运行在独立事件循环中的httpx.AsyncClient：多轮检查和手动检查复用同一连接池，
+    同一源站的多个页面复用已建立的连接（安装h2时使用HTTP/2多路复用），避免重复TLS握手；
+    DNS解析结果缓存；每个主机限制并发连接数，并按令牌桶限制请求速率。
+    """
+
+    def __init__(self):
+        self.config = Config()
+        self.loop = BackgroundLoop('fetch-loop')
+        self.http2 = self.config.FETCH_HTTP2 and h2 is not None
+        self._client = None
+        self.global_limit = None
+        self._host_limits = {}
+        self._host_buckets = {}
+        # 进行中的抓取，手动检查与定时检查同时抓取同一页面时只发出一次请求
+        self.inflight = InflightRequests()
+        get_metrics().gauge('monitor_fetch_inflight_requests', '进行中的抓取请求数', collect=lambda: len(self.inflight))
+
+    def _create_client(self):
+        pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(http2=self.http2),
+            max_connections=self.config.FETCH_MAX_CONCURRENCY,
+            max_keepalive_connections=self.config.FETCH_MAX_CONCURRENCY,
+            keepalive_expiry=self.config.FETCH_KEEPALIVE_EXPIRY,
+            http2=self.http2,
+            network_backend=CachingNetworkBackend(httpcore.AnyIOBackend(), self.config.FETCH_DNS_TTL)
+        )
+        transport = PoolTransport(pool)
+
+        return httpx.AsyncClient(headers=DEFAULT_HEADERS, timeout=self.config.FETCH_TIMEOUT,
+                                 transport=transport, follow_redirects=True)
+
+    def _ensure_started(self):
+        """在抓取事件循环中初始化客户端和全局并发限制"""
+        if self._client is None:
+            self._client = self._create_client()
+            self.global_limit = asyncio.Semaphore(self.config.FETCH_MAX_CONCURRENCY)
+        return self._client
+
+    def host_limit(self, host):
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.config.FETCH_PER_HOST_LIMIT)
+        return limit
+
+    async def throttle(self, host):
+        """按主机令牌桶等待，FETCH_HOST_RATE为0时不限速"""
+        if self.config.FETCH_HOST_RATE <= 0:
+            return
+        bucket = self._host_buckets.get(host)
+        if bucket is None:
+            bucket = self._host_buckets[host] = TokenBucket(self.config.FETCH_HOST_RATE, self.config.FETCH_HOST_BURST)
+        wait = bucket.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def run(self, coro_factory, timeout=None):
+        """在抓取事件循环中执行 coro_factory(client) 并等待结果"""
+        async def runner():
+            return await coro_factory(self._ensure_started())
+        return self.loop.run(runner(), timeout)
+
+    async def _close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def shutdown(self):
+        """关闭连接池及其事件循环线程"""
+        try:
+            self.loop.run(self._close(), timeout=10)
+        except Exception as e:
+            print(f"Error shutting down fetch client: {str(e)}")
+        self.loop.stop()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_fetch_client():
+    """获取进程内共享的抓取客户端"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = FetchClient()
+            atexit.register(_client.shutdown)
+        return _client
+
+
+class AsyncFetchEngine:
+    """基于asyncio的并发抓取引擎，限制全局并发数、单主机并发数和单主机请求速率"""
+
+    def __init__(self, timeout=None, client=None, max_bytes=None):
+        config = Config()
+        self.timeout = timeout or config.FETCH_TIMEOUT
+        self.max_bytes = max_bytes or config.FETCH_MAX_BYTES
+        self.client = client or get_fetch_client()
+        self.metrics = get_metrics()
+
+    def fetch_all(self, urls, validators=None):
+        """同步入口：并发抓取一组URL，返回 {url: FetchResult}
+
+        validators为 {url: (etag, last_modified, raw_hash, hash_range)}：有ETag/Last-Modified时发送条件请求，
+        有raw_hash时读取过程中原始哈希与之相同即提前结束
+        """
+        unique_urls = list(dict.fromkeys(urls))
+        if not unique_urls:
+            return {}
+        validators = validators or {}
+        return self.client.run(lambda http: self._fetch_all(http, unique_urls, validators))
+
+    async def _fetch_all(self, http, urls, validators):
+        results = await asyncio.gather(*[
+            self._fetch_shared(http, url, validators.get(url))
+            for url in urls
+        ])
+        return dict(zip(urls, results))
+
+    async def _fetch_shared(self, http, url, validator):
+        """相同URL和校验器的抓取正在进行时直接等待其结果"""
+        key = (url, validator, self.max_bytes)
+        return await self.client.inflight.run(key, lambda: self._fetch_one(http, url, validator))
+
+    async def _fetch_one(self, http, url, validator):
+        host = urlsplit(url).hostname or ''
+
+        # 先占用主机配额再占用全局配额，避免排队等待同一主机时占着全局名额
+        async with self.client.host_limit(host):
+            await self.client.throttle(host)
+            async with self.client.global_limit:
+                result = await self._request(http, url, validator)
+        self._record(host, result)
+        return result
+
+    async def _request(self, http, url, validator):
+        print(f"Fetching HTML content from: {url}")
+        started = time.perf_counter()
+        ttfb_ms = None
+        try:
+            async with http.stream('GET', url, headers=self._conditional_headers(validator),
+                                   timeout=self.timeout, extensions={'trace': self._tracer()}) as response:
+                ttfb_ms = _elapsed_ms(started)
+                if response.status_code == 304:
+                    return FetchResult(url, status_code=304, elapsed_ms=ttfb_ms, ttfb_ms=ttfb_ms, size=0)
+                response.raise_for_status()
+                return await self._read_body(url, response, validator, started, ttfb_ms)
+        except Exception as e:
+            print(f"Error fetching content from {url}: {str(e)}")
+            status_code = None
+            error_class = type(e).__name__
+            if isinstance(e, httpx.HTTPStatusError):
+                status_code = e.response.status_code
+                error_class = f'HTTP {status_code}'
+            return FetchResult(url, status_code=status_code, error=str(e), error_class=error_class,
+                               elapsed_ms=_elapsed_ms(started), ttfb_ms=ttfb_ms)
+
+    def _tracer(self):
+        """记录新建连接的TCP连接和TLS握手耗时（复用连接的请求没有这两个阶段）"""
+        started = {}
+
+        async def trace(event_name, info):
+            name, _, stage = event_name.rpartition('.')
+            phase = TRACE_PHASES.get(name)
+            if phase is None:
+                return
+            if stage == 'started':
+                started[phase] = time.perf_counter()
+            elif stage == 'complete' and phase in started:
+                self.metrics.fetch_phase_seconds.labels(phase).observe(time.perf_counter() - started.pop(phase))
+        return trace
+
+    def _record(self, host, result):
+        """记录一次实际发出的请求的耗时、大小和结果"""
+        metrics = self.metrics
+        host = metrics.host_label(host)
+        if result.elapsed_ms is not None:
+            metrics.fetch_seconds.labels(host).observe(result.elapsed_ms / 1000)
+        if result.ttfb_ms is not None:
+            metrics.fetch_phase_seconds.labels('ttfb').observe(result.ttfb_ms / 1000)
+            if result.elapsed_ms is not None and result.status_code != 304:
+                metrics.fetch_phase_seconds.labels('download').observe((result.elapsed_ms - result.ttfb_ms) / 1000)
+        if result.error is not None:
+            metrics.fetch_responses.labels('error').inc()
+            metrics.fetch_errors.labels(host, result.error_class or 'FetchError').inc()
+            return
+        if result.size:
+            metrics.fetch_bytes.observe(result.size)
+        metrics.fetch_responses.labels(
+            'not_modified' if result.not_modified else 'raw_unchanged' if result.raw_unchanged else 'ok'
+        ).inc()
+
+    async def _read_body(self, url, response, validator, started, ttfb_ms):
+        """流式读取响应体，内存占用以FETCH_MAX_BYTES为上限"""
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            raise ResponseTooLarge(f'Content-Length {declared} exceeds {self.max_bytes} bytes')
+
+        previous_hash, hash_range = (validator[2], validator[3]) if validator else (None, None)
+        body = StreamingBody(self.max_bytes, response.charset_encoding, parse_byte_range(hash_range))
+
+        def result(**kwargs):
+            return FetchResult(
+                url,
+                status_code=response.status_code,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                elapsed_ms=_elapsed_ms(started),
+                ttfb_ms=ttfb_ms,
+                size=body.size,
+                raw_hash=body.raw_hash,
+                **kwargs
+            )
+
+        async for chunk in response.aiter_bytes():
+            body.feed(chunk)
+            # 只对指定范围计算哈希时，范围读完且未变化即停止读取
+            if previous_hash and body.range_complete and body.raw_hash == previous_hash:
+                return result(raw_unchanged=True)
+
+        content = body.finish()
+        if previous_hash and body.raw_hash == previous_hash:
+            return result(raw_unchanged=True)
+        return result(content=content)
+
+    def _conditional_headers(self, validator):
+        """根据上次保存的ETag/Last-Modified构造条件请求头，没有校验器时禁止使用缓存"""
+        headers = {}
+        if validator:
+            etag, last_modified = validator[:2]
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers or dict(NO_CACHE_HEADERS)
@@ -0,0 +1,225 @@
+import re
+import threading
+from collections import deque
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+MATCH_MODES = ('plain', 'word', 'regex')
+
+# 每个关键词最多记录的命中位置数
+MAX_OFFSETS_PER_KEYWORD = 5
+
+
+class _Automaton:
+    """纯Python实现的Aho-Corasick自动机，未安装pyahocorasick时使用"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append((index, len(pattern)))
+
+        # 广度优先构建失败指针
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def iter(self, text):
+        """逐个产出 (结束位置, 模式序号, 模式长度)"""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index, length in output[state]:
+                yield position, index, length
+
+
+def _build_automaton(patterns):
+    """优先使用C实现的pyahocorasick"""
+    if ahocorasick is None:
+        return _Automaton(patterns)
+
+    automaton = ahocorasick.Automaton()
+    for index, pattern in enumerate(patterns):
+        automaton.add_word(pattern, (index, len(pattern)))
+    automaton.make_automaton()
+    return automaton
+
+
+def _iter_automaton(automaton, text):
+    if isinstance(automaton, _Automaton):
+        yield from automaton.iter(text)
+    else:
+        for end, (index, length) in automaton.iter(text):
+            yield end, index, length
+
+
+def _casefold(text):
+    """返回 (折叠大小写后的文本, 位置映射)
+
+    个别字符折叠后长度会变化（如'ß'变为'ss'），此时映射折叠后每个字符在原文中的位置，
+    命中位置才能用于截取原文片段；长度不变时逐字符对应，不需要映射
+    """
+    folded = text.casefold()
+    if len(folded) == len(text):
+        return folded, None
+    positions = []
+    for position, char in enumerate(text):
+        positions.extend([position] * len(char.casefold()))
+    return folded, positions
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+class KeywordMatcher:
+    """编译后的多模式关键词匹配器，一次扫描文本即可匹配所有普通关键词
+
+    keywords为 (关键词, 匹配模式, 是否区分大小写) 列表，匹配模式：
+    plain - 子串匹配；word - 要求两侧为单词边界；regex - 正则表达式
+    """
+
+    def __init__(self, keywords):
+        self.keywords = [keyword for keyword, _, _ in keywords]
+        self.is_empty = not self.keywords
+
+        self._word_only = set()
+        self._regexes = []
+        insensitive, sensitive = [], []
+
+        for index, (keyword, mode, case_sensitive) in enumerate(keywords):
+            if not keyword:
+                continue
+            if mode == 'regex':
+                try:
+                    flags = 0 if case_sensitive else re.IGNORECASE
+                    self._regexes.append((index, re.compile(keyword, flags)))
+                except re.error as e:
+                    print(f"Invalid keyword regex {keyword!r}: {str(e)}")
+                continue
+
+            if mode == 'word':
+                self._word_only.add(index)
+            if case_sensitive:
+                sensitive.append((index, keyword))
+            else:
+                insensitive.append((index, keyword.casefold()))
+
+        self._insensitive = self._compile(insensitive)
+        self._sensitive = self._compile(sensitive)
+
+    @classmethod
+    def from_keywords(cls, keywords):
+        """从Keyword模型列表构建，只包含启用的关键词"""
+        return cls([
+            (kw.keyword, kw.match_mode or 'plain', bool(kw.case_sensitive))
+            for kw in keywords if kw.is_active is not False
+        ])
+
+    def _compile(self, entries):
+        if not entries:
+            return None
+        indexes = [index for index, _ in entries]
+        return indexes, _build_automaton([pattern for _, pattern in entries])
+
+    def _scan(self, compiled, text, hits, scanned=None, positions=None):
+        """在scanned（默认为text本身）中查找，positions为scanned中每个字符对应的text位置"""
+        if compiled is None:
+            return
+        indexes, automaton = compiled
+        for end, local_index, length in _iter_automaton(automaton, text if scanned is None else scanned):
+            index = indexes[local_index]
+            offsets = hits.setdefault(index, [])
+            if len(offsets) >= MAX_OFFSETS_PER_KEYWORD:
+                continue
+            start = end - length + 1
+            if positions is not None:
+                start, end = positions[start], positions[end]
+            if index in self._word_only:
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if end + 1 < len(text) and _is_word_char(text[end + 1]):
+                    continue
+            offsets.append((start, end + 1))
+
+    def search(self, text):
+        """返回 {关键词: [(起始位置, 结束位置), ...]}，按关键词定义顺序排列"""
+        if self.is_empty or not text:
+            return {}
+
+        hits = {}
+        if self._insensitive is not None:
+            self._scan(self._insensitive, text, hits, *_casefold(text))
+        self._scan(self._sensitive, text, hits)
+
+        for index, regex in self._regexes:
+            offsets = []
+            for match in regex.finditer(text):
+                offsets.append(match.span())
+                if len(offsets) >= MAX_OFFSETS_PER_KEYWORD:
+                    break
+            if offsets:
+                hits[index] = offsets
+
+        return {self.keywords[index]: hits[index] for index in sorted(hits) if hits[index]}
+
+    @staticmethod
+    def snippets(text, matches, width=30):
+        """为每个命中的关键词截取首个命中位置附近的上下文"""
+        result = {}
+        for keyword, offsets in matches.items():
+            start, end = offsets[0]
+            prefix = '...' if start > width else ''
+            suffix = '...' if end + width < len(text) else ''
+            snippet = text[max(0, start - width):end + width].replace('\n', ' ')
+            result[keyword] = f"{prefix}{snippet}{suffix}"
+        return result
+
+
+class KeywordMatcherCache:
+    """按网站缓存编译后的匹配器，关键词更新时间变化后重新编译"""
+
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, website):
+        version = website.keywords_updated_at
+        with self._lock:
+            entry = self._cache.get(website.id)
+        if entry and entry[0] == version:
+            return entry[1]
+
+        matcher = KeywordMatcher.from_keywords(website.keywords)
+        with self._lock:
+            self._cache[website.id] = (version, matcher)
+        return matcher
+
+    def invalidate(self, website_id):
+        with self._lock:
+            self._cache.pop(website_id, None)
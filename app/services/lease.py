@@ -0,0 +1,202 @@
+import os
+import random
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
+from app import db
+from app.models import Website
+from app.services.metrics import get_metrics
+from config.config import Config
+
+# 支持 SELECT ... FOR UPDATE SKIP LOCKED 的数据库
+SKIP_LOCKED_DIALECTS = ('postgresql', 'mysql', 'mariadb')
+
+
+def default_owner():
+    """租约持有者标识：主机名、进程号加随机后缀，进程重启后不会误认旧租约"""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+# 未设置或设置无效时的检查间隔（秒）
+DEFAULT_CHECK_INTERVAL = 300
+
+
+def positive_interval(value):
+    """转换为正整数秒数，无效时返回None"""
+    if isinstance(value, bool):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def check_interval_of(check_interval):
+    """检查间隔下限为调度周期，数据库中的值无效时使用默认间隔"""
+    return max(positive_interval(check_interval) or DEFAULT_CHECK_INTERVAL, Config.SCHEDULER_TICK_SECONDS)
+
+
+def next_check_time(check_interval, now=None):
+    """按检查间隔加随机抖动计算下次检查时间，避免所有网站同时到期"""
+    interval = check_interval_of(check_interval)
+    jitter = interval * Config.SCHEDULER_JITTER
+    return (now or datetime.utcnow()) + timedelta(seconds=interval + random.uniform(-jitter, jitter))
+
+
+def reset_next_check(website):
+    """检查间隔变更或重新启用后，下次检查时间不晚于按新间隔计算的时间"""
+    if not website.is_active:
+        return
+    interval = website.effective_interval if website.adaptive_interval else None
+    base = website.last_checked or datetime.utcnow()
+    due_at = base + timedelta(seconds=check_interval_of(interval or website.check_interval))
+    db.session.execute(
+        db.update(Website)
+        .where(Website.id == website.id)
+        .where(Website.next_check_at > due_at)
+        .values(next_check_at=due_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+class LeaseManager:
+    """基于数据库租约的检查队列
+
+    到期网站的领取即加租约：PostgreSQL/MySQL使用 SELECT ... FOR UPDATE SKIP LOCKED，
+    SQLite在同一事务中按条件UPDATE（写事务串行执行，条件不满足的行不会被重复领取）。
+    持有期间定期续约；进程崩溃时租约过期，网站可被其他进程重新领取。
+    """
+
+    def __init__(self, app=None, owner=None, ttl=None):
+        self.app = app
+        self.config = Config()
+        self.owner = owner or self.config.WORKER_ID or default_owner()
+        self.ttl = timedelta(seconds=ttl or self.config.LEASE_TTL_SECONDS)
+        self.metrics = get_metrics()
+
+    def _claimable(self, now):
+        # check_jobs依赖adaptive，adaptive又依赖本模块
+        from app.services.check_jobs import pending_website_ids
+
+        return [
+            # 停用的网站有待执行的手动检查任务时也可以领取
+            or_(Website.is_active.is_(True), Website.id.in_(pending_website_ids())),
+            or_(Website.next_check_at.is_(None), Website.next_check_at <= now),
+            or_(Website.lease_expires_at.is_(None), Website.lease_expires_at < now)
+        ]
+
+    def claim(self, limit, website_ids=None):
+        """领取最多limit个到期且未被持有的网站，返回领取到的网站"""
+        now = datetime.utcnow()
+        conditions = self._claimable(now)
+        if website_ids is not None:
+            if not website_ids:
+                return []
+            conditions.append(Website.id.in_(website_ids))
+
+        # 从未检查的网站优先，其余按到期时间先后
+        query = db.select(Website.id).where(*conditions)\
+                  .order_by(Website.next_check_at.isnot(None), Website.next_check_at)\
+                  .limit(limit)
+        if db.engine.dialect.name in SKIP_LOCKED_DIALECTS:
+            query = query.with_for_update(skip_locked=True)
+
+        try:
+            candidate_ids = db.session.execute(query).scalars().all()
+            if not candidate_ids:
+                db.session.rollback()
+                return []
+
+            db.session.execute(
+                db.update(Website)
+                .where(Website.id.in_(candidate_ids), *conditions)
+                .values(lease_owner=self.owner, lease_expires_at=now + self.ttl)
+                .execution_options(synchronize_session=False)
+            )
+            claimed_ids = db.session.execute(
+                db.select(Website.id)
+                .where(Website.id.in_(candidate_ids), Website.lease_owner == self.owner)
+            ).scalars().all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if not claimed_ids:
+            return []
+        # 一次查询预加载整批网站的关键词，避免检查时逐个网站懒加载
+        websites = Website.query.options(selectinload(Website.keywords))\
+                                .filter(Website.id.in_(claimed_ids)).order_by(Website.id).all()
+        for website in websites:
+            if website.next_check_at is not None:
+                self.metrics.scheduler_lag.observe(max((now - website.next_check_at).total_seconds(), 0))
+        return websites
+
+    def heartbeat(self, website_ids):
+        """为仍在处理的网站续约，返回续约成功的数量"""
+        if not website_ids:
+            return 0
+        result = db.session.execute(
+            db.update(Website)
+            .where(Website.id.in_(website_ids), Website.lease_owner == self.owner)
+            .values(lease_expires_at=datetime.utcnow() + self.ttl)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount
+
+    @contextmanager
+    def keepalive(self, website_ids):
+        """处理期间在后台线程中定期续约"""
+        website_ids = list(website_ids)
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.ttl.total_seconds() / 3):
+                with self.app.app_context():
+                    try:
+                        self.heartbeat(website_ids)
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"Error renewing leases: {str(e)}")
+
+        thread = None
+        if self.app is not None and website_ids:
+            thread = threading.Thread(target=beat, name='lease-heartbeat', daemon=True)
+            thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            if thread is not None:
+                thread.join()
+
+    def release(self, updates):
+        """释放租约并写入调度字段，updates为 {网站ID: {字段: 值}}，通常包含下次检查时间"""
+        for website_id, values in updates.items():
+            db.session.execute(
+                db.update(Website)
+                .where(Website.id == website_id, Website.lease_owner == self.owner)
+                .values(lease_owner=None, lease_expires_at=None, **(values or {}))
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+
+    def reap_expired(self):
+        """清除已过期的租约（持有进程已退出），返回清除的数量"""
+        result = db.session.execute(
+            db.update(Website)
+            .where(Website.lease_expires_at < datetime.utcnow())
+            .values(lease_owner=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount:
+            print(f"Reaped {result.rowcount} expired website lease(s)")
+        return result.rowcount
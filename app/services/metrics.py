@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               ProcessCollector, generate_latest, multiprocess, start_http_server)
+from prometheus_client.core import GaugeMetricFamily
+from config.config import Config
+
+# 耗时直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+# 超过主机数上限后，新出现的主机统一记为该标签
+OTHER_HOST = 'other'
+# 多进程模式下回调型仪表的采样周期（秒）
+GAUGE_SAMPLE_SECONDS = 5
+
+
+def multiprocess_enabled():
+    """设置PROMETHEUS_MULTIPROC_DIR时（Gunicorn多worker），各进程的指标写入该目录，抓取时合并"""
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def _collect(name, collect):
+    """调用回调函数，返回 {标签取值元组: 数值}，出错或无值时返回None"""
+    try:
+        collected = collect()
+    except Exception as e:
+        print(f"Error collecting metric {name}: {str(e)}")
+        return None
+    if collected is None:
+        return None
+    return collected if isinstance(collected, dict) else {(): collected}
+
+
+class _CallbackCollector:
+    """单进程模式下在抓取时调用回调函数生成仪表"""
+
+    def __init__(self, callbacks):
+        self.callbacks = callbacks
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        for name, (documentation, labelnames, collect) in list(self.callbacks.items()):
+            collected = _collect(name, collect)
+            if collected is None:
+                continue
+            family = GaugeMetricFamily(name, documentation, labels=labelnames)
+            for values, value in collected.items():
+                family.add_metric(list(values), value)
+            yield family
+
+
+class MetricsRegistry:
+    """基于prometheus_client的指标注册表
+
+    单进程时指标登记在本对象的注册表中；设置PROMETHEUS_MULTIPROC_DIR时使用
+    prometheus_client的多进程模式，任一Gunicorn worker响应/metrics都会合并所有worker的数据
+    """
+
+    def __init__(self, max_hosts=None):
+        config = Config()
+        self.max_hosts = config.METRICS_MAX_HOSTS if max_hosts is None else max_hosts
+        self.multiprocess = multiprocess_enabled()
+        self._metrics = {}
+        self._callbacks = {}  # 名称 -> (说明, 标签名, 回调函数)
+        self._hosts = set()
+        self._lock = threading.Lock()
+        self._sampler = None
+
+        if self.multiprocess:
+            # 指标写入共享目录，不登记到进程内的注册表；抓取时读取目录中所有进程的文件
+            self.registry = None
+            self._exposition = CollectorRegistry()
+            multiprocess.MultiProcessCollector(self._exposition)
+        else:
+            self.registry = CollectorRegistry()
+            ProcessCollector(registry=self.registry)
+            self.registry.register(_CallbackCollector(self._callbacks))
+            self._exposition = self.registry
+
+    def _register(self, name, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(name, lambda: Counter(name, documentation, labelnames, registry=self.registry))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(name, lambda: Histogram(name, documentation, labelnames, registry=self.registry,
+                                                      buckets=buckets))
+
+    def _gauge(self, name, documentation, labelnames=()):
+        # 多进程模式下按存活进程求和
+        return self._register(name, lambda: Gauge(name, documentation, labelnames, registry=self.registry,
+                                                  multiprocess_mode='livesum'))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        """collect为取值函数，返回数值或 {标签取值元组: 数值}；同名仪表改为由最新注册的函数提供取值"""
+        if collect is None:
+            return self._gauge(name, documentation, labelnames)
+        with self._lock:
+            self._callbacks[name] = (documentation, tuple(labelnames), collect)
+        if self.multiprocess:
+            self._start_sampler()
+        return None
+
+    def _start_sampler(self):
+        with self._lock:
+            if self._sampler is not None:
+                return
+            self._sampler = threading.Thread(target=self._sample_callbacks, name='metrics-sampler', daemon=True)
+        self._sampler.start()
+
+    def _sample_callbacks(self):
+        """多进程模式：响应抓取的进程无法调用其他进程的回调，各进程定期把取值写入共享目录"""
+        while True:
+            with self._lock:
+                callbacks = list(self._callbacks.items())
+            for name, (documentation, labelnames, collect) in callbacks:
+                collected = _collect(name, collect)
+                if collected is None:
+                    continue
+                gauge = self._gauge(name, documentation, labelnames)
+                for values, value in collected.items():
+                    (gauge.labels(*values) if labelnames else gauge).set(value)
+            time.sleep(GAUGE_SAMPLE_SECONDS)
+
+    def host_label(self, host):
+        """主机标签：只为最先出现的max_hosts个主机单独计数，避免标签数量无限增长"""
+        host = host or ''
+        if host in self._hosts:
+            return host
+        with self._lock:
+            if len(self._hosts) < self.max_hosts:
+                self._hosts.add(host)
+                return host
+        return OTHER_HOST
+
+    @property
+    def exposition_registry(self):
+        """抓取时使用的注册表"""
+        return self._exposition
+
+    def expose(self):
+        """生成Prometheus文本格式"""
+        return generate_latest(self._exposition)
+
+
+class PipelineMetrics(MetricsRegistry):
+    """检查流水线各阶段的指标"""
+
+    def __init__(self, max_hosts=None):
+        super().__init__(max_hosts)
+        # 抓取
+        self.fetch_seconds = self.histogram(
+            'monitor_fetch_duration_seconds', '完整抓取耗时', ['host'])
+        self.fetch_phase_seconds = self.histogram(
+            'monitor_fetch_phase_seconds', '抓取各阶段耗时（dns/connect/tls/ttfb/download）', ['phase'])
+        self.fetch_bytes = self.histogram(
+            'monitor_fetch_response_bytes', '响应体字节数',
+            buckets=(1024, 8192, 32768, 131072, 524288, 2097152, 8388608))
+        self.fetch_responses = self.counter(
+            'monitor_fetch_responses_total', '抓取结果（200/304/raw_unchanged/error）', ['result'])
+        self.fetch_errors = self.counter(
+            'monitor_fetch_errors_total', '抓取失败次数，按主机和错误类型', ['host', 'error_class'])
+        # 解析和对比
+        self.stage_seconds = self.histogram(
+            'monitor_stage_seconds', '检查流水线各阶段耗时（parse/normalize/hash/diff/keyword_match/db_flush/notify）',
+            ['stage'])
+        self.checks = self.counter('monitor_checks_total', '网站检查结果', ['outcome'])
+        self.batch_seconds = self.histogram('monitor_batch_seconds', '一批网站从抓取到写库的耗时')
+        self.batch_size = self.histogram(
+            'monitor_batch_websites', '每批检查的网站数', buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+        self.sweep_seconds = self.histogram(
+            'monitor_sweep_seconds', '全量检查一轮活跃网站的耗时', buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800))
+        self.scheduler_lag = self.histogram(
+            'monitor_scheduler_lag_seconds', '网站到期到被领取检查的延迟')
+        self.flushed_rows = self.counter('monitor_db_flushed_websites_total', '批量写入的网站检查结果数')
+        # 通知
+        self.notifications = self.counter(
+            'monitor_notifications_total', 'Webhook消息发送结果（sent/failed/rate_limited）', ['result'])
+        # 浏览器渲染
+        self.render_seconds = self.histogram('monitor_browser_render_seconds', '浏览器渲染页面耗时')
+        self.browser_launches = self.counter('monitor_browser_launches_total', '浏览器启动（含崩溃后重启）次数')
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """获取进程内共享的指标注册表"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = PipelineMetrics()
+        return _metrics
+
+
+def start_metrics_server(port, host=None):
+    """在后台线程中暴露/metrics，供不提供HTTP服务的worker和协调进程使用，默认只监听本机"""
+    host = host or Config.METRICS_HOST
+    server, _ = start_http_server(port, addr=host, registry=get_metrics().exposition_registry)
+    print(f"Metrics available on http://{host}:{port}/metrics")
+    return server
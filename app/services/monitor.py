@@ -1,200 +1,326 @@
-import hashlib
-import requests
-import difflib
 import json
+import threading
+import time
 from datetime import datetime
-from bs4 import BeautifulSoup
+from urllib.parse import urlsplit
+from sqlalchemy.orm import selectinload
 from app import db
-from app.models import Website, ChangeRecord, Keyword
+from app.models import Website, ChangeRecord, NotificationOutbox
 from app.services.notification import NotificationService
+from app.services.fetch_engine import AsyncFetchEngine, FetchResult
+from app.services.snapshot_store import SnapshotStore
+from app.services.normalizer import ContentNormalizer
+from app.services.keyword_matcher import KeywordMatcher, KeywordMatcherCache
+from app.services.diff_engine import DiffEngine
+from app.services.check_history import get_check_history
+from app.services.parse_pool import get_parse_pool
+from app.services.result_writer import get_result_writer
+from app.services.metrics import get_metrics
+from app.services.adaptive import CHANGED, UNCHANGED, FAILED
+from config.config import Config
 
 class WebsiteMonitor:
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        })
+        self.config = Config()
+        self.fetch_engine = AsyncFetchEngine()
         self.notification_service = NotificationService()
+        self.snapshot_store = SnapshotStore()
+        self.normalizer = ContentNormalizer()
+        self.keyword_matchers = KeywordMatcherCache()
+        self.diff_engine = DiffEngine()
+        self.check_history = get_check_history()
+        self.parse_pool = get_parse_pool()
+        self.result_writer = get_result_writer()
+        self.metrics = get_metrics()
+
+    @staticmethod
+    def fetch_validator(website):
+        """网站的条件请求校验器 (etag, last_modified, raw_hash, hash_range)
+
+        首次检查不带校验器，但字节范围始终传入，保证保存的原始哈希口径一致
+        """
+        if website.last_content_hash:
+            return website.etag, website.last_modified, website.last_raw_hash, website.hash_range
+        return None, None, None, website.hash_range
+
+    def fetch_websites(self, websites):
+        """并发抓取一组网站，返回 {网站ID: FetchResult}
+
+        多个网站监控同一URL时只抓取一次，结果分发给每个网站；各网站的校验器一致时发送条件请求，
+        不一致（如新加入的网站尚无内容）时完整抓取。需要JS渲染的网站按URL和渲染参数合并后
+        提交到浏览器池，与普通HTTP抓取同时进行
+        """
+        rendered = {}
+        plain = {}
+        for website in websites:
+            if website.render_js:
+                rendered.setdefault((website.url, website.wait_selector, website.dom_idle_ms), []).append(website)
+            else:
+                plain.setdefault(website.url, []).append(website)
+
+        render_futures = {}
+        if rendered:
+            from app.services.browser_fetcher import BrowserFetcher
+            browser_fetcher = BrowserFetcher()
+            render_futures = {key: browser_fetcher.submit_render(*key) for key in rendered}
+
+        validators = {}
+        for url, group in plain.items():
+            candidates = {self.fetch_validator(website) for website in group}
+            if len(candidates) == 1:
+                validators[url] = candidates.pop()
+            else:
+                hash_ranges = {website.hash_range for website in group}
+                validators[url] = (None, None, None, hash_ranges.pop() if len(hash_ranges) == 1 else None)
+        fetched = self.fetch_engine.fetch_all(list(plain), validators)
 
-    def fetch_website_content(self, url, timeout=15):
-        """获取网站HTML内容"""
-        print(f"Fetching HTML content from: {url}")
+        results = {}
+        for url, group in plain.items():
+            for website in group:
+                results[website.id] = fetched[url]
 
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Cache-Control': 'no-cache',
-                'Pragma': 'no-cache'
-            }
-
-            response = self.session.get(url, timeout=timeout, headers=headers)
-            response.raise_for_status()
-
-            return response.text
-
-        except Exception as e:
-            print(f"Error fetching content from {url}: {str(e)}")
-            return None
-
-    def calculate_content_hash(self, content):
-        """计算内容哈希值"""
-        return hashlib.sha256(content.encode('utf-8')).hexdigest()
-
-    def check_keywords_match(self, html_content, keywords):
-        """检查HTML内容中是否包含关键词"""
-        matched_keywords = []
-        html_lower = html_content.lower()
-
-        for keyword in keywords:
-            if keyword.keyword.lower() in html_lower:
-                matched_keywords.append(keyword.keyword)
-
-        return matched_keywords
-
-    def generate_diff(self, old_html, new_html):
-        """生成HTML差异"""
-        if not old_html:
-            return "首次检测"
-
-        old_lines = old_html.splitlines()
-        new_lines = new_html.splitlines()
-
-        diff = list(difflib.unified_diff(
-            old_lines,
-            new_lines,
-            fromfile='Previous HTML',
-            tofile='Current HTML',
-            lineterm='',
-            n=3
-        ))
-
-        return '\n'.join(diff[:50])
-
-    def generate_change_summary(self, old_html, new_html):
-        """生成HTML变化摘要"""
-        if not old_html:
-            return "首次抓取HTML"
-
-        old_length = len(old_html)
-        new_length = len(new_html)
-
-        if new_length > old_length:
-            return f"HTML增加了 {new_length - old_length} 个字符"
-        elif new_length < old_length:
-            return f"HTML减少了 {old_length - new_length} 个字符"
-        else:
-            return "HTML内容发生变化"
+        for key, future in render_futures.items():
+            url = key[0]
+            try:
+                content = future.result()
+                if content is None:
+                    result = FetchResult(url, error='render failed', error_class='RenderError')
+                else:
+                    result = FetchResult(url, status_code=200, content=content, size=len(content.encode('utf-8')))
+            except Exception as e:
+                print(f"Error rendering {url}: {str(e)}")
+                result = FetchResult(url, error=str(e), error_class=type(e).__name__)
+            if result.error is not None:
+                host = self.metrics.host_label(urlsplit(url).hostname)
+                self.metrics.fetch_errors.labels(host, result.error_class).inc()
+            for website in rendered[key]:
+                results[website.id] = result
+
+        return results
 
     def monitor_website(self, website):
         """监控单个网站的HTML变化"""
         print(f"Checking website: {website.name} ({website.url})")
 
         # 获取当前HTML内容
-        current_html = self.fetch_website_content(website.url)
+        website_id = website.id
+        result = self.fetch_websites([website]).get(website_id)
+        try:
+            ok = self.process_fetch_result(website, result)
+        finally:
+            self.result_writer.flush()
+            self.check_history.flush()
+        # 检查结果没能写入数据库时按失败处理
+        return ok and not self.result_writer.take_unsaved([website_id])
+
+    def process_fetch_result(self, website, result, normalized=None):
+        """处理抓取结果，返回是否成功"""
+        return self.check_fetch_result(website, result, normalized) != FAILED
+
+    def check_fetch_result(self, website, result, normalized=None):
+        """处理抓取结果并写入检查历史，返回 changed / unchanged / failed
+
+        normalized为已提交到解析进程池的规范化任务
+        """
+        website_id = website.id
+        outcome = FAILED
+        try:
+            outcome = self._handle_fetch_result(website, result, normalized)
+        finally:
+            self.check_history.record(website_id, result, changed=outcome == CHANGED)
+        return outcome
+
+    def _handle_fetch_result(self, website, result, normalized=None):
+        """处理抓取结果：304直接判定无变化，否则保存校验器并对比内容，返回检查结果"""
+        if result is None or not result.ok:
+            print(f"Failed to fetch HTML content for {website.url}")
+            return FAILED
+
+        if result.unchanged:
+            values = {'last_checked': datetime.utcnow()}
+            if result.raw_unchanged:
+                values.update(etag=result.etag, last_modified=result.last_modified)
+            self.result_writer.save(website, values)
+            reason = '304 Not Modified' if result.not_modified else 'raw hash unchanged'
+            print(f"No HTML changes detected for {website.name} ({reason})")
+            return UNCHANGED
+
+        # 校验器与内容处理结果一起写入，处理失败时不会保存
+        values = {'etag': result.etag, 'last_modified': result.last_modified, 'last_raw_hash': result.raw_hash}
+        return self._process_content(website, result.content, normalized, values)
+
+    def _process_content(self, website, current_html, normalized=None, values=None):
+        """处理已抓取的HTML，返回 changed / unchanged / failed"""
         if current_html is None:
             print(f"Failed to fetch HTML content for {website.url}")
-            return False
+            return FAILED
 
-        # 计算当前HTML哈希
-        current_hash = self.calculate_content_hash(current_html)
+        # 规范化后再计算哈希，避免脚本、随机令牌等噪声被当作变化；解析在进程池中执行
+        current_content, current_hash = self.parse_pool.normalize(website, current_html, normalized)
 
         # 更新检查时间
-        website.last_checked = datetime.utcnow()
+        checked_at = datetime.utcnow()
+        values = dict(values or {}, last_checked=checked_at)
 
-        # 如果是第一次检查，直接保存哈希值
+        # 如果是第一次检查，直接保存哈希值和快照
         if not website.last_content_hash:
-            website.last_content_hash = current_hash
-            db.session.commit()
+            values['last_content_hash'] = current_hash
+            self.result_writer.save(website, values, snapshot=(current_content, current_hash))
             print(f"First check for {website.name}, saved HTML hash")
-            return True
+            return UNCHANGED
 
         # 检查HTML是否有变化
         if current_hash != website.last_content_hash:
-            print(f"HTML content changed for {website.name}")
+            # 获取旧内容 - 按上次的哈希从快照库读取完整内容（可能还在写入缓冲中）
+            old_content = self.result_writer.pending_snapshot(website.last_content_hash) or \
+                self.snapshot_store.get(website.last_content_hash)
+
+            # 没有上次的快照（如升级后哈希口径变化、快照已清理）时无法判断是否真的变化：
+            # 只重新建立基准，不产生变化记录和通知
+            if old_content is None:
+                values['last_content_hash'] = current_hash
+                self.result_writer.save(website, values, snapshot=(current_content, current_hash))
+                print(f"No previous snapshot for {website.name}, saved new baseline")
+                return UNCHANGED
 
-            # 获取旧HTML - 从最近的变化记录中获取
-            old_html = ""
-            latest_record = ChangeRecord.query.filter_by(website_id=website.id)\
-                                              .order_by(ChangeRecord.created_at.desc()).first()
-            if latest_record:
-                old_html = latest_record.content_after
+            print(f"HTML content changed for {website.name}")
 
-            # 生成差异和变化摘要
-            diff_content = self.generate_diff(old_html, current_html)
-            change_summary = self.generate_change_summary(old_html, current_html)
+            # 生成差异和变化摘要（只计算一次差异）
+            diff_content, change_summary = self.parse_pool.diff(old_content, current_content)
 
-            # 检查关键词匹配
-            matched_keywords = self.check_keywords_match(current_html, website.keywords)
+            # 检查关键词匹配：使用按网站缓存的多模式匹配器，一次扫描完成
+            with self.metrics.stage_seconds.labels('keyword_match').time():
+                matcher = self.keyword_matchers.get(website)
+                keyword_matches = matcher.search(current_content)
+                matched_keywords = list(keyword_matches)
+                keyword_snippets = KeywordMatcher.snippets(current_content, keyword_matches)
 
             # 创建变化记录
             change_record = ChangeRecord(
                 website_id=website.id,
                 change_type='keyword_matched' if matched_keywords else 'html_changed',
-                content_after=current_html[:5000],  # 存储更多HTML用于下次比较
+                content_after=current_content[:1000],  # 仅用于页面预览
                 diff_content=diff_content,
-                matched_keywords=json.dumps(matched_keywords) if matched_keywords else None
+                matched_keywords=json.dumps(matched_keywords) if matched_keywords else None,
+                created_at=checked_at
             )
 
-            db.session.add(change_record)
-
             # 发送通知逻辑：
             # 1. 如果没有设置关键词，所有变化都通知
             # 2. 如果设置了关键词，只有匹配时才通知
             should_notify = False
-            if not website.keywords:  # 没有设置关键词，所有变化都通知
+            if matcher.is_empty:  # 没有设置关键词，所有变化都通知
                 should_notify = True
                 matched_keywords = []  # 空列表表示没有关键词过滤
             elif matched_keywords:  # 有关键词且匹配，发送通知
                 should_notify = True
 
             if should_notify:
-                try:
-                    print(f"Sending notification for {website.name}...")
-                    success = self.notification_service.send_notification(
-                        website, change_record, matched_keywords, change_summary
-                    )
-                    change_record.notification_sent = success
-                    if success:
-                        print(f"Notification sent successfully for {website.name}")
-                    else:
-                        print(f"Notification failed for {website.name}")
-                except Exception as e:
-                    print(f"Failed to send notification for {website.name}: {str(e)}")
+                # 通知写入队列，与变化记录在同一事务中提交，由后台分发器异步发送
+                payload = self.notification_service.build_payload(
+                    website, matched_keywords, change_summary, keyword_snippets
+                )
+                change_record.notifications.append(NotificationOutbox(
+                    website_id=website.id,
+                    payload=json.dumps(payload, ensure_ascii=False)
+                ))
+                print(f"Queued notification for {website.name}")
             else:
                 print(f"HTML changed for {website.name}, but no keywords matched")
 
-            # 更新网站哈希值
-            website.last_content_hash = current_hash
-
-            db.session.commit()
-            return True
+            # 更新网站哈希值；变化记录和通知随同一批结果写入
+            values['last_content_hash'] = current_hash
+            self.result_writer.save(website, values, snapshot=(current_content, current_hash),
+                                    change_record=change_record)
+            return CHANGED
         else:
             print(f"No HTML changes detected for {website.name}")
-            db.session.commit()
-            return True
+            self.result_writer.save(website, values)
+            return UNCHANGED
+
+    def monitor_websites(self, websites):
+        """并发抓取一组网站后逐个处理，返回 {网站ID: 检查结果}"""
+        started = time.perf_counter()
+        # 并发抓取，耗时取决于最慢的一次抓取
+        results = self.fetch_websites(websites)
+
+        # 先把整批页面的规范化一次性提交到进程池并行解析，再按顺序写库；
+        # 同一页面上区域和忽略规则相同的网站共用一次规范化
+        normalized = {}
+        shared = {}
+        for website in websites:
+            result = results.get(website.id)
+            if result is not None and result.ok and not result.unchanged:
+                key = (id(result), website.content_selector, website.ignore_selectors, website.ignore_patterns)
+                if key not in shared:
+                    shared[key] = self.parse_pool.submit_normalize(website, result.content)
+                normalized[website.id] = shared[key]
+
+        outcomes = {}
+        for website in websites:
+            website_id = website.id
+            try:
+                outcomes[website_id] = self.check_fetch_result(website, results.get(website_id),
+                                                               normalized.get(website_id))
+            except Exception as e:
+                db.session.rollback()
+                outcomes[website_id] = FAILED
+                print(f"Error monitoring {website.name}: {str(e)}")
+
+        # 本轮剩余的检查结果和检查历史批量写入
+        self.result_writer.flush()
+        self.check_history.flush()
+        # 没能写入数据库（等待重试或已放弃）的检查结果按失败上报，检查任务和调度也据此处理
+        for website_id in self.result_writer.take_unsaved(outcomes):
+            outcomes[website_id] = FAILED
+
+        for outcome in outcomes.values():
+            self.metrics.checks.labels(outcome).inc()
+        self.metrics.batch_size.observe(len(websites))
+        self.metrics.batch_seconds.observe(time.perf_counter() - started)
+        return outcomes
+
+    def iter_active_websites(self, chunk_size=None):
+        """按主键顺序分块读取活跃网站，每块用一次查询预加载关键词"""
+        chunk_size = chunk_size or self.config.SWEEP_CHUNK_SIZE
+        last_id = 0
+        while True:
+            chunk = Website.query.options(selectinload(Website.keywords))\
+                                 .filter(Website.is_active.is_(True), Website.id > last_id)\
+                                 .order_by(Website.id).limit(chunk_size).all()
+            if not chunk:
+                return
+            last_id = chunk[-1].id
+            yield chunk
 
     def monitor_all_websites(self):
-        """监控所有活跃的网站"""
-        active_websites = Website.query.filter_by(is_active=True).all()
+        """监控所有活跃的网站
 
-        print(f"Starting monitoring of {len(active_websites)} websites")
+        逐块检查，处理完的网站及其关键词从会话中移除，内存占用与网站总数无关
+        """
+        print("Starting monitoring of active websites")
+
+        started = time.perf_counter()
+        total = 0
+        for chunk in self.iter_active_websites():
+            self.monitor_websites(chunk)
+            total += len(chunk)
+            for website in chunk:
+                if website in db.session:
+                    db.session.expunge(website)
+
+        self.metrics.sweep_seconds.observe(time.perf_counter() - started)
+        print(f"Monitoring cycle completed ({total} websites)")
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
 
-        for website in active_websites:
-            try:
-                self.monitor_website(website)
-            except Exception as e:
-                print(f"Error monitoring {website.name}: {str(e)}")
 
-        print("Monitoring cycle completed")
\ No newline at end of file
+def get_website_monitor():
+    """获取进程内共享的监控器，手动检查复用抓取连接池和关键词匹配器缓存"""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = WebsiteMonitor()
+        return _monitor
@@ -0,0 +1,102 @@
+import re
+from bs4 import BeautifulSoup, Comment
+from config.config import Config
+
+try:
+    import lxml  # noqa: F401
+except ImportError:
+    lxml = None
+
+# 不包含可见文本或内容随每次请求变化的标签
+NOISE_TAGS = ['script', 'style', 'noscript', 'template', 'iframe', 'svg']
+
+
+def html_parser():
+    """BeautifulSoup使用的解析器：安装了lxml时默认使用更快的lxml"""
+    parser = Config.HTML_PARSER
+    if parser == 'auto':
+        return 'lxml' if lxml is not None else 'html.parser'
+    if parser == 'lxml' and lxml is None:
+        return 'html.parser'
+    return parser
+
+
+def split_lines(value):
+    """将多行配置拆分为非空列表"""
+    if not value:
+        return []
+    return [line.strip() for line in value.splitlines() if line.strip()]
+
+
+class ContentNormalizer:
+    """哈希前的内容规范化：去除脚本样式、易变元素和噪声文本，只保留可见文本"""
+
+    def __init__(self):
+        self.config = Config()
+        self.enabled = self.config.NORMALIZE_CONTENT
+        self.parser = html_parser()
+        self.ignore_selectors = [self.config.NORMALIZE_IGNORE_SELECTOR] if self.config.NORMALIZE_IGNORE_SELECTOR else []
+        self.ignore_patterns = self._compile_patterns(
+            [self.config.NORMALIZE_IGNORE_PATTERN] if self.config.NORMALIZE_IGNORE_PATTERN else []
+        )
+
+    def _compile_patterns(self, patterns):
+        compiled = []
+        for pattern in patterns:
+            try:
+                compiled.append(re.compile(pattern))
+            except re.error as e:
+                print(f"Invalid ignore pattern {pattern!r}: {str(e)}")
+        return compiled
+
+    def _select(self, soup, selector):
+        try:
+            return soup.select(selector)
+        except Exception as e:
+            print(f"Invalid CSS selector {selector!r}: {str(e)}")
+            return []
+
+    def normalize(self, html, content_selector=None, ignore_selectors=None, ignore_patterns=None):
+        """返回规范化后的文本，每个文本块一行"""
+        if not self.enabled:
+            return html
+        return self.extract(self.parse(html), content_selector, ignore_selectors, ignore_patterns)
+
+    def parse(self, html):
+        return BeautifulSoup(html, self.parser)
+
+    def extract(self, soup, content_selector=None, ignore_selectors=None, ignore_patterns=None):
+        """从解析后的文档中提取规范化文本"""
+        # 移除脚本、样式等噪声标签和注释
+        for tag in soup(NOISE_TAGS):
+            tag.decompose()
+        for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+            comment.extract()
+
+        # 移除全局和网站配置的易变区域（广告位、计数器、时间戳等）
+        for selector in self.ignore_selectors + list(ignore_selectors or []):
+            for element in self._select(soup, selector):
+                element.decompose()
+
+        # 只监控指定区域，找不到时退回整个页面
+        roots = [soup]
+        if content_selector:
+            roots = self._select(soup, content_selector) or roots
+
+        text = '\n'.join(root.get_text('\n') for root in roots)
+
+        for pattern in self.ignore_patterns + self._compile_patterns(ignore_patterns or []):
+            text = pattern.sub('', text)
+
+        # 合并空白字符并去掉空行
+        lines = (' '.join(line.split()) for line in text.splitlines())
+        return '\n'.join(line for line in lines if line)
+
+    def normalize_for(self, website, html):
+        """按网站的区域和忽略规则规范化内容"""
+        return self.normalize(
+            html,
+            content_selector=website.content_selector,
+            ignore_selectors=split_lines(website.ignore_selectors),
+            ignore_patterns=split_lines(website.ignore_patterns)
+        )
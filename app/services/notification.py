@@ -1,101 +1,138 @@
 import requests
-import json
 from datetime import datetime, timezone, timedelta
 from config.config import Config
 
+CHINA_TZ = timezone(timedelta(hours=8))
+
+# 企业微信文本消息内容上限2048字节，留出余量
+MAX_CONTENT_BYTES = 2000
+
+# 企业微信接口频率超限的错误码
+RATE_LIMITED_ERRCODE = 45009
+
+
+class WebhookError(Exception):
+    """Webhook发送失败"""
+
+    def __init__(self, message, rate_limited=False):
+        super().__init__(message)
+        self.rate_limited = rate_limited
+
+
+def _truncate_bytes(text, limit=MAX_CONTENT_BYTES):
+    data = text.encode('utf-8')
+    if len(data) <= limit:
+        return text
+    return data[:limit - 3].decode('utf-8', errors='ignore') + '...'
+
+
 class NotificationService:
     def __init__(self):
         self.config = Config()
 
-    def send_webhook_notification(self, website, change_record, matched_keywords, change_summary=None):
-        """发送企业微信Webhook通知"""
+    def build_payload(self, website, matched_keywords, change_summary=None, keyword_snippets=None):
+        """生成保存到通知队列中的内容，检测时间使用当前北京时间"""
+        return {
+            'website_name': website.name,
+            'url': website.url,
+            'detected_at': datetime.now(CHINA_TZ).strftime('%Y-%m-%d %H:%M:%S'),
+            'matched_keywords': list(matched_keywords or []),
+            'keyword_snippets': dict(keyword_snippets or {}),
+            'change_summary': change_summary
+        }
+
+    def format_change(self, payload):
+        """格式化单个变化的正文"""
+        content = f"📍 网站: {payload['website_name']}\n🌐 URL: {payload['url']}\n⏰ 时间: {payload['detected_at']}"
+
+        matched_keywords = payload.get('matched_keywords')
+        if matched_keywords:
+            content += f"\n🔑 关键词匹配: {', '.join(matched_keywords)}"
+            for keyword, snippet in (payload.get('keyword_snippets') or {}).items():
+                content += f"\n   「{keyword}」: {snippet}"
+        else:
+            content += f"\n📊 监控类型: HTML全量监控"
+
+        if payload.get('change_summary'):
+            content += f"\n📝 变化摘要: {payload['change_summary']}"
+
+        return content
+
+    def build_message(self, payload):
+        """构建单个变化的通知内容"""
+        return _truncate_bytes(f"🚨 网站监控告警\n\n{self.format_change(payload)}")
+
+    def pack_messages(self, payloads):
+        """将多个变化合并为汇总消息，每条不超过消息长度上限
+
+        返回 [(消息内容, [payload序号, ...]), ...]
+        """
+        if len(payloads) == 1:
+            return [(self.build_message(payloads[0]), [0])]
+
+        groups = []
+        sections, indexes, size = [], [], 0
+        for index, payload in enumerate(payloads):
+            section = self.format_change(payload)
+            section_size = len(section.encode('utf-8')) + 2
+            # 预留汇总标题的长度
+            if sections and size + section_size > MAX_CONTENT_BYTES - 80:
+                groups.append((sections, indexes))
+                sections, indexes, size = [], [], 0
+            sections.append(section)
+            indexes.append(index)
+            size += section_size
+        if sections:
+            groups.append((sections, indexes))
+
+        messages = []
+        for sections, indexes in groups:
+            if len(sections) == 1:
+                messages.append((self.build_message(payloads[indexes[0]]), indexes))
+                continue
+            header = f"🚨 网站监控告警汇总（{len(sections)} 处变化）"
+            messages.append((_truncate_bytes(header + '\n\n' + '\n\n'.join(sections)), indexes))
+        return messages
+
+    def post(self, content, session=None, timeout=15):
+        """发送一次企业微信文本消息，失败时抛出WebhookError"""
         if not self.config.WEBHOOK_URL:
-            print("Webhook URL not configured, skipping webhook notification")
-            return False
+            raise WebhookError("Webhook URL not configured")
 
-        try:
-            # 使用当前北京时间
-            china_tz = timezone(timedelta(hours=8))
-            current_time = datetime.now(china_tz)
-            created_time = current_time.strftime('%Y-%m-%d %H:%M:%S')
-
-            # 构建通知内容
-            content = f"🚨 网站监控告警\n\n📍 网站: {website.name}\n🌐 URL: {website.url}\n⏰ 时间: {created_time}"
-
-            if matched_keywords:
-                content += f"\n🔑 关键词匹配: {', '.join(matched_keywords)}"
-            else:
-                content += f"\n📊 监控类型: HTML全量监控"
-
-            if change_summary:
-                content += f"\n📝 变化摘要: {change_summary}"
-
-            payload = {
-                "msgtype": "text",
-                "text": {
-                    "content": content
-                }
+        payload = {
+            "msgtype": "text",
+            "text": {
+                "content": content
             }
+        }
+
+        try:
+            response = (session or requests).post(
+                self.config.WEBHOOK_URL,
+                json=payload,
+                headers={
+                    'Content-Type': 'application/json',
+                    'User-Agent': 'Website-Monitor/1.0'
+                },
+                timeout=timeout
+            )
+        except requests.exceptions.RequestException as e:
+            raise WebhookError(f"{type(e).__name__}: {str(e)}")
+
+        print(f"[WEBHOOK] Response status: {response.status_code}")
+
+        if response.status_code == 429:
+            raise WebhookError("HTTP 429", rate_limited=True)
+        if response.status_code != 200:
+            raise WebhookError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+        # 检查企业微信返回的错误码
+        try:
+            resp_data = response.json()
+        except ValueError:
+            return True
 
-            print(f"[WEBHOOK] Sending to: {self.config.WEBHOOK_URL}")
-            print(f"[WEBHOOK] Payload: {json.dumps(payload, indent=2, ensure_ascii=False)}")
-
-            # 发送请求，增加重试机制
-            max_retries = 3
-            for retry in range(max_retries):
-                try:
-                    response = requests.post(
-                        self.config.WEBHOOK_URL,
-                        json=payload,
-                        headers={
-                            'Content-Type': 'application/json',
-                            'User-Agent': 'Website-Monitor/1.0'
-                        },
-                        timeout=15
-                    )
-
-                    print(f"[WEBHOOK] Response status: {response.status_code}")
-                    print(f"[WEBHOOK] Response body: {response.text}")
-
-                    if response.status_code == 200:
-                        # 检查企业微信返回的错误码
-                        try:
-                            resp_data = response.json()
-                            if resp_data.get('errcode', 0) == 0:
-                                print(f"[WEBHOOK] ✅ Notification sent successfully for {website.name}")
-                                return True
-                            else:
-                                print(f"[WEBHOOK] ❌ WeChat API error: {resp_data}")
-                                if retry < max_retries - 1:
-                                    print(f"[WEBHOOK] Retrying... ({retry + 1}/{max_retries})")
-                                    continue
-                                return False
-                        except json.JSONDecodeError:
-                            print(f"[WEBHOOK] ✅ Notification sent for {website.name} (non-JSON response)")
-                            return True
-                    else:
-                        if retry < max_retries - 1:
-                            print(f"[WEBHOOK] HTTP {response.status_code}, retrying... ({retry + 1}/{max_retries})")
-                            continue
-                        response.raise_for_status()
-
-                except requests.exceptions.Timeout:
-                    print(f"[WEBHOOK] ⏰ Timeout error, retry {retry + 1}/{max_retries}")
-                    if retry == max_retries - 1:
-                        raise
-                except requests.exceptions.ConnectionError:
-                    print(f"[WEBHOOK] 🔌 Connection error, retry {retry + 1}/{max_retries}")
-                    if retry == max_retries - 1:
-                        raise
-
-            return False
-
-        except Exception as e:
-            print(f"[WEBHOOK] ❌ Failed to send notification: {str(e)}")
-            import traceback
-            print(f"[WEBHOOK] Error details: {traceback.format_exc()}")
-            return False
-
-    def send_notification(self, website, change_record, matched_keywords, change_summary=None):
-        """发送通知（仅Webhook）"""
-        return self.send_webhook_notification(website, change_record, matched_keywords, change_summary)
\ No newline at end of file
+        errcode = resp_data.get('errcode', 0)
+        if errcode != 0:
+            raise WebhookError(f"WeChat API error: {resp_data}", rate_limited=errcode == RATE_LIMITED_ERRCODE)
+        return True
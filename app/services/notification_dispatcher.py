@@ -0,0 +1,210 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from app import db
+from app.models import NotificationOutbox, NotificationSend, ChangeRecord
+from app.services.notification import NotificationService, WebhookError
+from app.services.stats import get_stats
+from app.services.metrics import get_metrics
+from config.config import Config
+
+# 发送中的记录超过该时间未完成（如进程崩溃）视为可重新领取
+SENDING_LEASE = timedelta(minutes=5)
+
+
+class RateLimiter:
+    """滑动窗口限流：period秒内最多发送limit条消息
+
+    额度占用记录在数据库中，多个进程（如gunicorn的多个worker各自运行调度器）共用同一额度
+    """
+
+    def __init__(self, limit, period=60):
+        self.limit = limit
+        self.period = period
+
+    def _window(self, now):
+        return db.select(NotificationSend.sent_at, NotificationSend.slots)\
+            .where(NotificationSend.sent_at > now - timedelta(seconds=self.period))
+
+    def _used(self, now):
+        return sum(slots for _, slots in db.session.execute(self._window(now)))
+
+    def acquire(self):
+        """有剩余额度时占用一次并返回True"""
+        now = datetime.utcnow()
+        db.session.execute(
+            db.delete(NotificationSend)
+            .where(NotificationSend.sent_at <= now - timedelta(seconds=self.period))
+            .execution_options(synchronize_session=False)
+        )
+        slot = NotificationSend(sent_at=now, slots=1)
+        db.session.add(slot)
+        db.session.commit()
+
+        # 先占用再计数：并发占用时可能都让出额度，但不会超出限额
+        if self._used(now) <= self.limit:
+            return True
+        db.session.delete(slot)
+        db.session.commit()
+        return False
+
+    def wait_seconds(self):
+        """距离下一次可发送还需等待的秒数"""
+        now = datetime.utcnow()
+        rows = db.session.execute(self._window(now).order_by(NotificationSend.sent_at)).all()
+        excess = sum(slots for _, slots in rows) - self.limit + 1
+        if excess <= 0:
+            return 0
+        for sent_at, slots in rows:
+            excess -= slots
+            if excess <= 0:
+                return max((sent_at - now).total_seconds() + self.period, 0)
+        return self.period
+
+    def penalize(self):
+        """服务端返回限流时占满一个完整周期的额度"""
+        db.session.add(NotificationSend(sent_at=datetime.utcnow(), slots=self.limit))
+
+
+class NotificationDispatcher:
+    """后台投递通知队列
+
+    变化记录和通知在同一事务中写入notification_outbox，由本分发器异步发送：
+    汇总窗口内的多个变化合并为一条消息，按企业微信机器人额度限流，失败后指数退避重试。
+    """
+
+    def __init__(self):
+        self.config = Config()
+        self.service = NotificationService()
+        self.rate_limiter = RateLimiter(self.config.NOTIFY_RATE_LIMIT, 60)
+        self.metrics = get_metrics()
+
+        # 复用连接的HTTP会话
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _backoff(self, attempts):
+        """第attempts次失败后的等待时间，带随机抖动"""
+        delay = min(self.config.NOTIFY_BACKOFF_BASE * 2 ** (attempts - 1), self.config.NOTIFY_BACKOFF_MAX)
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def _due_entries(self, now):
+        return NotificationOutbox.query.filter(
+            NotificationOutbox.status.in_(['pending', 'sending']),
+            NotificationOutbox.next_attempt_at <= now
+        ).order_by(NotificationOutbox.id).limit(self.config.NOTIFY_BATCH_SIZE).all()
+
+    def _claim(self, entries, now):
+        """以比较并交换的方式领取记录，多个进程同时分发时每条只会被领取一次"""
+        claimed = []
+        for entry in entries:
+            result = db.session.execute(
+                db.update(NotificationOutbox)
+                .where(NotificationOutbox.id == entry.id)
+                .where(NotificationOutbox.status == entry.status)
+                .where(NotificationOutbox.next_attempt_at <= now)
+                .values(status='sending', next_attempt_at=now + SENDING_LEASE)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                claimed.append(entry)
+        db.session.commit()
+        return claimed
+
+    def _mark_sent(self, entries, now):
+        for entry in entries:
+            entry.status = 'sent'
+            entry.attempts = (entry.attempts or 0) + 1
+            entry.sent_at = now
+            entry.last_error = None
+
+        record_ids = [entry.change_record_id for entry in entries]
+        db.session.execute(
+            db.update(ChangeRecord)
+            .where(ChangeRecord.id.in_(record_ids))
+            .values(notification_sent=True)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _mark_failed(self, entries, error, now):
+        for entry in entries:
+            entry.attempts = (entry.attempts or 0) + 1
+            entry.last_error = error
+            if entry.attempts >= self.config.NOTIFY_MAX_ATTEMPTS:
+                entry.status = 'failed'
+                print(f"[WEBHOOK] Giving up notification {entry.id} after {entry.attempts} attempts")
+            else:
+                entry.status = 'pending'
+                entry.next_attempt_at = now + self._backoff(entry.attempts)
+
+    def _release(self, entries, delay):
+        """额度不足时放回队列，不计入失败次数"""
+        next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        for entry in entries:
+            entry.status = 'pending'
+            entry.next_attempt_at = next_attempt_at
+
+    def dispatch_pending(self):
+        """发送到期的通知，返回成功送达的变化数"""
+        now = datetime.utcnow()
+        entries = self._due_entries(now)
+        if not entries:
+            return 0
+
+        if not self.config.WEBHOOK_URL:
+            print("Webhook URL not configured, skipping webhook notification")
+            self._mark_failed(entries, "Webhook URL not configured", now)
+            db.session.commit()
+            return 0
+
+        # 汇总窗口：最早的通知等待满窗口后再发送，期间新增的变化合并为一条消息
+        window = timedelta(seconds=self.config.NOTIFY_DIGEST_WINDOW)
+        oldest = min(entry.created_at for entry in entries)
+        if oldest > now - window and len(entries) < self.config.NOTIFY_BATCH_SIZE:
+            return 0
+
+        entries = self._claim(entries, now)
+        if not entries:
+            return 0
+
+        payloads = [json.loads(entry.payload) for entry in entries]
+        delivered = 0
+
+        for content, indexes in self.service.pack_messages(payloads):
+            group = [entries[index] for index in indexes]
+
+            if not self.rate_limiter.acquire():
+                self._release(group, self.rate_limiter.wait_seconds())
+                db.session.commit()
+                continue
+
+            started = time.perf_counter()
+            try:
+                self.service.post(content, session=self.session, timeout=self.config.NOTIFY_TIMEOUT)
+                self.metrics.notifications.labels('sent').inc()
+                self._mark_sent(group, datetime.utcnow())
+                delivered += len(group)
+                print(f"[WEBHOOK] ✅ Sent notification covering {len(group)} change(s)")
+            except WebhookError as e:
+                print(f"[WEBHOOK] ❌ Failed to send notification: {str(e)}")
+                self.metrics.notifications.labels('rate_limited' if e.rate_limited else 'failed').inc()
+                if e.rate_limited:
+                    self.rate_limiter.penalize()
+                self._mark_failed(group, str(e), datetime.utcnow())
+            except Exception as e:
+                print(f"[WEBHOOK] ❌ Unexpected error sending notification: {str(e)}")
+                self.metrics.notifications.labels('failed').inc()
+                self._mark_failed(group, str(e), datetime.utcnow())
+            finally:
+                self.metrics.stage_seconds.labels('notify').observe(time.perf_counter() - started)
+
+            db.session.commit()
+
+        if delivered:
+            get_stats().record_notifications(delivered)
+        return delivered
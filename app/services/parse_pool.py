@@ -0,0 +1,190 @@
+import atexit
+import hashlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.services.metrics import get_metrics
+from config.config import Config
+
+# 子进程内复用的规范化器和差异引擎
+_normalizer = None
+_diff_engine = None
+
+
+def _get_normalizer():
+    global _normalizer
+    if _normalizer is None:
+        from app.services.normalizer import ContentNormalizer
+        _normalizer = ContentNormalizer()
+    return _normalizer
+
+
+def _get_diff_engine():
+    global _diff_engine
+    if _diff_engine is None:
+        from app.services.diff_engine import DiffEngine
+        _diff_engine = DiffEngine()
+    return _diff_engine
+
+
+def normalize_and_hash(html, content_selector=None, ignore_selectors=None, ignore_patterns=None):
+    """规范化HTML并计算哈希，返回 (规范化内容, 哈希值, 各阶段耗时)
+
+    耗时在子进程中测量，随结果带回主进程记录
+    """
+    normalizer = _get_normalizer()
+    timings = {}
+    started = time.perf_counter()
+    if normalizer.enabled:
+        soup = normalizer.parse(html)
+        parsed = time.perf_counter()
+        content = normalizer.extract(soup, content_selector, ignore_selectors, ignore_patterns)
+        normalized = time.perf_counter()
+        timings['parse'] = parsed - started
+        timings['normalize'] = normalized - parsed
+        started = normalized
+    else:
+        content = html
+    content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    timings['hash'] = time.perf_counter() - started
+    return content, content_hash, timings
+
+
+def diff_and_summarize(old_content, new_content):
+    """计算差异，返回 (差异文本, 变化摘要, 耗时)"""
+    started = time.perf_counter()
+    diff = _get_diff_engine().diff(old_content, new_content)
+    return diff.text, diff.summary(), time.perf_counter() - started
+
+
+def _mp_context():
+    """子进程用forkserver（不支持时用spawn）启动
+
+    fork会把父进程的线程、锁、数据库连接和事件循环一起复制到子进程，
+    在多线程的Web进程和调度器中可能死锁；forkserver预先导入解析依赖，新建子进程仍然很快
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['app.services.normalizer', 'app.services.diff_engine'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _completed(fn, *args):
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class ParsePool:
+    """CPU密集的解析阶段（HTML解析、规范化、哈希、差异）在独立的进程池中执行
+
+    抓取事件循环和Web请求线程只等待结果，大页面集中到达时不会因GIL被阻塞。
+    workers为0时在当前进程内直接执行。
+    """
+
+    def __init__(self, workers=None):
+        self.workers = Config().PARSE_POOL_WORKERS if workers is None else workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.metrics = get_metrics()
+        self.pending = self.metrics.gauge('monitor_parse_pool_pending_tasks', '解析进程池中排队和执行中的任务数')
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context())
+            return self._executor
+
+    def submit(self, fn, *args):
+        """提交任务，返回concurrent.futures.Future；fn必须是模块级函数"""
+        if self.workers <= 0:
+            return _completed(fn, *args)
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # 子进程异常退出后重建进程池，本次在当前进程内执行
+            print(f"Parse pool unavailable, running inline: {str(e)}")
+            self._reset()
+            return _completed(fn, *args)
+        self.pending.inc()
+        future.add_done_callback(lambda done: self.pending.dec())
+        return future
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _normalize_args(website, html):
+        from app.services.normalizer import split_lines
+
+        return (
+            html,
+            website.content_selector,
+            split_lines(website.ignore_selectors),
+            split_lines(website.ignore_patterns)
+        )
+
+    def submit_normalize(self, website, html):
+        """按网站的区域和忽略规则提交规范化任务"""
+        future = self.submit(normalize_and_hash, *self._normalize_args(website, html))
+        # 多个网站共用一次规范化时耗时只记录一次
+        future.add_done_callback(self._record_normalize)
+        return future
+
+    def _record_normalize(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        for stage, seconds in future.result()[2].items():
+            self.metrics.stage_seconds.labels(stage).observe(seconds)
+
+    def result(self, future, fn, *args):
+        """等待任务结果；子进程异常退出时在当前进程内重新执行"""
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            print(f"Parse pool worker died, running inline: {str(e)}")
+            self._reset()
+            return fn(*args)
+
+    def run(self, fn, *args):
+        """提交任务并等待结果"""
+        return self.result(self.submit(fn, *args), fn, *args)
+
+    def normalize(self, website, html, future=None):
+        """返回 (规范化内容, 哈希值)；future为之前submit_normalize提交的任务"""
+        if future is None:
+            future = self.submit_normalize(website, html)
+        content, content_hash, _ = self.result(future, normalize_and_hash, *self._normalize_args(website, html))
+        return content, content_hash
+
+    def diff(self, old_content, new_content):
+        """返回 (差异文本, 变化摘要)"""
+        text, summary, seconds = self.run(diff_and_summarize, old_content, new_content)
+        self.metrics.stage_seconds.labels('diff').observe(seconds)
+        return text, summary
+
+    def shutdown(self):
+        self._reset()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_parse_pool():
+    """获取进程内共享的解析进程池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ParsePool()
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from app.models import Website
+from app.services.snapshot_store import SnapshotStore
+from app.services.stats import get_stats
+from app.services.metrics import get_metrics
+from config.config import Config
+
+
+class ResultWriter:
+    """检查结果的批量写入
+
+    每个网站检查完成后不再单独提交事务：网站字段、快照和变化记录先缓存在内存中，
+    达到批量大小或时间窗口、或一轮检查结束时，在一个短事务中批量更新网站、
+    批量写入快照和变化记录（及其通知队列）。SQLite下每批只同步一次磁盘，
+    也不会在整轮检查期间占用写锁。
+
+    写入失败时整批放回缓冲区，下次写入时重试；连续失败RESULT_FLUSH_RETRIES次后才放弃，
+    调用方通过take_unsaved得知哪些网站的结果没有写入。
+    """
+
+    def __init__(self, batch_size=None, flush_seconds=None):
+        self.config = Config()
+        self.batch_size = batch_size or self.config.RESULT_BATCH_SIZE
+        self.flush_seconds = self.config.RESULT_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.max_retries = self.config.RESULT_FLUSH_RETRIES
+        self.snapshot_store = SnapshotStore()
+        self.stats = get_stats()
+        self.metrics = get_metrics()
+        self.metrics.gauge('monitor_result_writer_pending_websites', '等待批量写入的网站检查结果数',
+                           collect=lambda: len(self._websites))
+
+        self._websites = {}  # 网站ID -> 待更新字段
+        self._snapshots = {}  # 内容哈希 -> 内容
+        self._changes = []  # 未加入会话的变化记录，通知通过关系级联写入
+        self._last_checked = None
+        self._first_pending_at = None
+        self._failures = 0  # 连续写入失败次数
+        self._retry_at = 0  # 写入失败后，批量已满也要等到该时间再自动重试
+        self._unsaved = set()  # 放弃写入、尚未通知调用方的网站ID
+        self._lock = threading.Lock()
+
+    def save(self, website, values, snapshot=None, change_record=None):
+        """记录一个网站的检查结果
+
+        values为需要更新的网站字段，立即反映到网站对象上（不标记为待提交，避免逐行UPDATE）；
+        snapshot为 (内容, 内容哈希)，change_record为未加入会话的变化记录
+        """
+        for key, value in values.items():
+            set_committed_value(website, key, value)
+
+        with self._lock:
+            # 之前放弃写入的结果已被新的检查取代
+            self._unsaved.discard(website.id)
+            self._websites.setdefault(website.id, {}).update(values)
+            if snapshot is not None:
+                content, content_hash = snapshot
+                self._snapshots[content_hash] = content
+            if change_record is not None:
+                self._changes.append(change_record)
+            checked_at = values.get('last_checked')
+            if checked_at and (self._last_checked is None or checked_at > self._last_checked):
+                self._last_checked = checked_at
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+
+            now = time.monotonic()
+            full = now >= self._retry_at and (len(self._websites) >= self.batch_size or
+                                              now - self._first_pending_at >= self.flush_seconds)
+        if full:
+            self.flush()
+
+    def pending_snapshot(self, content_hash):
+        """尚未写入数据库的快照内容"""
+        with self._lock:
+            return self._snapshots.get(content_hash)
+
+    def take_unsaved(self, website_ids):
+        """返回website_ids中结果仍未写入数据库（在缓冲区中等待重试或已放弃）的网站ID"""
+        with self._lock:
+            unsaved = {website_id for website_id in website_ids
+                       if website_id in self._websites or website_id in self._unsaved}
+            self._unsaved -= unsaved
+        return unsaved
+
+    def _requeue(self, websites, snapshots, changes, last_checked, error):
+        """写入失败：放回缓冲区等待重试，缓冲期间的新结果优先；重试次数用尽时放弃整批"""
+        with self._lock:
+            self._failures += 1
+            if self._failures > self.max_retries:
+                self._failures = 0
+                self._unsaved.update(websites)
+                print(f"Giving up writing check results for {len(websites)} website(s) "
+                      f"and {len(changes)} change(s) after {self.max_retries} retries: {error}")
+                return
+
+            for website_id, values in websites.items():
+                self._websites[website_id] = dict(values, **self._websites.get(website_id, {}))
+            for content_hash, content in snapshots.items():
+                self._snapshots.setdefault(content_hash, content)
+            self._changes[:0] = changes
+            if last_checked and (self._last_checked is None or last_checked > self._last_checked):
+                self._last_checked = last_checked
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+            self._retry_at = time.monotonic() + self.flush_seconds
+        print(f"Error writing check results for {len(websites)} website(s), will retry: {error}")
+
+    def flush(self):
+        """在一个事务中写入缓存的结果，返回写入的网站数"""
+        with self._lock:
+            websites, self._websites = self._websites, {}
+            snapshots, self._snapshots = self._snapshots, {}
+            changes, self._changes = self._changes, []
+            last_checked, self._last_checked = self._last_checked, None
+            self._first_pending_at = None
+        if not websites:
+            return 0
+
+        # 按更新的字段分组，每组一次executemany
+        groups = defaultdict(list)
+        for website_id, values in websites.items():
+            groups[tuple(sorted(values))].append(dict(values, id=website_id))
+
+        # 写入的字段已同步到内存中的网站对象，提交后不必让会话中的对象全部过期：
+        # 否则批次中途写入后，同一批尚未处理的网站会逐个重新查询
+        session = db.session()
+        expire_on_commit, session.expire_on_commit = session.expire_on_commit, False
+        started = time.perf_counter()
+        try:
+            self.snapshot_store.put_many(snapshots)
+            for rows in groups.values():
+                db.session.execute(db.update(Website), rows)
+            db.session.add_all(changes)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self._requeue(websites, snapshots, changes, last_checked, str(e))
+            return 0
+        finally:
+            session.expire_on_commit = expire_on_commit
+
+        with self._lock:
+            self._failures = 0
+            self._retry_at = 0
+
+        self.metrics.stage_seconds.labels('db_flush').observe(time.perf_counter() - started)
+        self.metrics.flushed_rows.inc(len(websites))
+        self.stats.record_check(last_checked)
+        for change_record in changes:
+            self.stats.record_change(change_record)
+        return len(websites)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_result_writer():
+    """获取进程内共享的结果写入器"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ResultWriter()
+        return _writer
@@ -1,32 +1,345 @@
+import heapq
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy import or_
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from app.services.monitor import WebsiteMonitor
+from app import db
+from app.services.monitor import get_website_monitor
+from app.services.notification_dispatcher import NotificationDispatcher
+from app.services.lease import LeaseManager, check_interval_of, reset_next_check
+from app.services.adaptive import ScheduleState, SchedulePlanner
+from app.services.check_jobs import CheckJobQueue, pending_website_ids
+from app.services.metrics import get_metrics
+from config.config import Config
 from flask import current_app
 
+
 class MonitorScheduler:
-    def __init__(self, app=None):
+    """进程内调度器
+
+    role为embedded时在本进程检查到期网站并运行后台任务；为coordinator时只运行
+    通知分发、历史汇总、数据清理和租约回收，网站检查交给独立的worker进程。
+    """
+
+    def __init__(self, app=None, role='embedded'):
         self.scheduler = BackgroundScheduler()
-        self.monitor = WebsiteMonitor()
+        self.monitor = get_website_monitor()
+        self.dispatcher = NotificationDispatcher()
+        self.leases = LeaseManager(app)
+        self.planner = SchedulePlanner()
+        self.jobs = CheckJobQueue()
         self.app = app
+        self.role = role
+        self.config = Config()
+
+        # 按下次到期时间排序的最小堆：(到期时间, 版本号, 网站ID)
+        self._queue = []
+        # 网站ID -> (到期时间, 检查间隔, 版本号)，版本号不匹配的堆元素视为已失效
+        self._entries = {}
+        self._inflight = set()
+        self._version = 0
+        self._last_sync = 0
+        self._lock = threading.Lock()
+
+        if app is not None:
+            app.extensions['monitor_scheduler'] = self
+        if role == 'embedded':
+            get_metrics().gauge('monitor_scheduler_websites', '调度队列中的网站数（queued/due/inflight）',
+                                ['state'], collect=self._queue_depth)
+
+    def _queue_depth(self):
+        """调度队列中等待、已到期未检查和检查中的网站数，只在抓取指标时计算"""
+        now = time.time()
+        with self._lock:
+            due = sum(1 for entry in self._entries.values() if entry[0] <= now)
+            return {('queued',): len(self._entries), ('due',): due, ('inflight',): len(self._inflight)}
+
+    def _interval_of(self, check_interval):
+        """检查间隔下限为调度周期"""
+        return check_interval_of(check_interval)
+
+    def _push(self, website_id, due_at, interval):
+        self._version += 1
+        self._entries[website_id] = (due_at, interval, self._version)
+        heapq.heappush(self._queue, (due_at, self._version, website_id))
+
+        # 失效元素过多时重建堆，防止频繁重排导致堆无限增长
+        if len(self._queue) > 2 * len(self._entries) + 64:
+            self._queue = [(due, version, wid) for wid, (due, _, version) in self._entries.items()]
+            heapq.heapify(self._queue)
+
+    def _initial_due(self, website, interval, now):
+        """计算网站首次入队的到期时间"""
+        if website.next_check_at:
+            due_at = website.next_check_at.replace(tzinfo=timezone.utc).timestamp()
+            if due_at > now:
+                return due_at
+        elif website.last_checked:
+            due_at = website.last_checked.replace(tzinfo=timezone.utc).timestamp() + interval
+            if due_at > now:
+                return due_at
+        # 从未检查或已过期的网站在启动窗口内均匀分散
+        spread = min(interval, self.config.SCHEDULER_STARTUP_SPREAD)
+        return now + random.uniform(0, spread)
+
+    def schedule_website(self, website):
+        """将网站加入（或重新加入）调度队列"""
+        with self._lock:
+            if not website.is_active:
+                self._entries.pop(website.id, None)
+                self._inflight.discard(website.id)
+                return
+            interval = self._interval_of(website.check_interval)
+            self._push(website.id, self._initial_due(website, interval, time.time()), interval)
+
+    def reschedule(self, website):
+        """检查间隔或状态变更后立即重新计算到期时间"""
+        self.schedule_website(website)
+
+    def expedite(self, website_ids):
+        """手动检查的网站立即到期；正在检查的网站由本次检查完成其任务"""
+        now = time.time()
+        with self._lock:
+            for website_id in website_ids:
+                if website_id in self._inflight:
+                    continue
+                entry = self._entries.get(website_id)
+                interval = entry[1] if entry else self._interval_of(None)
+                self._push(website_id, now, interval)
+
+    def unschedule(self, website_id):
+        """从调度队列中移除网站"""
+        with self._lock:
+            self._entries.pop(website_id, None)
+            self._inflight.discard(website_id)
+
+    def sync_websites(self):
+        """与数据库同步调度队列：补充新网站、移除停用网站、更新间隔"""
+        from app.models import Website
+
+        # 只读取调度需要的列，不加载完整的网站对象；
+        # 有待执行手动检查任务的停用网站也保留在队列中
+        websites = db.session.execute(
+            db.select(Website.id, Website.check_interval, Website.next_check_at, Website.last_checked)
+            .where(or_(Website.is_active.is_(True), Website.id.in_(pending_website_ids())))
+        ).all()
+        now = time.time()
+
+        with self._lock:
+            active_ids = set()
+            for website in websites:
+                active_ids.add(website.id)
+                if website.id in self._inflight:
+                    continue
+                # 单个网站的数据异常时跳过，不影响其他网站的调度
+                try:
+                    interval = self._interval_of(website.check_interval)
+                    entry = self._entries.get(website.id)
+                    if entry is None or entry[1] != interval:
+                        self._push(website.id, self._initial_due(website, interval, now), interval)
+                except Exception as e:
+                    print(f"Skipping website {website.id} in scheduler sync: {str(e)}")
+
+            for website_id in list(self._entries):
+                if website_id not in active_ids:
+                    del self._entries[website_id]
+            self._inflight &= active_ids
+            self._last_sync = now
+
+    def _pop_due(self, now):
+        """弹出所有已到期的网站ID"""
+        due_ids = []
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                _, version, website_id = heapq.heappop(self._queue)
+                entry = self._entries.get(website_id)
+                if entry is None or entry[2] != version:
+                    continue
+                del self._entries[website_id]
+                self._inflight.add(website_id)
+                due_ids.append(website_id)
+        return due_ids
+
+    def _due_from_database(self, website_ids, now):
+        """未领取到租约的网站（其他进程正在检查或已检查过）按数据库中的下次检查时间重新入队"""
+        from app.models import Website
+
+        if not website_ids:
+            return {}
+        rows = db.session.execute(
+            db.select(Website.id, Website.check_interval, Website.next_check_at)
+            .where(Website.id.in_(website_ids), Website.is_active.is_(True))
+        ).all()
+
+        due = {}
+        for row in rows:
+            interval = self._interval_of(row.check_interval)
+            due_at = row.next_check_at.replace(tzinfo=timezone.utc).timestamp() if row.next_check_at else 0
+            if due_at <= now:
+                due_at = now + interval
+            due[row.id] = (due_at, interval)
+        return due
+
+    def dispatch_due_websites(self):
+        """只检查已到期的网站，完成后按各自间隔重新入队
+
+        检查前先领取数据库租约，多个Web进程同时运行调度器时每个网站只会被其中一个检查
+        """
+        if time.time() - self._last_sync >= self.config.SCHEDULER_RESYNC_SECONDS:
+            self.sync_websites()
+
+        due_ids = self._pop_due(time.time())
+        if not due_ids:
+            return
+
+        states = []
+        outcomes = {}
+        requeue = {}
+        try:
+            websites = self.leases.claim(len(due_ids), website_ids=due_ids)
+            states = [ScheduleState(website) for website in websites]
+            claimed_ids = {state.id for state in states}
+            requeue = self._due_from_database([wid for wid in due_ids if wid not in claimed_ids], time.time())
+
+            self.jobs.start(claimed_ids)
+            with self.leases.keepalive(claimed_ids):
+                outcomes = self.monitor.monitor_websites(websites)
+        finally:
+            updates = {}
+            try:
+                updates = self.planner.plan(states, outcomes, datetime.utcnow())
+                self.leases.release(updates)
+                self.jobs.finish([state.id for state in states], outcomes)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error releasing website leases: {str(e)}")
+
+            for state in states:
+                if state.id in updates:
+                    next_check_at = updates[state.id]['next_check_at']
+                    requeue[state.id] = (next_check_at.replace(tzinfo=timezone.utc).timestamp(),
+                                         self._interval_of(state.check_interval))
+
+            with self._lock:
+                for website_id in due_ids:
+                    if website_id not in self._inflight:
+                        continue
+                    self._inflight.discard(website_id)
+                    if website_id in requeue and website_id not in self._entries:
+                        self._push(website_id, *requeue[website_id])
 
     def monitor_with_context(self):
         """在应用上下文中执行监控"""
         with self.app.app_context():
-            self.monitor.monitor_all_websites()
+            self.dispatch_due_websites()
+
+    def dispatch_notifications(self):
+        """在应用上下文中发送通知队列"""
+        with self.app.app_context():
+            try:
+                self.dispatcher.dispatch_pending()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error dispatching notifications: {str(e)}")
+
+    def rollup_check_history(self):
+        """汇总检查历史"""
+        from app.services.check_history import get_check_history, ROLLUP_BATCH_SIZE
+
+        with self.app.app_context():
+            try:
+                # 积压较多时连续处理几批
+                for _ in range(10):
+                    if get_check_history().rollup() < ROLLUP_BATCH_SIZE:
+                        break
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error rolling up check history: {str(e)}")
+
+    def prune_snapshots(self):
+        """按保留策略清理快照、检查历史和手动检查任务"""
+        from app.services.snapshot_store import SnapshotStore
+        from app.services.check_history import get_check_history
+
+        with self.app.app_context():
+            # 各项清理互不影响，一项失败时其余照常执行
+            for name, prune in (('snapshots', SnapshotStore().prune),
+                                ('check history', get_check_history().prune),
+                                ('check jobs', self.jobs.prune)):
+                try:
+                    prune()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error pruning {name}: {str(e)}")
+
+    def reap_leases(self):
+        """回收已退出进程遗留的检查租约"""
+        with self.app.app_context():
+            try:
+                self.leases.reap_expired()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error reaping website leases: {str(e)}")
 
     def start_monitoring(self):
         """启动监控任务"""
-        # 添加定时任务，每5分钟执行一次
+        if self.role == 'embedded':
+            # 短周期检查到期队列，每个网站按自己的check_interval执行
+            self.scheduler.add_job(
+                func=self.monitor_with_context,
+                trigger=IntervalTrigger(seconds=self.config.SCHEDULER_TICK_SECONDS),
+                id='website_monitoring',
+                name='Website Content Monitoring',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+        else:
+            # 检查由worker进程执行，协调进程负责回收崩溃进程遗留的租约
+            self.scheduler.add_job(
+                func=self.reap_leases,
+                trigger=IntervalTrigger(seconds=self.config.LEASE_TTL_SECONDS),
+                id='lease_reaping',
+                name='Website Lease Reaping',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+
+        # 通知与监控分开执行，Webhook变慢不会拖慢检查
+        self.scheduler.add_job(
+            func=self.dispatch_notifications,
+            trigger=IntervalTrigger(seconds=self.config.NOTIFY_DISPATCH_SECONDS),
+            id='notification_dispatch',
+            name='Notification Dispatch',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+
+        self.scheduler.add_job(
+            func=self.rollup_check_history,
+            trigger=IntervalTrigger(seconds=self.config.CHECK_ROLLUP_SECONDS),
+            id='check_history_rollup',
+            name='Check History Rollup',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+
         self.scheduler.add_job(
-            func=self.monitor_with_context,
-            trigger=IntervalTrigger(minutes=5),
-            id='website_monitoring',
-            name='Website Content Monitoring',
+            func=self.prune_snapshots,
+            trigger=IntervalTrigger(hours=6),
+            id='snapshot_pruning',
+            name='Snapshot and Check History Retention',
             replace_existing=True
         )
 
         self.scheduler.start()
-        print("Website monitoring scheduler started")
+        print(f"Website monitoring scheduler started ({self.role})")
 
     def stop_monitoring(self):
         """停止监控任务"""
@@ -36,4 +349,28 @@ class MonitorScheduler:
 
     def is_running(self):
         """检查调度器是否在运行"""
-        return self.scheduler.running
\ No newline at end of file
+        return self.scheduler.running
+
+
+def reschedule_website(website):
+    """网站配置变更后更新下次检查时间，并通知当前进程的调度器"""
+    reset_next_check(website)
+    scheduler = current_app.extensions.get('monitor_scheduler')
+    if scheduler:
+        scheduler.reschedule(website)
+
+
+def request_checks(website_ids):
+    """提交手动检查任务，返回 {网站ID: 任务}；当前进程的调度器立即检查，独立部署时由worker领取"""
+    jobs = CheckJobQueue().submit(website_ids)
+    scheduler = current_app.extensions.get('monitor_scheduler')
+    if scheduler:
+        scheduler.expedite(list(jobs))
+    return jobs
+
+
+def unschedule_website(website_id):
+    """通知当前进程的调度器网站已删除"""
+    scheduler = current_app.extensions.get('monitor_scheduler')
+    if scheduler:
+        scheduler.unschedule(website_id)
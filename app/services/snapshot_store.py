@@ -0,0 +1,127 @@
+import hashlib
+import zlib
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Snapshot, Website
+from config.config import Config
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class SnapshotStore:
+    """按内容哈希存储完整页面快照，压缩保存并跨网站去重"""
+
+    def __init__(self):
+        self.config = Config()
+        self.codec = self.config.SNAPSHOT_COMPRESSION
+        if self.codec == 'zstd' and zstandard is None:
+            print("zstandard not installed, falling back to zlib for snapshots")
+            self.codec = 'zlib'
+
+    @staticmethod
+    def hash_content(content):
+        """计算内容哈希值"""
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _compress(self, data):
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=3).compress(data)
+        return zlib.compress(data, 6)
+
+    @staticmethod
+    def _decompress(codec, blob):
+        if codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read zstd snapshots")
+            return zstandard.ZstdDecompressor().decompress(blob)
+        return zlib.decompress(blob)
+
+    def put(self, content, content_hash=None):
+        """保存快照（已存在时只刷新最后出现时间），返回内容哈希"""
+        content_hash = content_hash or self.hash_content(content)
+        self.put_many({content_hash: content})
+        return content_hash
+
+    def put_many(self, contents):
+        """批量保存快照，contents为 {内容哈希: 内容}；已存在的只刷新最后出现时间"""
+        if not contents:
+            return
+        now = datetime.utcnow()
+        hashes = list(contents)
+
+        db.session.execute(
+            update(Snapshot).where(Snapshot.content_hash.in_(hashes)).values(last_seen_at=now)
+        )
+        existing = set(db.session.execute(
+            db.select(Snapshot.content_hash).where(Snapshot.content_hash.in_(hashes))
+        ).scalars())
+
+        rows = []
+        for content_hash, content in contents.items():
+            if content_hash in existing:
+                continue
+            data = content.encode('utf-8')
+            rows.append({
+                'content_hash': content_hash,
+                'codec': self.codec,
+                'body': self._compress(data),
+                'size': len(data),
+                'created_at': now,
+                'last_seen_at': now
+            })
+        if not rows:
+            return
+
+        # 并发写入同一内容时忽略主键冲突
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            db.session.execute(dialect_insert(Snapshot).on_conflict_do_nothing(), rows)
+        elif dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            db.session.execute(dialect_insert(Snapshot).on_conflict_do_nothing(), rows)
+        elif dialect in ('mysql', 'mariadb'):
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+            statement = dialect_insert(Snapshot)
+            db.session.execute(statement.on_duplicate_key_update(last_seen_at=statement.inserted.last_seen_at), rows)
+        else:
+            # 其他数据库逐行在保存点中插入，冲突的行说明其他进程已写入相同内容
+            for row in rows:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(Snapshot), [row])
+                except IntegrityError:
+                    pass
+
+    def get(self, content_hash):
+        """按哈希读取快照内容，不存在时返回None"""
+        if not content_hash:
+            return None
+
+        row = db.session.execute(
+            db.select(Snapshot.codec, Snapshot.body).where(Snapshot.content_hash == content_hash)
+        ).first()
+        if row is None:
+            return None
+
+        return self._decompress(row.codec, row.body).decode('utf-8')
+
+    def prune(self):
+        """删除超过保留期且不再被任何网站引用的快照"""
+        cutoff = datetime.utcnow() - timedelta(days=self.config.SNAPSHOT_RETENTION_DAYS)
+        referenced = db.select(Website.last_content_hash).where(Website.last_content_hash.isnot(None))
+
+        result = db.session.execute(
+            db.delete(Snapshot)
+            .where(Snapshot.last_seen_at < cutoff)
+            .where(Snapshot.content_hash.notin_(referenced))
+        )
+        db.session.commit()
+
+        print(f"Pruned {result.rowcount} snapshots older than {self.config.SNAPSHOT_RETENTION_DAYS} days")
+        return result.rowcount
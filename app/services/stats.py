@@ -0,0 +1,142 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app import db
+from config.config import Config
+
+# 最近变化统计窗口
+RECENT_WINDOW = timedelta(hours=24)
+
+
+class StatsCache:
+    """进程内缓存的汇总计数器
+
+    网站总数、活跃数、最近24小时变化数和最后检查时间保存在内存中，
+    本进程的监控和路由直接增量更新，其他进程的写入通过短周期的刷新获得：
+    刷新时按created_at索引统计最近24小时的变化数，不依赖主键水位，
+    其他进程晚提交的较小ID的变化记录也会被计入。
+    """
+
+    def __init__(self, refresh_seconds=None):
+        self.refresh_seconds = refresh_seconds or Config().STATS_REFRESH_SECONDS
+        self.total_websites = 0
+        self.active_websites = 0
+        self.last_check = None
+        self.last_change_id = 0
+        self.recent_changes = 0
+        self.notifications_sent = 0
+
+        self._refreshed_at = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _load_websites(self):
+        from app.models import Website
+
+        row = db.session.execute(db.select(
+            func.count(Website.id),
+            func.count(Website.id).filter(Website.is_active.is_(True)),
+            func.max(Website.last_checked)
+        )).one()
+        return row[0], row[1], row[2]
+
+    def _load_changes(self):
+        """返回 (最近24小时的变化数, 最大变化记录ID)"""
+        from app.models import ChangeRecord
+
+        recent = db.session.execute(
+            db.select(func.count(ChangeRecord.id))
+            .where(ChangeRecord.created_at >= datetime.utcnow() - RECENT_WINDOW)
+        ).scalar()
+        max_id = db.session.execute(db.select(func.max(ChangeRecord.id))).scalar()
+        return recent or 0, max_id or 0
+
+    def _load_notifications(self):
+        from app.models import NotificationOutbox
+
+        return db.session.execute(
+            db.select(func.count(NotificationOutbox.id)).where(NotificationOutbox.status == 'sent')
+        ).scalar()
+
+    def refresh(self):
+        """从数据库同步计数器"""
+        total, active, last_check = self._load_websites()
+        recent, max_id = self._load_changes()
+        notifications_sent = self._load_notifications()
+
+        with self._lock:
+            self.total_websites = total
+            self.active_websites = active
+            self.last_check = last_check
+            self.recent_changes = recent
+            self.last_change_id = max_id
+            self.notifications_sent = notifications_sent
+            self._refreshed_at = time.time()
+
+    def _ensure_fresh(self):
+        if time.time() - self._refreshed_at < self.refresh_seconds:
+            return
+        # 同一时刻只有一个请求刷新，其他请求直接使用当前数据
+        if not self._refresh_lock.acquire(blocking=self._refreshed_at == 0):
+            return
+        try:
+            if time.time() - self._refreshed_at >= self.refresh_seconds:
+                self.refresh()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error refreshing stats: {str(e)}")
+        finally:
+            self._refresh_lock.release()
+
+    def invalidate(self):
+        """网站增删或启停后在下次读取时重新同步"""
+        self._refreshed_at = 0
+
+    def record_check(self, checked_at=None):
+        with self._lock:
+            checked_at = checked_at or datetime.utcnow()
+            if self.last_check is None or checked_at > self.last_check:
+                self.last_check = checked_at
+
+    def record_change(self, change_record):
+        """变化记录提交后调用"""
+        with self._lock:
+            if change_record.id is None:
+                return
+            # 下次刷新时以数据库统计为准
+            self.recent_changes += 1
+            self.last_change_id = max(self.last_change_id, change_record.id)
+
+    def record_notifications(self, count):
+        with self._lock:
+            self.notifications_sent += count
+
+    def snapshot(self):
+        """返回当前计数器及其ETag"""
+        self._ensure_fresh()
+        with self._lock:
+            data = {
+                'total_websites': self.total_websites,
+                'active_websites': self.active_websites,
+                'recent_changes': self.recent_changes,
+                'last_check': self.last_check,
+                'last_change_id': self.last_change_id,
+                'notifications_sent': self.notifications_sent
+            }
+        etag = hashlib.sha1(repr(sorted(data.items())).encode('utf-8')).hexdigest()[:16]
+        return data, etag
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_stats():
+    """获取进程内共享的统计缓存"""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = StatsCache()
+        return _stats
@@ -0,0 +1,71 @@
+import signal
+import threading
+from datetime import datetime
+from app import db
+from app.services.monitor import get_website_monitor
+from app.services.lease import LeaseManager
+from app.services.adaptive import ScheduleState, SchedulePlanner
+from app.services.check_jobs import CheckJobQueue
+from config.config import Config
+
+
+class MonitorWorker:
+    """无状态的检查进程
+
+    循环领取到期网站的租约，批量检查后写入下次检查时间并释放租约。
+    worker之间不共享内存，增加进程或主机即可提高检查吞吐。
+    """
+
+    def __init__(self, app, batch_size=None):
+        self.app = app
+        self.config = Config()
+        self.monitor = get_website_monitor()
+        self.leases = LeaseManager(app)
+        self.planner = SchedulePlanner()
+        self.jobs = CheckJobQueue()
+        self.batch_size = batch_size or self.config.WORKER_BATCH_SIZE
+        self._stop = threading.Event()
+
+    def run_once(self):
+        """领取并检查一批到期网站，返回检查的网站数"""
+        websites = self.leases.claim(self.batch_size)
+        if not websites:
+            return 0
+
+        states = [ScheduleState(website) for website in websites]
+        website_ids = [state.id for state in states]
+        outcomes = {}
+        try:
+            self.jobs.start(website_ids)
+            with self.leases.keepalive(website_ids):
+                outcomes = self.monitor.monitor_websites(websites)
+        finally:
+            self.leases.release(self.planner.plan(states, outcomes, datetime.utcnow()))
+            self.jobs.finish(website_ids, outcomes)
+        return len(websites)
+
+    def run(self):
+        """持续运行直到收到SIGTERM或SIGINT"""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+            signal.signal(signal.SIGINT, lambda signum, frame: self.stop())
+
+        print(f"Monitor worker {self.leases.owner} started")
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    checked = self.run_once()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error in monitor worker: {str(e)}")
+                    checked = 0
+                finally:
+                    db.session.remove()
+
+                # 本批未满说明暂无更多到期网站，等待后再领取
+                if checked < self.batch_size:
+                    self._stop.wait(self.config.WORKER_POLL_SECONDS)
+        print(f"Monitor worker {self.leases.owner} stopped")
+
+    def stop(self):
+        self._stop.set()
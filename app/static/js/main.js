@@ -5,9 +5,6 @@ document.addEventListener('DOMContentLoaded', function() {
     // 初始化提示框
     initTooltips();
 
-    // 自动刷新状态
-    startAutoRefresh();
-
     // 表单验证
     initFormValidation();
 });
@@ -20,27 +17,34 @@ function initTooltips() {
     });
 }
 
-// 开始自动刷新（仅在首页）
-function startAutoRefresh() {
-    if (window.location.pathname === '/') {
-        // 每5分钟刷新一次页面状态
-        setInterval(function() {
-            updateWebsiteStatus();
-        }, 300000); // 5分钟
+// 订阅服务器实时事件（SSE），浏览器不支持时退回定时轮询
+// handlers: {事件名: function(data)}，options.lastEventId为已加载的最新变化记录ID
+function subscribeEvents(handlers, options) {
+    options = options || {};
+
+    if (!window.EventSource) {
+        if (options.fallback) {
+            return {close: clearInterval.bind(null, setInterval(options.fallback, options.fallbackInterval || 30000))};
+        }
+        return null;
     }
-}
 
-// 更新网站状态（AJAX）
-function updateWebsiteStatus() {
-    fetch('/api/status')
-        .then(response => response.json())
-        .then(data => {
-            console.log('Status updated:', data);
-            // 可以在这里更新页面上的状态信息
-        })
-        .catch(error => {
-            console.error('Failed to update status:', error);
+    let url = '/api/events';
+    if (options.lastEventId) {
+        url += `?last_event_id=${options.lastEventId}`;
+    }
+
+    // 断线后浏览器自动重连，并通过Last-Event-ID只接收遗漏的事件
+    const source = new EventSource(url);
+    Object.keys(handlers).forEach(eventName => {
+        source.addEventListener(eventName, function(event) {
+            handlers[eventName](JSON.parse(event.data));
         });
+    });
+    source.onerror = function() {
+        console.warn('实时事件连接中断，正在重连...');
+    };
+    return source;
 }
 
 // 初始化表单验证
@@ -95,6 +99,56 @@ function createAlertContainer() {
     return container;
 }
 
+// 轮询手动检查任务直到全部完成，返回任务列表
+async function waitForCheckJobs(jobIds, timeoutMs = 120000) {
+    const deadline = Date.now() + timeoutMs;
+    const finished = {};
+    let pending = [...jobIds];
+
+    while (pending.length && Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        // 每次最多查询500个任务
+        for (let i = 0; i < pending.length; i += 500) {
+            const response = await fetch(`/api/check_jobs?ids=${pending.slice(i, i + 500).join(',')}`);
+            if (!response.ok) {
+                throw new Error('查询检查任务状态失败');
+            }
+            const jobs = await response.json();
+            jobs.forEach(job => {
+                if (job.status === 'done' || job.status === 'failed') {
+                    finished[job.id] = job;
+                }
+            });
+        }
+        pending = pending.filter(id => !finished[id]);
+    }
+
+    if (pending.length) {
+        throw new Error('检查任务仍在排队，请稍后刷新查看结果');
+    }
+    return jobIds.map(id => finished[id]);
+}
+
+// 提交单个网站的手动检查任务并等待结果
+async function runCheckJob(websiteId) {
+    const response = await fetch(`/api/websites/${websiteId}/check`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        }
+    });
+    const data = await response.json();
+    if (!response.ok || !data.success) {
+        throw new Error(data.error || '提交检查失败');
+    }
+
+    const [job] = await waitForCheckJobs([data.job.id]);
+    if (job.status === 'failed') {
+        throw new Error(job.error || '检查失败');
+    }
+    return job;
+}
+
 // 检查网站状态
 async function checkWebsite(websiteId) {
     const button = event.target.closest('button');
@@ -105,31 +159,55 @@ async function checkWebsite(websiteId) {
         button.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>检查中...';
         button.disabled = true;
 
-        const response = await fetch(`/api/websites/${websiteId}/check`, {
+        const job = await runCheckJob(websiteId);
+        showAlert(job.outcome === 'changed' ? '检查完成，检测到内容变化' : '检查完成，内容无变化', 'success');
+
+        // 如果在详情页面，延迟刷新以显示最新结果
+        if (window.location.pathname.includes('/website/')) {
+            setTimeout(() => {
+                window.location.reload();
+            }, 1500);
+        }
+    } catch (error) {
+        showAlert(`检查失败: ${error.message}`, 'danger');
+    } finally {
+        // 恢复按钮状态
+        button.innerHTML = originalContent;
+        button.disabled = false;
+    }
+}
+
+// 批量检查所有活跃网站
+async function checkAllWebsites() {
+    const button = event.target.closest('button');
+    const originalContent = button.innerHTML;
+
+    try {
+        button.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>检查中...';
+        button.disabled = true;
+
+        const response = await fetch('/api/websites/check', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
-            }
+            },
+            body: JSON.stringify({all: true})
         });
-
         const data = await response.json();
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || '提交检查失败');
+        }
 
-        if (response.ok && data.success) {
-            showAlert('网站检查完成！', 'success');
-
-            // 如果在详情页面，延迟刷新以显示最新结果
-            if (window.location.pathname.includes('/website/')) {
-                setTimeout(() => {
-                    window.location.reload();
-                }, 1500);
-            }
-        } else {
-            throw new Error(data.error || '检查失败');
+        const jobs = await waitForCheckJobs(data.jobs.map(job => job.id), 600000);
+        const changed = jobs.filter(job => job.outcome === 'changed').length;
+        const failed = jobs.filter(job => job.status === 'failed').length;
+        showAlert(`已检查 ${jobs.length} 个网站：${changed} 个有变化，${failed} 个失败`, failed ? 'warning' : 'success');
+        if (typeof refreshStatus === 'function') {
+            refreshStatus();
         }
     } catch (error) {
         showAlert(`检查失败: ${error.message}`, 'danger');
     } finally {
-        // 恢复按钮状态
         button.innerHTML = originalContent;
         button.disabled = false;
     }
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+
+
+class BackgroundLoop:
+    """在独立线程中长期运行的事件循环，同步代码通过submit提交协程"""
+
+    def __init__(self, name='background-loop'):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        self.start()
+        return self._loop
+
+    def start(self):
+        """启动事件循环线程（已启动时直接返回）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                ready.set()
+                loop.run_forever()
+
+            self._loop = loop
+            self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def submit(self, coro):
+        """提交协程，返回concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """提交协程并阻塞等待结果"""
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        """停止事件循环线程"""
+        with self._lock:
+            if not self._thread or not self._thread.is_alive():
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class InflightRequests:
+    """合并同一事件循环中相同键的并发请求：请求完成前，后到的调用方等待并共享同一结果"""
+
+    def __init__(self):
+        self._tasks = {}
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def _discard(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    async def run(self, key, coro_factory):
+        """key相同的请求正在进行时等待其结果，否则执行coro_factory()"""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._discard(key, done))
+        # 某个调用方被取消时不影响共享同一请求的其他调用方
+        return await asyncio.shield(task)
@@ -0,0 +1,13 @@
+from flask import current_app, jsonify, request
+
+
+def conditional_json(etag, build):
+    """带ETag的JSON响应，客户端数据未变化时直接返回304，不再生成响应体"""
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    # 允许浏览器缓存，但每次使用前都要向服务器验证
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,75 @@
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+class KeysetPage:
+    """按 (created_at, id) 倒序的游标分页结果"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor  # 更早一页
+        self.prev_cursor = prev_cursor  # 更新一页
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(record):
+    raw = f'{record.created_at.isoformat()}|{record.id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，格式错误时返回None"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, record_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_paginate(query, model, per_page, cursor=None, direction='next'):
+    """游标分页：按 (created_at, id) 定位，页数再深也只需一次索引范围扫描
+
+    direction为next时返回cursor之后（更早）的记录，为prev时返回cursor之前（更新）的记录
+    """
+    position = decode_cursor(cursor)
+    created_at, record_id = model.created_at, model.id
+
+    if position is None:
+        direction = 'next'
+    elif direction == 'prev':
+        query = query.filter(or_(
+            created_at > position[0],
+            and_(created_at == position[0], record_id > position[1])
+        ))
+    else:
+        query = query.filter(or_(
+            created_at < position[0],
+            and_(created_at == position[0], record_id < position[1])
+        ))
+
+    if direction == 'prev':
+        rows = query.order_by(created_at.asc(), record_id.asc()).limit(per_page + 1).all()
+        more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_newer, has_older = more, True
+    else:
+        rows = query.order_by(created_at.desc(), record_id.desc()).limit(per_page + 1).all()
+        items = rows[:per_page]
+        has_newer, has_older = position is not None, len(rows) > per_page
+
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1]) if items and has_older else None,
+        prev_cursor=encode_cursor(items[0]) if items and has_newer else None
+    )
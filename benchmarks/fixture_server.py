@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+本地模拟网站服务器（离线基准测试用）
+
+/site/<n>            第n个模拟网站，可配置延迟、页面大小、ETag和失败率
+POST /_control/advance  每个网站按变化概率更新一次版本
+POST /_control/reset    清零统计
+GET  /_stats            请求、304、失败和Webhook计数
+POST /webhook           模拟企业微信机器人，记录收到的消息
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ['监控', '网站', '内容', '更新', '公告', '通知', '产品', '价格', '新闻', '动态',
+         'alpha', 'beta', 'gamma', 'delta', 'release', 'notice', 'update', 'price', 'item', 'list']
+
+
+class FixtureState:
+    """所有模拟网站的版本和统计计数"""
+
+    def __init__(self, sites, size_bytes, change_prob, failure_rate, latency_ms, latency_jitter_ms,
+                 etag=True, seed=42):
+        self.sites = sites
+        self.change_prob = change_prob
+        self.failure_rate = failure_rate
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.etag = etag
+        self.random = random.Random(seed)
+        self.versions = [0] * sites
+        self.filler = self._filler(size_bytes, seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def _filler(self, size_bytes, seed):
+        """生成固定的正文段落，使页面大小接近size_bytes"""
+        rng = random.Random(seed)
+        parts = []
+        length = 0
+        while length < size_bytes:
+            paragraph = '<p>' + ' '.join(rng.choice(WORDS) for _ in range(40)) + '</p>\n'
+            parts.append(paragraph)
+            length += len(paragraph.encode('utf-8'))
+        return ''.join(parts)
+
+    def reset(self):
+        with self.lock:
+            self.stats = {'requests': 0, 'not_modified': 0, 'failures': 0, 'webhooks': 0, 'webhook_items': 0}
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def advance(self):
+        changed = 0
+        with self.lock:
+            for index in range(self.sites):
+                if self.random.random() < self.change_prob:
+                    self.versions[index] += 1
+                    changed += 1
+        return changed
+
+    def page(self, index):
+        version = self.versions[index]
+        body = (
+            f'<html><head><meta charset="utf-8"><title>Fixture site {index}</title>'
+            f'<script>var nonce = {random.random()};</script></head>'
+            f'<body><h1>Fixture site {index}</h1><p class="revision">revision {version}</p>'
+            f'{self.filler}<p>关键词 release {version}</p></body></html>'
+        )
+        return version, body.encode('utf-8')
+
+    def delay(self):
+        jitter = random.uniform(-self.latency_jitter_ms, self.latency_jitter_ms) if self.latency_jitter_ms else 0
+        return max(self.latency_ms + jitter, 0) / 1000.0
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def _send(self, status, body=b'', content_type='text/html; charset=utf-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _json(self, data):
+        self._send(200, json.dumps(data).encode('utf-8'), 'application/json')
+
+    def do_GET(self):
+        state = self.state
+        if self.path == '/_stats':
+            with state.lock:
+                self._json(dict(state.stats, versions=sum(state.versions)))
+            return
+
+        if not self.path.startswith('/site/'):
+            self._send(404)
+            return
+        try:
+            index = int(self.path.split('/')[2].split('?')[0])
+            if not 0 <= index < state.sites:
+                raise ValueError
+        except (ValueError, IndexError):
+            self._send(404)
+            return
+
+        state.count('requests')
+        time.sleep(state.delay())
+
+        if state.failure_rate and random.random() < state.failure_rate:
+            state.count('failures')
+            self._send(503, b'unavailable')
+            return
+
+        version, body = state.page(index)
+        etag = f'"{index}-{version}"'
+        if state.etag and self.headers.get('If-None-Match') == etag:
+            state.count('not_modified')
+            self._send(304, headers={'ETag': etag})
+            return
+        self._send(200, body, headers={'ETag': etag} if state.etag else None)
+
+    def do_POST(self):
+        state = self.state
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = self.rfile.read(length) if length else b''
+
+        if self.path == '/_control/advance':
+            self._json({'changed': state.advance()})
+        elif self.path == '/_control/reset':
+            state.reset()
+            self._json({'ok': True})
+        elif self.path.startswith('/webhook'):
+            state.count('webhooks')
+            try:
+                # 与NotificationService一致：text消息，每个变化一段“📍 网站:”
+                content = json.loads(payload or b'{}').get('text', {}).get('content', '')
+                state.count('webhook_items', content.count('📍 网站:'))
+            except ValueError:
+                pass
+            self._json({'errcode': 0, 'errmsg': 'ok'})
+        else:
+            self._send(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(host, port, state):
+    handler = type('Handler', (FixtureHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟网站服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--sites', type=int, default=1000)
+    parser.add_argument('--size-bytes', type=int, default=50000)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--latency-jitter-ms', type=float, default=20)
+    parser.add_argument('--change-prob', type=float, default=0.05)
+    parser.add_argument('--failure-rate', type=float, default=0.01)
+    parser.add_argument('--no-etag', action='store_true')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    state = FixtureState(args.sites, args.size_bytes, args.change_prob, args.failure_rate,
+                         args.latency_ms, args.latency_jitter_ms, etag=not args.no_etag, seed=args.seed)
+    server = create_server(args.host, args.port, state)
+    print(f"Fixture server listening on http://{args.host}:{args.port} ({args.sites} sites)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
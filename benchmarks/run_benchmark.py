@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+离线基准测试
+
+启动本地模拟网站服务器，在临时SQLite数据库中创建大量网站，测量：
+  - 全量检查（monitor_all_websites）的耗时、每秒检查数、抓取延迟P50/P99、SQL次数
+  - 按租约调度检查（调度器dispatch_due_websites和独立worker的run_once）的吞吐和SQL次数
+  - 通知分发到模拟Webhook的耗时
+  - 主要API接口的延迟和每次请求的SQL次数
+  - 可选：BrowserFetcher渲染吞吐（需要已安装Playwright浏览器）
+  - 进程内存占用
+
+结果可保存为JSON，并与之前保存的基线比较，超出容差时以非零状态退出。
+
+用法:
+  python benchmarks/run_benchmark.py --sites 2000 --sweeps 3 --save results.json
+  python benchmarks/run_benchmark.py --sites 2000 --compare results.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 指标名以这些后缀结尾时越大越好，其余越小越好
+HIGHER_IS_BETTER = ('_per_sec',)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='网站监控离线基准测试')
+    parser.add_argument('--sites', type=int, default=1000, help='模拟网站数量')
+    parser.add_argument('--sweeps', type=int, default=3, help='全量检查轮数')
+    parser.add_argument('--size-bytes', type=int, default=50000, help='页面大小')
+    parser.add_argument('--latency-ms', type=float, default=50, help='模拟网站响应延迟')
+    parser.add_argument('--latency-jitter-ms', type=float, default=20)
+    parser.add_argument('--change-prob', type=float, default=0.05, help='每轮之间网站发生变化的概率')
+    parser.add_argument('--failure-rate', type=float, default=0.01, help='请求返回503的概率')
+    parser.add_argument('--no-etag', action='store_true', help='模拟网站不返回ETag')
+    parser.add_argument('--keyword-ratio', type=float, default=0.1, help='配置关键词的网站比例')
+    parser.add_argument('--api-requests', type=int, default=20, help='每个API接口的请求次数')
+    parser.add_argument('--browser', type=int, default=0, help='BrowserFetcher渲染的页面数，0为跳过')
+    parser.add_argument('--port', type=int, default=8900, help='模拟网站服务器端口')
+    parser.add_argument('--database-url', help='使用指定数据库而不是临时SQLite文件')
+    parser.add_argument('--save', help='将结果保存为JSON文件')
+    parser.add_argument('--compare', help='与之前保存的基线JSON比较')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的性能退化比例')
+    parser.add_argument('--verbose', action='store_true', help='显示监控过程的输出')
+    return parser.parse_args()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(fraction * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def current_rss_mb():
+    """当前进程的常驻内存，非Linux系统返回峰值"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS以字节为单位，Linux以KB为单位
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class FixtureProcess:
+    """在独立进程中运行模拟网站服务器，避免与被测代码争用GIL"""
+
+    def __init__(self, args):
+        self.base_url = f'http://127.0.0.1:{args.port}'
+        command = [
+            sys.executable, os.path.join(ROOT, 'benchmarks', 'fixture_server.py'),
+            '--port', str(args.port), '--sites', str(args.sites),
+            '--size-bytes', str(args.size_bytes), '--latency-ms', str(args.latency_ms),
+            '--latency-jitter-ms', str(args.latency_jitter_ms), '--change-prob', str(args.change_prob),
+            '--failure-rate', str(args.failure_rate)
+        ]
+        if args.no_etag:
+            command.append('--no-etag')
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+        deadline = time.time() + 10
+        while True:
+            try:
+                self.stats()
+                break
+            except OSError:
+                if self.process.poll() is not None or time.time() > deadline:
+                    raise RuntimeError('Fixture server failed to start')
+                time.sleep(0.1)
+
+    def _request(self, path, method='GET'):
+        request = urllib.request.Request(self.base_url + path, data=b'' if method == 'POST' else None,
+                                         method=method)
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read())
+
+    def stats(self):
+        return self._request('/_stats')
+
+    def advance(self):
+        return self._request('/_control/advance', 'POST')['changed']
+
+    def reset(self):
+        self._request('/_control/reset', 'POST')
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class QueryCounter:
+    """统计执行的SQL语句数"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def reset(self):
+        count, self.count = self.count, 0
+        return count
+
+
+def configure_environment(args, workdir, fixture):
+    """在导入应用配置之前设置环境变量"""
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ['WEBHOOK_URL'] = f'{fixture.base_url}/webhook'
+    os.environ['MONITOR_MODE'] = 'web'
+    os.environ['SNAPSHOT_RETENTION_DAYS'] = '30'
+    # 所有模拟网站位于同一主机，关闭按主机的礼貌限速，测量的是抓取管线本身的吞吐
+    os.environ.setdefault('FETCH_HOST_RATE', '0')
+    os.environ.setdefault('FETCH_PER_HOST_LIMIT', os.getenv('FETCH_MAX_CONCURRENCY', '50'))
+    os.environ.setdefault('NOTIFY_DIGEST_WINDOW', '0')
+    os.environ.setdefault('NOTIFY_RATE_LIMIT', '100000')
+    # 调度器启动时不分散已到期的网站，全部立即检查
+    os.environ.setdefault('SCHEDULER_STARTUP_SPREAD', '0')
+
+
+def seed_websites(db, args, fixture):
+    from app.models import Website, Keyword
+
+    rows = [{
+        'name': f'Fixture site {index}',
+        'url': f'{fixture.base_url}/site/{index}',
+        'check_interval': 300,
+        'is_active': True
+    } for index in range(args.sites)]
+    db.session.execute(db.insert(Website), rows)
+    db.session.commit()
+
+    keyword_every = int(1 / args.keyword_ratio) if args.keyword_ratio > 0 else 0
+    if keyword_every:
+        website_ids = db.session.execute(db.select(Website.id).order_by(Website.id)).scalars().all()
+        db.session.execute(db.insert(Keyword), [
+            {'website_id': website_id, 'keyword': 'release', 'is_active': True}
+            for website_id in website_ids[::keyword_every]
+        ])
+        db.session.commit()
+
+
+def quiet(verbose):
+    return contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+
+
+def bench_sweeps(db, args, fixture, counter):
+    from app.models import CheckResult
+    from app.services.monitor import WebsiteMonitor
+
+    monitor = WebsiteMonitor()
+    sweeps = []
+    for sweep in range(args.sweeps):
+        # 第一轮为冷启动（所有网站首次抓取），之后每轮前按概率更新网站内容
+        changed = fixture.advance() if sweep else args.sites
+        fixture.reset()
+        last_id = db.session.execute(db.select(db.func.max(CheckResult.id))).scalar() or 0
+        db.session.remove()
+
+        counter.reset()
+        started = time.perf_counter()
+        with quiet(args.verbose):
+            monitor.monitor_all_websites()
+        wall = time.perf_counter() - started
+        queries = counter.reset()
+
+        latencies = db.session.execute(
+            db.select(CheckResult.latency_ms).where(CheckResult.id > last_id, CheckResult.latency_ms.isnot(None))
+        ).scalars().all()
+        server = fixture.stats()
+        db.session.remove()
+
+        sweeps.append({
+            'sweep': sweep + 1,
+            'changed_sites': changed,
+            'wall_seconds': round(wall, 3),
+            'checks_per_sec': round(args.sites / wall, 1) if wall else None,
+            'fetch_p50_ms': percentile(latencies, 0.50),
+            'fetch_p99_ms': percentile(latencies, 0.99),
+            'queries': queries,
+            'queries_per_check': round(queries / args.sites, 2) if args.sites else None,
+            'http_requests': server['requests'],
+            'not_modified': server['not_modified'],
+            'server_failures': server['failures'],
+            'rss_mb': current_rss_mb()
+        })
+        print(f"  sweep {sweep + 1}: {wall:.2f}s, {sweeps[-1]['checks_per_sec']} checks/s, "
+              f"p50 {sweeps[-1]['fetch_p50_ms']}ms, p99 {sweeps[-1]['fetch_p99_ms']}ms, {queries} queries")
+    return sweeps
+
+
+def bench_leased(app, db, args, fixture, counter):
+    """所有网站到期后分别由调度器和worker按租约检查一轮"""
+    from app.models import CheckResult, Website
+    from app.services.scheduler import MonitorScheduler
+    from app.services.worker import MonitorWorker
+
+    scheduler = MonitorScheduler(app)
+    worker = MonitorWorker(app)
+    modes = {
+        'scheduler': scheduler.dispatch_due_websites,
+        'worker': worker.run_once
+    }
+    results = {}
+    for mode, run in modes.items():
+        changed = fixture.advance()
+        fixture.reset()
+        db.session.execute(db.update(Website).values(
+            next_check_at=datetime.utcnow() - timedelta(seconds=1), lease_owner=None, lease_expires_at=None))
+        db.session.commit()
+        last_id = db.session.execute(db.select(db.func.max(CheckResult.id))).scalar() or 0
+        db.session.remove()
+
+        counter.reset()
+        started = time.perf_counter()
+        with quiet(args.verbose):
+            if mode == 'scheduler':
+                # 强制重新同步，所有网站立即到期
+                scheduler._last_sync = 0
+                run()
+            else:
+                while run():
+                    db.session.remove()
+        wall = time.perf_counter() - started
+        queries = counter.reset()
+
+        checked = db.session.execute(
+            db.select(db.func.count(CheckResult.id)).where(CheckResult.id > last_id)
+        ).scalar()
+        db.session.remove()
+
+        results[mode] = {
+            'changed_sites': changed,
+            'checked': checked,
+            'wall_seconds': round(wall, 3),
+            'checks_per_sec': round(checked / wall, 1) if wall else None,
+            'queries': queries,
+            'queries_per_check': round(queries / checked, 2) if checked else None,
+            'http_requests': fixture.stats()['requests']
+        }
+        print(f"  {mode}: {checked} checks in {wall:.2f}s, {results[mode]['checks_per_sec']} checks/s, "
+              f"{queries} queries")
+    return results
+
+
+def bench_notifications(db, args, fixture, counter):
+    from app.services.notification_dispatcher import NotificationDispatcher
+
+    dispatcher = NotificationDispatcher()
+    counter.reset()
+    started = time.perf_counter()
+    delivered = 0
+    with quiet(args.verbose):
+        while True:
+            sent = dispatcher.dispatch_pending()
+            db.session.remove()
+            if not sent:
+                break
+            delivered += sent
+    wall = time.perf_counter() - started
+    server = fixture.stats()
+    return {
+        'delivered_changes': delivered,
+        'webhook_posts': server['webhooks'],
+        'webhook_items': server['webhook_items'],
+        'wall_seconds': round(wall, 3),
+        'queries': counter.reset()
+    }
+
+
+def bench_api(app, db, args, counter):
+    from app.models import Website
+
+    website_id = db.session.execute(db.select(Website.id).limit(1)).scalar()
+    db.session.remove()
+    routes = [
+        '/api/websites',
+        f'/api/websites/{website_id}',
+        f'/api/websites/{website_id}/uptime',
+        f'/api/websites/{website_id}/latency',
+        '/api/changes',
+        '/api/status',
+        '/api/system/status',
+        '/api/logs',
+        '/'
+    ]
+
+    client = app.test_client()
+    results = {}
+    for route in routes:
+        timings = []
+        counter.reset()
+        for _ in range(args.api_requests):
+            started = time.perf_counter()
+            response = client.get(route)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                print(f"  {route} returned {response.status_code}")
+                break
+        results[route] = {
+            'p50_ms': round(percentile(timings, 0.50), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'queries_per_request': round(counter.reset() / len(timings), 1)
+        }
+        print(f"  {route}: p50 {results[route]['p50_ms']}ms, p99 {results[route]['p99_ms']}ms, "
+              f"{results[route]['queries_per_request']} queries/request")
+    return results
+
+
+def bench_browser(args, fixture):
+    try:
+        from app.services.browser_fetcher import BrowserFetcher
+        fetcher = BrowserFetcher()
+        urls = [f'{fixture.base_url}/site/{index % args.sites}' for index in range(args.browser)]
+
+        # 预热：启动浏览器和上下文
+        fetcher.submit_render(urls[0]).result(timeout=60)
+
+        started = time.perf_counter()
+        futures = [fetcher.submit_render(url) for url in urls]
+        rendered = sum(1 for future in futures if future.result(timeout=120))
+        wall = time.perf_counter() - started
+    except Exception as e:
+        reason = str(e).splitlines()[0] if str(e) else type(e).__name__
+        print(f"  skipped: {reason}")
+        return {'skipped': reason}
+    finally:
+        with contextlib.suppress(Exception):
+            from app.services.browser_fetcher import get_browser_pool
+            get_browser_pool().shutdown()
+
+    print(f"  rendered {rendered}/{len(urls)} pages in {wall:.2f}s")
+    return {
+        'rendered': rendered,
+        'wall_seconds': round(wall, 3),
+        'pages_per_sec': round(rendered / wall, 2) if wall else None
+    }
+
+
+def flatten(results):
+    """提取用于基线比较的关键指标"""
+    metrics = {}
+    sweeps = results['sweeps']
+    if sweeps:
+        metrics['cold_sweep_seconds'] = sweeps[0]['wall_seconds']
+        warm = sweeps[1:] or sweeps
+        metrics['warm_sweep_seconds'] = percentile([s['wall_seconds'] for s in warm], 0.5)
+        metrics['warm_checks_per_sec'] = percentile([s['checks_per_sec'] for s in warm], 0.5)
+        metrics['warm_queries_per_check'] = percentile([s['queries_per_check'] for s in warm], 0.5)
+    for mode, values in results.get('leased', {}).items():
+        metrics[f'{mode}_checks_per_sec'] = values['checks_per_sec']
+        metrics[f'{mode}_queries_per_check'] = values['queries_per_check']
+    for route, values in results['api'].items():
+        metrics[f'api {route} p99_ms'] = values['p99_ms']
+        metrics[f'api {route} queries'] = values['queries_per_request']
+    if 'pages_per_sec' in results.get('browser', {}):
+        metrics['browser_pages_per_sec'] = results['browser']['pages_per_sec']
+    metrics['peak_rss_mb'] = results['peak_rss_mb']
+    return metrics
+
+
+def compare(current, baseline, tolerance):
+    """返回超出容差的退化指标列表"""
+    regressions = []
+    for name, value in current.items():
+        previous = baseline.get(name)
+        if value is None or not previous:
+            continue
+        if name.endswith(HIGHER_IS_BETTER):
+            change = (previous - value) / previous
+        else:
+            change = (value - previous) / previous
+        marker = ''
+        if change > tolerance:
+            regressions.append(name)
+            marker = '  <-- regression'
+        print(f"  {name}: {previous} -> {value} ({change:+.0%}){marker}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='monitor-bench-')
+    fixture = FixtureProcess(args)
+    try:
+        configure_environment(args, workdir, fixture)
+
+        from flask_migrate import upgrade
+        from app import create_app, db
+
+        app = create_app()
+        with app.app_context():
+            upgrade(directory=os.path.join(ROOT, 'migrations'))
+            seed_websites(db, args, fixture)
+            counter = QueryCounter(db.engine)
+
+            print(f"Benchmarking {args.sites} sites, {args.sweeps} sweeps "
+                  f"({args.size_bytes} bytes, {args.latency_ms}ms latency, "
+                  f"{args.change_prob:.0%} change, {args.failure_rate:.0%} failures)")
+            print("Sweeps:")
+            results = {'config': vars(args), 'sweeps': bench_sweeps(db, args, fixture, counter)}
+
+            print("Leased checks:")
+            results['leased'] = bench_leased(app, db, args, fixture, counter)
+
+            print("Notifications:")
+            results['notifications'] = bench_notifications(db, args, fixture, counter)
+            print(f"  {results['notifications']['delivered_changes']} changes in "
+                  f"{results['notifications']['webhook_posts']} webhook posts "
+                  f"({results['notifications']['webhook_items']} items), "
+                  f"{results['notifications']['wall_seconds']}s")
+
+            print("API:")
+            results['api'] = bench_api(app, db, args, counter)
+
+        if args.browser:
+            print("Browser:")
+            results['browser'] = bench_browser(args, fixture)
+
+        results['peak_rss_mb'] = peak_rss_mb()
+        results['metrics'] = flatten(results)
+        print(f"Peak RSS: {results['peak_rss_mb']} MB")
+    finally:
+        fixture.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Results saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare} (tolerance {args.tolerance:.0%}, positive means worse):")
+        differing = [key for key in ('sites', 'size_bytes', 'latency_ms', 'change_prob', 'failure_rate')
+                     if baseline.get('config', {}).get(key) != getattr(args, key)]
+        if differing:
+            print(f"  warning: baseline was run with different {', '.join(differing)}")
+        regressions = compare(results['metrics'], baseline.get('metrics', {}), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
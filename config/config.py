@@ -7,6 +7,10 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///website_monitor.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLite调优（WAL模式下读写互不阻塞；同步级别；等待写锁的毫秒数）
+    SQLITE_WAL = os.getenv('SQLITE_WAL', 'True').lower() == 'true'
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
 
     # Email配置
     SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
@@ -18,6 +22,124 @@ class Config:
     # Webhook配置
     WEBHOOK_URL = os.getenv('WEBHOOK_URL')
 
+    # 抓取配置
+    FETCH_TIMEOUT = int(os.getenv('FETCH_TIMEOUT', 15))
+    FETCH_MAX_CONCURRENCY = int(os.getenv('FETCH_MAX_CONCURRENCY', 50))
+    FETCH_PER_HOST_LIMIT = int(os.getenv('FETCH_PER_HOST_LIMIT', 4))
+    # 单个响应体的最大字节数（解压后），超过即中止读取
+    FETCH_MAX_BYTES = int(os.getenv('FETCH_MAX_BYTES', 10 * 1024 * 1024))
+    # 单主机请求速率（每秒请求数，0表示不限速）和允许的突发请求数
+    FETCH_HOST_RATE = float(os.getenv('FETCH_HOST_RATE', 2))
+    FETCH_HOST_BURST = int(os.getenv('FETCH_HOST_BURST', 4))
+    # 空闲连接保持秒数、DNS缓存秒数（0表示不缓存）、是否启用HTTP/2（需要安装h2）
+    FETCH_KEEPALIVE_EXPIRY = float(os.getenv('FETCH_KEEPALIVE_EXPIRY', 60))
+    FETCH_DNS_TTL = int(os.getenv('FETCH_DNS_TTL', 300))
+    FETCH_HTTP2 = os.getenv('FETCH_HTTP2', 'True').lower() == 'true'
+
+    # 浏览器池配置（上下文数量、每个上下文最多处理的页面数、页面超时毫秒）
+    BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', 2))
+    BROWSER_MAX_PAGES_PER_CONTEXT = int(os.getenv('BROWSER_MAX_PAGES_PER_CONTEXT', 50))
+    BROWSER_PAGE_TIMEOUT = int(os.getenv('BROWSER_PAGE_TIMEOUT', 30000))
+    # 渲染就绪条件：未设置等待选择器时，DOM静止多少毫秒视为加载完成；最长等待毫秒
+    BROWSER_DOM_IDLE_MS = int(os.getenv('BROWSER_DOM_IDLE_MS', 500))
+    BROWSER_READY_TIMEOUT = int(os.getenv('BROWSER_READY_TIMEOUT', 10000))
+    # 渲染时屏蔽的资源类型和域名（逗号分隔）
+    BROWSER_BLOCKED_RESOURCE_TYPES = [t.strip() for t in os.getenv(
+        'BROWSER_BLOCKED_RESOURCE_TYPES', 'image,media,font').split(',') if t.strip()]
+    BROWSER_BLOCKED_DOMAINS = [d.strip() for d in os.getenv(
+        'BROWSER_BLOCKED_DOMAINS',
+        'google-analytics.com,googletagmanager.com,doubleclick.net,hm.baidu.com,cnzz.com,connect.facebook.net'
+    ).split(',') if d.strip()]
+
+    # 内容规范化配置：哈希前去除脚本样式和易变内容
+    # 全局忽略的CSS选择器（可用逗号组合多个）和正则表达式（可用|组合多个）
+    NORMALIZE_CONTENT = os.getenv('NORMALIZE_CONTENT', 'True').lower() == 'true'
+    NORMALIZE_IGNORE_SELECTOR = os.getenv('NORMALIZE_IGNORE_SELECTOR', '')
+    NORMALIZE_IGNORE_PATTERN = os.getenv('NORMALIZE_IGNORE_PATTERN', '')
+
+    # 解析配置（HTML解析器auto/lxml/html.parser，auto在安装了lxml时使用lxml；
+    # 规范化、哈希和差异计算的进程池大小，0表示在当前进程内执行）
+    HTML_PARSER = os.getenv('HTML_PARSER', 'auto').lower()
+    PARSE_POOL_WORKERS = int(os.getenv('PARSE_POOL_WORKERS', 2))
+
+    # 差异配置（差异输出最多行数，超过该文本块数时不再逐块比较）
+    DIFF_MAX_OUTPUT_LINES = int(os.getenv('DIFF_MAX_OUTPUT_LINES', 50))
+    DIFF_MAX_COMPARE_BLOCKS = int(os.getenv('DIFF_MAX_COMPARE_BLOCKS', 4000))
+
+    # 快照配置（压缩方式zlib/zstd，未被引用的快照保留天数）
+    SNAPSHOT_COMPRESSION = os.getenv('SNAPSHOT_COMPRESSION', 'zlib')
+    SNAPSHOT_RETENTION_DAYS = int(os.getenv('SNAPSHOT_RETENTION_DAYS', 30))
+
+    # 调度配置（秒）
+    SCHEDULER_TICK_SECONDS = int(os.getenv('SCHEDULER_TICK_SECONDS', 5))
+    SCHEDULER_RESYNC_SECONDS = int(os.getenv('SCHEDULER_RESYNC_SECONDS', 60))
+    SCHEDULER_STARTUP_SPREAD = int(os.getenv('SCHEDULER_STARTUP_SPREAD', 60))
+    SCHEDULER_JITTER = float(os.getenv('SCHEDULER_JITTER', 0.1))
+
+    # 通知分发配置（分发周期和汇总窗口秒数、所有进程合计每分钟最多消息数，企业微信机器人为20条/分钟）
+    NOTIFY_DISPATCH_SECONDS = int(os.getenv('NOTIFY_DISPATCH_SECONDS', 5))
+    NOTIFY_DIGEST_WINDOW = int(os.getenv('NOTIFY_DIGEST_WINDOW', 30))
+    NOTIFY_RATE_LIMIT = int(os.getenv('NOTIFY_RATE_LIMIT', 20))
+    NOTIFY_BATCH_SIZE = int(os.getenv('NOTIFY_BATCH_SIZE', 50))
+    # 失败重试配置（最多尝试次数、指数退避的基数和上限秒数、请求超时秒数）
+    NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', 8))
+    NOTIFY_BACKOFF_BASE = int(os.getenv('NOTIFY_BACKOFF_BASE', 10))
+    NOTIFY_BACKOFF_MAX = int(os.getenv('NOTIFY_BACKOFF_MAX', 1800))
+    NOTIFY_TIMEOUT = int(os.getenv('NOTIFY_TIMEOUT', 10))
+
+    # 检查历史配置（原始结果保留小时数，分钟/小时/天汇总保留天数，0表示永久保留；汇总周期秒）
+    CHECK_HISTORY_ENABLED = os.getenv('CHECK_HISTORY_ENABLED', 'True').lower() == 'true'
+    CHECK_RAW_RETENTION_HOURS = int(os.getenv('CHECK_RAW_RETENTION_HOURS', 48))
+    CHECK_MINUTE_RETENTION_DAYS = int(os.getenv('CHECK_MINUTE_RETENTION_DAYS', 7))
+    CHECK_HOUR_RETENTION_DAYS = int(os.getenv('CHECK_HOUR_RETENTION_DAYS', 90))
+    CHECK_DAY_RETENTION_DAYS = int(os.getenv('CHECK_DAY_RETENTION_DAYS', 730))
+    CHECK_ROLLUP_SECONDS = int(os.getenv('CHECK_ROLLUP_SECONDS', 60))
+
+    # 手动检查任务（未执行任务的超时秒数、已完成任务保留小时数）
+    CHECK_JOB_TIMEOUT = int(os.getenv('CHECK_JOB_TIMEOUT', 600))
+    CHECK_JOB_RETENTION_HOURS = int(os.getenv('CHECK_JOB_RETENTION_HOURS', 24))
+
+    # 全量检查时每次从数据库读取的网站数
+    SWEEP_CHUNK_SIZE = int(os.getenv('SWEEP_CHUNK_SIZE', 500))
+
+    # 检查结果批量写入（每批网站数、结果最长缓存秒数、写入失败后的重试次数）
+    RESULT_BATCH_SIZE = int(os.getenv('RESULT_BATCH_SIZE', 200))
+    RESULT_FLUSH_SECONDS = float(os.getenv('RESULT_FLUSH_SECONDS', 5))
+    RESULT_FLUSH_RETRIES = int(os.getenv('RESULT_FLUSH_RETRIES', 3))
+
+    # 状态统计缓存与数据库同步的周期（秒）
+    STATS_REFRESH_SECONDS = int(os.getenv('STATS_REFRESH_SECONDS', 10))
+
+    # 实时事件流配置（检查新事件的周期、心跳间隔、重新读取的回看窗口，单位秒）
+    SSE_POLL_SECONDS = float(os.getenv('SSE_POLL_SECONDS', 2))
+    SSE_KEEPALIVE_SECONDS = int(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+    SSE_LOOKBACK_SECONDS = int(os.getenv('SSE_LOOKBACK_SECONDS', 60))
+
+    # 自适应检查频率（间隔上下限秒数、无变化时的间隔增长倍数、学习变化频率的历史天数和最少变化次数）
+    ADAPTIVE_MIN_INTERVAL = int(os.getenv('ADAPTIVE_MIN_INTERVAL', 60))
+    ADAPTIVE_MAX_INTERVAL = int(os.getenv('ADAPTIVE_MAX_INTERVAL', 86400))
+    ADAPTIVE_BACKOFF_FACTOR = float(os.getenv('ADAPTIVE_BACKOFF_FACTOR', 1.5))
+    ADAPTIVE_HISTORY_DAYS = int(os.getenv('ADAPTIVE_HISTORY_DAYS', 30))
+    ADAPTIVE_MIN_SAMPLES = int(os.getenv('ADAPTIVE_MIN_SAMPLES', 3))
+    # 检查失败退避（最长退避秒数）和熔断（连续失败次数阈值、熔断后的探测间隔秒数）
+    FAILURE_BACKOFF_MAX = int(os.getenv('FAILURE_BACKOFF_MAX', 21600))
+    CIRCUIT_BREAKER_THRESHOLD = int(os.getenv('CIRCUIT_BREAKER_THRESHOLD', 5))
+    CIRCUIT_OPEN_SECONDS = int(os.getenv('CIRCUIT_OPEN_SECONDS', 3600))
+
+    # 运行模式：embedded（Web进程内调度检查）、web（只提供HTTP）、coordinator（通知/汇总/清理等单例任务）、worker（领取到期网站执行检查）
+    MONITOR_MODE = os.getenv('MONITOR_MODE', 'embedded').lower()
+    # 检查租约配置（租约有效秒数、worker每次领取的网站数、无到期网站时的轮询秒数）
+    WORKER_ID = os.getenv('WORKER_ID', '')
+    LEASE_TTL_SECONDS = int(os.getenv('LEASE_TTL_SECONDS', 120))
+    WORKER_BATCH_SIZE = int(os.getenv('WORKER_BATCH_SIZE', 50))
+    WORKER_POLL_SECONDS = float(os.getenv('WORKER_POLL_SECONDS', 2))
+
+    # 运行指标（/metrics接口开关，默认关闭、按主机统计的主机数上限、worker和协调进程单独暴露指标的地址和端口，0为不暴露）
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False').lower() == 'true'
+    METRICS_MAX_HOSTS = int(os.getenv('METRICS_MAX_HOSTS', 50))
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+
     # 应用配置
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', 5000))
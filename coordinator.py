@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+网站监控系统协调进程
+运行通知分发、检查历史汇总、数据清理和租约回收，整个部署只需运行一个
+"""
+
+import signal
+import threading
+from app import create_app
+from app.services.scheduler import MonitorScheduler
+from app.services.metrics import start_metrics_server
+from config.config import Config
+
+# 创建Flask应用
+app = create_app()
+
+if __name__ == '__main__':
+    # 协调进程不提供HTTP服务，需要时单独暴露指标
+    if Config.METRICS_ENABLED and Config.METRICS_PORT:
+        start_metrics_server(Config.METRICS_PORT)
+
+    scheduler = MonitorScheduler(app, role='coordinator')
+    scheduler.start_monitoring()
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopped.set())
+    stopped.wait()
+
+    scheduler.stop_monitoring()
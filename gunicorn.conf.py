@@ -0,0 +1,24 @@
+"""
+Gunicorn配置（Gunicorn默认读取工作目录下的本文件）
+
+设置PROMETHEUS_MULTIPROC_DIR时，各worker的指标写入该目录，任一worker响应/metrics都会合并所有worker的数据
+"""
+
+import glob
+import os
+
+
+def on_starting(server):
+    """启动前清除上次运行留下的指标文件"""
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for filename in glob.glob(os.path.join(path, '*.db')):
+            os.remove(filename)
+
+
+def child_exit(server, worker):
+    """worker退出后不再计入按存活进程求和的仪表，计数器和直方图的累计值保留"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -102,13 +102,8 @@ fi
 
 # 初始化数据库
 echo "初始化数据库..."
-python3 -c "
-from app import create_app, db
-app = create_app()
-with app.app_context():
-    db.create_all()
-    print('数据库初始化完成')
-"
+# 使用db.create_all创建的旧版本数据库需先执行一次: python3 -m flask --app app db stamp 0001_baseline
+python3 -m flask --app app db upgrade
 
 # 创建systemd服务
 echo -e "${YELLOW}创建系统服务...${NC}"
@@ -122,7 +117,7 @@ Type=simple
 User=$(whoami)
 WorkingDirectory=$INSTALL_DIR
 Environment=PATH=$INSTALL_DIR/venv/bin
-ExecStart=$INSTALL_DIR/venv/bin/gunicorn -w 2 -b 127.0.0.1:5000 --timeout 120 run:app
+ExecStart=$INSTALL_DIR/venv/bin/gunicorn -w 2 -k gthread --threads 16 -b 127.0.0.1:5000 --timeout 120 run:app
 Restart=always
 RestartSec=10
 
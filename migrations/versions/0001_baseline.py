@@ -0,0 +1,60 @@
+"""初始版本：网站、变化记录和关键词表（与使用db.create_all创建的旧数据库一致）
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 21:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('websites',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('url', sa.String(length=500), nullable=False),
+    sa.Column('check_interval', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('last_checked', sa.DateTime(), nullable=True),
+    sa.Column('last_content_hash', sa.String(length=64), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('url')
+    )
+    op.create_table('change_records',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('website_id', sa.Integer(), nullable=False),
+    sa.Column('change_type', sa.String(length=50), nullable=True),
+    sa.Column('content_before', sa.Text(), nullable=True),
+    sa.Column('content_after', sa.Text(), nullable=True),
+    sa.Column('diff_content', sa.Text(), nullable=True),
+    sa.Column('matched_keywords', sa.Text(), nullable=True),
+    sa.Column('notification_sent', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('keywords',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('website_id', sa.Integer(), nullable=False),
+    sa.Column('keyword', sa.String(length=100), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('keywords')
+    op.drop_table('change_records')
+    op.drop_table('websites')
@@ -0,0 +1,234 @@
+"""检查流水线：新增快照、通知队列、检查历史和检查任务表，网站和关键词的新列及查询索引，取消URL唯一约束
+
+Revision ID: 0002_monitoring_pipeline
+Revises: 0001_baseline
+Create Date: 2026-10-18 21:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_monitoring_pipeline'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+# SQLite按约定命名旧版本中未命名的唯一约束，批量模式重建表时才能删除
+NAMING_CONVENTION = {'uq': 'uq_%(table_name)s_%(column_0_name)s'}
+
+
+def _url_unique_constraint():
+    """旧版本websites.url上唯一约束的名称，不存在时返回None"""
+    for constraint in sa.inspect(op.get_bind()).get_unique_constraints('websites'):
+        if constraint['column_names'] == ['url']:
+            return constraint['name'] or 'uq_websites_url'
+    return None
+
+
+def upgrade():
+    op.create_table('check_results',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('website_id', sa.Integer(), nullable=False),
+    sa.Column('checked_at', sa.DateTime(), nullable=False),
+    sa.Column('ok', sa.Boolean(), nullable=False),
+    sa.Column('changed', sa.Boolean(), nullable=True),
+    sa.Column('status_code', sa.SmallInteger(), nullable=True),
+    sa.Column('latency_ms', sa.Integer(), nullable=True),
+    sa.Column('ttfb_ms', sa.Integer(), nullable=True),
+    sa.Column('bytes', sa.Integer(), nullable=True),
+    sa.Column('error_class', sa.String(length=50), nullable=True),
+    sa.Column('rolled_up', sa.Boolean(), server_default=sa.false(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('check_results', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_check_results_checked_at'), ['checked_at'], unique=False)
+        batch_op.create_index('ix_check_results_rolled_up_id', ['rolled_up', 'id'], unique=False)
+        batch_op.create_index('ix_check_results_website_id_checked_at', ['website_id', 'checked_at'], unique=False)
+
+    op.create_table('check_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('website_id', sa.Integer(), nullable=False),
+    sa.Column('resolution', sa.String(length=10), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('checks', sa.Integer(), nullable=True),
+    sa.Column('successes', sa.Integer(), nullable=True),
+    sa.Column('changes', sa.Integer(), nullable=True),
+    sa.Column('latency_count', sa.Integer(), nullable=True),
+    sa.Column('latency_sum', sa.BigInteger(), nullable=True),
+    sa.Column('latency_max', sa.Integer(), nullable=True),
+    sa.Column('ttfb_sum', sa.BigInteger(), nullable=True),
+    sa.Column('bytes_sum', sa.BigInteger(), nullable=True),
+    sa.Column('latency_histogram', sa.Text(), nullable=True),
+    sa.Column('errors', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('website_id', 'resolution', 'bucket_start', name='uq_check_rollups_bucket')
+    )
+    with op.batch_alter_table('check_rollups', schema=None) as batch_op:
+        batch_op.create_index('ix_check_rollups_resolution_bucket_start', ['resolution', 'bucket_start'], unique=False)
+
+    op.create_table('notification_sends',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=False),
+    sa.Column('slots', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notification_sends', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notification_sends_sent_at'), ['sent_at'], unique=False)
+
+    op.create_table('rollup_watermarks',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('snapshots',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('codec', sa.String(length=10), nullable=False),
+    sa.Column('body', sa.LargeBinary(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_seen_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+    with op.batch_alter_table('snapshots', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_snapshots_last_seen_at'), ['last_seen_at'], unique=False)
+
+    op.create_table('check_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('website_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('outcome', sa.String(length=20), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('check_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_check_jobs_website_status', ['website_id', 'status'], unique=False)
+
+    op.create_table('notification_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('change_record_id', sa.Integer(), nullable=False),
+    sa.Column('website_id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['change_record_id'], ['change_records.id'], ),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notification_outbox', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notification_outbox_change_record_id'), ['change_record_id'], unique=False)
+        batch_op.create_index('ix_notification_outbox_sent_at', ['sent_at'], unique=False)
+        batch_op.create_index('ix_notification_outbox_status_next_attempt', ['status', 'next_attempt_at'], unique=False)
+
+    with op.batch_alter_table('change_records', schema=None) as batch_op:
+        batch_op.create_index('ix_change_records_created_at', ['created_at'], unique=False)
+        batch_op.create_index('ix_change_records_website_id_created_at', ['website_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('keywords', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('match_mode', sa.String(length=20), server_default='plain', nullable=True))
+        batch_op.add_column(sa.Column('case_sensitive', sa.Boolean(), server_default=sa.false(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_keywords_website_id'), ['website_id'], unique=False)
+
+    # 多个网站可以监控同一URL，抓取时合并
+    url_unique = _url_unique_constraint()
+    with op.batch_alter_table('websites', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        if url_unique:
+            batch_op.drop_constraint(url_unique, type_='unique')
+        batch_op.add_column(sa.Column('render_js', sa.Boolean(), server_default=sa.false(), nullable=True))
+        batch_op.add_column(sa.Column('wait_selector', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('dom_idle_ms', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('content_selector', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('ignore_selectors', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('ignore_patterns', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('last_raw_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('hash_range', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('etag', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('last_modified', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('keywords_updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('adaptive_interval', sa.Boolean(), server_default=sa.false(), nullable=True))
+        batch_op.add_column(sa.Column('min_interval', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('max_interval', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('effective_interval', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('consecutive_failures', sa.Integer(), server_default='0', nullable=True))
+        batch_op.add_column(sa.Column('next_check_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('lease_owner', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_websites_last_checked'), ['last_checked'], unique=False)
+        batch_op.create_index(batch_op.f('ix_websites_next_check_at'), ['next_check_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_websites_url'), ['url'], unique=False)
+
+
+
+def downgrade():
+    with op.batch_alter_table('websites', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_websites_url'))
+        batch_op.drop_index(batch_op.f('ix_websites_next_check_at'))
+        batch_op.drop_index(batch_op.f('ix_websites_last_checked'))
+        batch_op.drop_column('lease_expires_at')
+        batch_op.drop_column('lease_owner')
+        batch_op.drop_column('next_check_at')
+        batch_op.drop_column('consecutive_failures')
+        batch_op.drop_column('effective_interval')
+        batch_op.drop_column('max_interval')
+        batch_op.drop_column('min_interval')
+        batch_op.drop_column('adaptive_interval')
+        batch_op.drop_column('keywords_updated_at')
+        batch_op.drop_column('last_modified')
+        batch_op.drop_column('etag')
+        batch_op.drop_column('hash_range')
+        batch_op.drop_column('last_raw_hash')
+        batch_op.drop_column('ignore_patterns')
+        batch_op.drop_column('ignore_selectors')
+        batch_op.drop_column('content_selector')
+        batch_op.drop_column('dom_idle_ms')
+        batch_op.drop_column('wait_selector')
+        batch_op.drop_column('render_js')
+        batch_op.create_unique_constraint('uq_websites_url', ['url'])
+
+    with op.batch_alter_table('keywords', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_keywords_website_id'))
+        batch_op.drop_column('case_sensitive')
+        batch_op.drop_column('match_mode')
+
+    with op.batch_alter_table('change_records', schema=None) as batch_op:
+        batch_op.drop_index('ix_change_records_website_id_created_at')
+        batch_op.drop_index('ix_change_records_created_at')
+
+    with op.batch_alter_table('notification_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_outbox_status_next_attempt')
+        batch_op.drop_index('ix_notification_outbox_sent_at')
+        batch_op.drop_index(batch_op.f('ix_notification_outbox_change_record_id'))
+
+    op.drop_table('notification_outbox')
+    with op.batch_alter_table('check_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_check_jobs_website_status')
+
+    op.drop_table('check_jobs')
+    with op.batch_alter_table('snapshots', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_snapshots_last_seen_at'))
+
+    op.drop_table('snapshots')
+    op.drop_table('rollup_watermarks')
+    with op.batch_alter_table('notification_sends', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notification_sends_sent_at'))
+
+    op.drop_table('notification_sends')
+    with op.batch_alter_table('check_rollups', schema=None) as batch_op:
+        batch_op.drop_index('ix_check_rollups_resolution_bucket_start')
+
+    op.drop_table('check_rollups')
+    with op.batch_alter_table('check_results', schema=None) as batch_op:
+        batch_op.drop_index('ix_check_results_website_id_checked_at')
+        batch_op.drop_index('ix_check_results_rolled_up_id')
+        batch_op.drop_index(batch_op.f('ix_check_results_checked_at'))
+
+    op.drop_table('check_results')
@@ -86,6 +86,20 @@ server {
         proxy_read_timeout 60s;
     }
 
+    # 实时事件流（SSE）：关闭缓冲并保持长连接
+    location /api/events {
+        proxy_pass http://127.0.0.1:5000;
+        proxy_set_header Host \$http_host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_buffering off;
+        proxy_cache off;
+        proxy_read_timeout 1h;
+    }
+
     # 静态文件
     location /static/ {
         proxy_pass http://127.0.0.1:5000;
@@ -93,6 +107,18 @@ server {
         add_header Cache-Control "public, immutable";
     }
 
+    # 运行指标（METRICS_ENABLED=True时）只允许本机和内网的Prometheus抓取
+    location = /metrics {
+        allow 127.0.0.1;
+        allow 10.0.0.0/8;
+        allow 172.16.0.0/12;
+        allow 192.168.0.0/16;
+        deny all;
+        access_log off;
+        proxy_pass http://127.0.0.1:5000;
+        proxy_set_header Host \$http_host;
+    }
+
     # 健康检查
     location /health {
         access_log off;
@@ -143,6 +169,20 @@ server {
         proxy_read_timeout 60s;
     }
 
+    # 实时事件流（SSE）：关闭缓冲并保持长连接
+    location /api/events {
+        proxy_pass http://127.0.0.1:5000;
+        proxy_set_header Host \$http_host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_buffering off;
+        proxy_cache off;
+        proxy_read_timeout 1h;
+    }
+
     # 静态文件
     location /static/ {
         proxy_pass http://127.0.0.1:5000;
@@ -150,6 +190,18 @@ server {
         add_header Cache-Control "public, immutable";
     }
 
+    # 运行指标（METRICS_ENABLED=True时）只允许本机和内网的Prometheus抓取
+    location = /metrics {
+        allow 127.0.0.1;
+        allow 10.0.0.0/8;
+        allow 172.16.0.0/12;
+        allow 192.168.0.0/16;
+        deny all;
+        access_log off;
+        proxy_pass http://127.0.0.1:5000;
+        proxy_set_header Host \$http_host;
+    }
+
     # 健康检查
     location /health {
         access_log off;
@@ -6,8 +6,9 @@
 
 import os
 import sys
-from app import create_app, db
+from app import create_app
 from app.services.scheduler import MonitorScheduler
+from config.config import Config
 
 # 创建Flask应用
 app = create_app()
@@ -15,32 +16,27 @@ app = create_app()
 # 全局调度器实例
 scheduler = None
 
-def init_database():
-    """初始化数据库"""
-    with app.app_context():
-        db.create_all()
-        print("Database initialized successfully")
-
 def init_scheduler():
     """初始化并启动调度器"""
     global scheduler
     try:
-        scheduler = MonitorScheduler()
+        scheduler = MonitorScheduler(app)
         scheduler.start_monitoring()
         print("Website monitoring scheduler started")
     except Exception as e:
         print(f"Failed to start monitoring scheduler: {e}")
 
-# 初始化数据库
-init_database()
-
-# 在worker进程中启动调度器
-if __name__ != '__main__':
+# 数据库结构由迁移维护（flask --app app db upgrade），各进程启动时不执行DDL。
+# 解析进程池的子进程以__mp_main__重新导入本模块，不在其中启动调度器；
+# 只有embedded模式在Web进程中检查网站；多个Gunicorn worker通过数据库租约避免重复检查。
+# web模式只提供HTTP，检查由 coordinator.py 和 worker.py 进程执行
+if __name__ not in ('__main__', '__mp_main__') and Config.MONITOR_MODE == 'embedded':
     init_scheduler()
 
 if __name__ == '__main__':
     # 开发模式直接运行
-    init_scheduler()
+    if Config.MONITOR_MODE == 'embedded':
+        init_scheduler()
     app.run(
         host='0.0.0.0',
         port=5000,
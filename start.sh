@@ -55,13 +55,8 @@ pip install -r requirements.txt
 
 # 初始化数据库
 echo "初始化数据库..."
-python3 -c "
-from app import create_app, db
-app = create_app()
-with app.app_context():
-    db.create_all()
-    print('数据库初始化完成')
-"
+# 使用db.create_all创建的旧版本数据库需先执行一次: python3 -m flask --app app db stamp 0001_baseline
+python3 -m flask --app app db upgrade
 
 # 检查端口
 PORT=${PORT:-5000}
@@ -83,7 +78,7 @@ echo
 # 根据环境选择启动方式
 if [[ "${FLASK_ENV}" == "production" ]]; then
     echo "生产环境模式，使用Gunicorn启动..."
-    gunicorn -w 2 -b 0.0.0.0:$PORT --timeout 120 --log-level info run:app
+    gunicorn -w 2 -k gthread --threads 16 -b 0.0.0.0:$PORT --timeout 120 --log-level info run:app
 else
     echo "开发环境模式，使用Flask内置服务器..."
     python3 app.py
@@ -0,0 +1,33 @@
+import os
+import pytest
+from flask_migrate import upgrade
+from app import create_app, db
+from app.models import Website
+from config.config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """使用临时SQLite数据库的应用，表结构由迁移创建"""
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_websites(app):
+    """创建count个网站，返回其ID列表"""
+    def make(count, **values):
+        websites = [Website(name=f'site {index}', url=f'http://example.com/{index}', **values)
+                    for index in range(count)]
+        db.session.add_all(websites)
+        db.session.commit()
+        return [website.id for website in websites]
+    return make
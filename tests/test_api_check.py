@@ -0,0 +1,31 @@
+from app.models import CheckJob
+
+
+def post_check(app, payload):
+    return app.test_client().post('/api/websites/check', json=payload)
+
+
+def test_check_all_active_websites(app, make_websites):
+    active_ids = make_websites(2)
+    make_websites(1, is_active=False)
+
+    for payload in ({'all': True}, {}):
+        response = post_check(app, payload)
+        assert response.status_code == 202
+        assert sorted(job['website_id'] for job in response.get_json()['jobs']) == active_ids
+
+
+def test_check_selected_websites(app, make_websites):
+    website_ids = make_websites(3)
+
+    response = post_check(app, {'website_ids': website_ids[:1]})
+    assert response.status_code == 202
+    assert [job['website_id'] for job in response.get_json()['jobs']] == website_ids[:1]
+
+
+def test_empty_website_ids_is_rejected(app, make_websites):
+    make_websites(2)
+
+    for payload in ({'website_ids': []}, {'website_ids': [1], 'all': True}, {'all': 'yes'}, {'website_ids': ['1']}):
+        assert post_check(app, payload).status_code == 400
+    assert CheckJob.query.count() == 0
@@ -0,0 +1,60 @@
+from datetime import datetime
+from app import db
+from app.models import CheckResult, CheckRollup
+from app.services import check_history
+from app.services.check_history import CheckHistory
+
+
+def add_results(count, website_id=1):
+    checked_at = datetime.utcnow().replace(second=30, microsecond=0)
+    db.session.execute(db.insert(CheckResult), [
+        {'website_id': website_id, 'checked_at': checked_at, 'ok': True, 'latency_ms': 100 + index}
+        for index in range(count)
+    ])
+    db.session.commit()
+
+
+def minute_checks():
+    rollup = CheckRollup.query.filter_by(resolution='minute').one_or_none()
+    return rollup.checks if rollup else 0
+
+
+def test_rollup_marks_results_and_counts_them_once(app):
+    add_results(3)
+    history = CheckHistory()
+
+    assert history.rollup() == 3
+    assert CheckResult.query.filter(CheckResult.rolled_up.is_(False)).count() == 0
+    assert minute_checks() == 3
+
+    # 已汇总的结果不会再次累加
+    assert history.rollup() == 0
+    add_results(2)
+    assert history.rollup() == 2
+    assert minute_checks() == 5
+
+
+def test_rollup_aborts_when_another_process_rolled_up_the_batch(app, monkeypatch):
+    """另一个进程在读取和标记之间汇总了同一批结果时整批回滚，不会重复计数"""
+    add_results(3)
+    first_id = db.session.execute(db.select(db.func.min(CheckResult.id))).scalar()
+    original_bucket_start = check_history.bucket_start
+    raced = []
+
+    def racing_bucket_start(moment, resolution):
+        if not raced:
+            raced.append(True)
+            with db.engine.begin() as conn:
+                conn.execute(db.update(CheckResult).where(CheckResult.id == first_id).values(rolled_up=True))
+        return original_bucket_start(moment, resolution)
+
+    monkeypatch.setattr(check_history, 'bucket_start', racing_bucket_start)
+    history = CheckHistory()
+
+    assert history.rollup() == 0
+    assert CheckRollup.query.count() == 0
+    assert CheckResult.query.filter(CheckResult.rolled_up.is_(False)).count() == 2
+
+    # 下一次只汇总剩下的结果
+    assert history.rollup() == 2
+    assert minute_checks() == 2
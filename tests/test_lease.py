@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import Website
+from app.services.lease import LeaseManager
+
+
+def test_claim_leases_due_websites_once(make_websites):
+    website_ids = make_websites(3)
+    first = LeaseManager(owner='worker-1')
+    second = LeaseManager(owner='worker-2')
+
+    claimed = first.claim(2)
+    assert [website.id for website in claimed] == website_ids[:2]
+    assert all(website.lease_owner == 'worker-1' for website in claimed)
+
+    # 已被持有的网站不会被其他进程领取
+    assert [website.id for website in second.claim(10)] == website_ids[2:]
+    assert second.claim(10) == []
+
+
+def test_claim_skips_websites_not_due_or_inactive(make_websites):
+    future = datetime.utcnow() + timedelta(hours=1)
+    make_websites(1, next_check_at=future)
+    make_websites(1, is_active=False)
+    due_ids = make_websites(1, next_check_at=datetime.utcnow() - timedelta(seconds=1))
+
+    assert [website.id for website in LeaseManager(owner='worker-1').claim(10)] == due_ids
+
+
+def test_claim_prefers_never_checked_websites(make_websites):
+    make_websites(1, next_check_at=datetime.utcnow() - timedelta(minutes=5))
+    new_ids = make_websites(1)
+
+    claimed = LeaseManager(owner='worker-1').claim(1)
+    assert [website.id for website in claimed] == new_ids
+
+
+def test_expired_lease_can_be_claimed_again(make_websites):
+    website_ids = make_websites(1, lease_owner='crashed', lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+
+    claimed = LeaseManager(owner='worker-1').claim(10)
+    assert [website.id for website in claimed] == website_ids
+    assert claimed[0].lease_owner == 'worker-1'
+
+
+def test_claim_restricted_to_website_ids(make_websites):
+    website_ids = make_websites(3)
+    manager = LeaseManager(owner='worker-1')
+
+    assert manager.claim(10, website_ids=[]) == []
+    assert [website.id for website in manager.claim(10, website_ids=website_ids[1:2])] == website_ids[1:2]
+
+
+def test_heartbeat_and_release_only_affect_own_leases(make_websites):
+    website_ids = make_websites(2)
+    first = LeaseManager(owner='worker-1', ttl=60)
+    second = LeaseManager(owner='worker-2', ttl=60)
+    first.claim(1)
+    second.claim(1)
+
+    assert first.heartbeat(website_ids) == 1
+
+    next_check_at = datetime.utcnow() + timedelta(minutes=5)
+    first.release({website_id: {'next_check_at': next_check_at} for website_id in website_ids})
+    db.session.expire_all()
+    released, held = db.session.get(Website, website_ids[0]), db.session.get(Website, website_ids[1])
+    assert released.lease_owner is None and released.lease_expires_at is None
+    assert released.next_check_at == next_check_at
+    assert held.lease_owner == 'worker-2'
+    assert held.next_check_at is None
+
+
+def test_reap_expired_clears_only_expired_leases(make_websites):
+    make_websites(1, lease_owner='crashed', lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+    held_ids = make_websites(1, lease_owner='alive', lease_expires_at=datetime.utcnow() + timedelta(minutes=1))
+
+    assert LeaseManager(owner='worker-1').reap_expired() == 1
+    db.session.expire_all()
+    assert db.session.get(Website, held_ids[0]).lease_owner == 'alive'
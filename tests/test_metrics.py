@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+from app.services.metrics import OTHER_HOST, PipelineMetrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_expose_includes_recorded_and_collected_values():
+    metrics = PipelineMetrics()
+    metrics.checks.labels('changed').inc()
+    metrics.stage_seconds.labels('diff').observe(0.02)
+    metrics.gauge('monitor_scheduler_websites', '调度队列中的网站数', ['state'],
+                  collect=lambda: {('queued',): 3, ('due',): 1})
+
+    text = metrics.expose().decode('utf-8')
+    assert 'monitor_checks_total{outcome="changed"} 1.0' in text
+    assert 'monitor_stage_seconds_count{stage="diff"} 1.0' in text
+    assert 'monitor_scheduler_websites{state="queued"} 3.0' in text
+
+
+def test_host_label_is_capped():
+    metrics = PipelineMetrics(max_hosts=1)
+    assert metrics.host_label('a.example.com') == 'a.example.com'
+    assert metrics.host_label('b.example.com') == OTHER_HOST
+    assert metrics.host_label('a.example.com') == 'a.example.com'
+
+
+def test_multiprocess_mode_merges_processes(tmp_path):
+    """设置PROMETHEUS_MULTIPROC_DIR时，抓取结果包含其他进程记录的指标"""
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    record = ('from app.services.metrics import PipelineMetrics\n'
+              'PipelineMetrics().checks.labels("changed").inc()\n')
+    for _ in range(2):
+        subprocess.run([sys.executable, '-c', record], cwd=ROOT, env=env, check=True)
+
+    expose = 'from app.services.metrics import PipelineMetrics\nprint(PipelineMetrics().expose().decode())\n'
+    output = subprocess.run([sys.executable, '-c', expose], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    assert 'monitor_checks_total{outcome="changed"} 2.0' in output
+
+
+def test_metrics_endpoint_is_disabled_unless_enabled(app):
+    client = app.test_client()
+    app.config['METRICS_ENABLED'] = False
+    assert client.get('/metrics').status_code == 404
+
+    app.config['METRICS_ENABLED'] = True
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert b'monitor_checks_total' in response.data
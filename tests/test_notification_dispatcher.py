@@ -0,0 +1,84 @@
+import json
+from datetime import datetime, timedelta
+from app import db
+from app.models import ChangeRecord, NotificationOutbox, NotificationSend
+from app.services.notification_dispatcher import NotificationDispatcher, RateLimiter
+
+
+def add_outbox_entries(website_id, count):
+    now = datetime.utcnow()
+    entries = []
+    for _ in range(count):
+        record = ChangeRecord(website_id=website_id)
+        record.notifications.append(NotificationOutbox(
+            website_id=website_id, payload=json.dumps({'website_name': 'site'}),
+            created_at=now - timedelta(minutes=1), next_attempt_at=now - timedelta(seconds=1)))
+        db.session.add(record)
+        entries.extend(record.notifications)
+    db.session.commit()
+    return entries
+
+
+def test_claim_takes_each_entry_once(make_websites):
+    website_id = make_websites(1)[0]
+    add_outbox_entries(website_id, 2)
+    first, second = NotificationDispatcher(), NotificationDispatcher()
+
+    now = datetime.utcnow()
+    # 两个进程读到同一批待发送记录，只有先领取的一方成功
+    stale = second._due_entries(now)
+    claimed = first._claim(first._due_entries(now), now)
+    assert len(claimed) == 2
+    assert second._claim(stale, now) == []
+
+    db.session.expire_all()
+    statuses = {entry.status for entry in NotificationOutbox.query}
+    assert statuses == {'sending'}
+    assert second._due_entries(datetime.utcnow()) == []
+
+
+def test_expired_sending_lease_is_claimed_again(make_websites):
+    website_id = make_websites(1)[0]
+    add_outbox_entries(website_id, 1)
+    dispatcher = NotificationDispatcher()
+    now = datetime.utcnow()
+    dispatcher._claim(dispatcher._due_entries(now), now)
+
+    # 发送中的进程崩溃，租约到期后可被重新领取
+    later = now + timedelta(minutes=10)
+    assert len(dispatcher._claim(dispatcher._due_entries(later), later)) == 1
+
+
+def test_rate_limiter_allows_limit_per_window(app):
+    limiter = RateLimiter(2, period=60)
+
+    assert limiter.acquire()
+    assert limiter.acquire()
+    assert not limiter.acquire()
+    assert 0 < limiter.wait_seconds() <= 60
+    # 被拒绝的占用记录已删除
+    assert NotificationSend.query.count() == 2
+
+
+def test_rate_limiter_is_shared_between_instances(app):
+    assert RateLimiter(1, period=60).acquire()
+    assert not RateLimiter(1, period=60).acquire()
+
+
+def test_rate_limiter_frees_slots_after_the_window(app):
+    db.session.add(NotificationSend(sent_at=datetime.utcnow() - timedelta(seconds=61), slots=2))
+    db.session.commit()
+    limiter = RateLimiter(2, period=60)
+
+    assert limiter.wait_seconds() == 0
+    assert limiter.acquire()
+    assert NotificationSend.query.count() == 1
+
+
+def test_rate_limiter_penalize_fills_the_window(app):
+    limiter = RateLimiter(3, period=60)
+    limiter.penalize()
+    db.session.commit()
+
+    assert not limiter.acquire()
+    assert limiter.wait_seconds() > 50
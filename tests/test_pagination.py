@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import ChangeRecord
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_paginate
+
+
+@pytest.fixture
+def records(make_websites):
+    """25条变化记录，每5条的created_at相同，按 (created_at, id) 倒序返回其ID"""
+    website_id = make_websites(1)[0]
+    start = datetime(2024, 1, 1)
+    rows = [ChangeRecord(website_id=website_id, created_at=start + timedelta(minutes=index // 5))
+            for index in range(25)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in sorted(rows, key=lambda row: (row.created_at, row.id), reverse=True)]
+
+
+def paginate(cursor=None, direction='next'):
+    return keyset_paginate(ChangeRecord.query, ChangeRecord, 10, cursor=cursor, direction=direction)
+
+
+def ids(page):
+    return [record.id for record in page.items]
+
+
+def test_next_pages_cover_all_records_in_order(records):
+    pages = [paginate()]
+    while pages[-1].has_next:
+        pages.append(paginate(pages[-1].next_cursor))
+
+    assert [ids(page) for page in pages] == [records[:10], records[10:20], records[20:]]
+    assert not pages[0].has_prev
+    assert pages[1].has_prev and pages[2].has_prev
+    assert not pages[2].has_next
+
+
+def test_prev_page_returns_newer_records(records):
+    second = paginate(paginate().next_cursor)
+    third = paginate(second.next_cursor)
+
+    back = paginate(third.prev_cursor, 'prev')
+    assert ids(back) == records[10:20]
+    assert back.has_next and back.has_prev
+
+    first = paginate(back.prev_cursor, 'prev')
+    assert ids(first) == records[:10]
+    assert not first.has_prev
+
+
+def test_invalid_cursor_returns_first_page(records):
+    page = paginate('not-a-cursor')
+    assert ids(page) == records[:10]
+    assert not page.has_prev
+
+
+def test_cursor_round_trip(records):
+    record = db.session.get(ChangeRecord, records[3])
+    assert decode_cursor(encode_cursor(record)) == (record.created_at, record.id)
+    assert decode_cursor('') is None
@@ -0,0 +1,107 @@
+from datetime import datetime
+import pytest
+from app import db
+from app.models import Website, ChangeRecord
+from app.services.result_writer import ResultWriter
+from config.config import Config
+
+
+@pytest.fixture
+def writer(app, monkeypatch):
+    monkeypatch.setattr(Config, 'RESULT_FLUSH_RETRIES', 2)
+    # 只在显式flush时写入
+    return ResultWriter(batch_size=100, flush_seconds=3600)
+
+
+def fail_writes(writer, monkeypatch, times):
+    """让接下来times次写入在事务中途失败"""
+    calls = []
+    put_many = writer.snapshot_store.put_many
+
+    def flaky_put_many(snapshots):
+        calls.append(True)
+        if len(calls) <= times:
+            raise RuntimeError('database is locked')
+        return put_many(snapshots)
+
+    monkeypatch.setattr(writer.snapshot_store, 'put_many', flaky_put_many)
+
+
+def stored_hash(website_id):
+    db.session.expire_all()
+    return db.session.get(Website, website_id).last_content_hash
+
+
+def test_flush_writes_websites_and_changes(writer, make_websites):
+    website_id = make_websites(1)[0]
+    website = db.session.get(Website, website_id)
+
+    writer.save(website, {'last_checked': datetime.utcnow(), 'last_content_hash': 'a' * 64},
+                change_record=ChangeRecord(website_id=website_id))
+    assert writer.flush() == 1
+
+    assert stored_hash(website_id) == 'a' * 64
+    assert ChangeRecord.query.filter_by(website_id=website_id).count() == 1
+    assert writer.take_unsaved([website_id]) == set()
+
+
+def test_failed_flush_is_retried(writer, make_websites, monkeypatch):
+    website_id = make_websites(1)[0]
+    website = db.session.get(Website, website_id)
+    fail_writes(writer, monkeypatch, 1)
+
+    writer.save(website, {'last_content_hash': 'a' * 64}, change_record=ChangeRecord(website_id=website_id))
+    assert writer.flush() == 0
+    # 等待重试期间仍算作未写入
+    assert writer.take_unsaved([website_id]) == {website_id}
+    assert stored_hash(website_id) is None
+
+    assert writer.flush() == 1
+    assert stored_hash(website_id) == 'a' * 64
+    assert ChangeRecord.query.filter_by(website_id=website_id).count() == 1
+    assert writer.take_unsaved([website_id]) == set()
+
+
+def test_newer_result_wins_over_requeued_one(writer, make_websites, monkeypatch):
+    website_id = make_websites(1)[0]
+    website = db.session.get(Website, website_id)
+    fail_writes(writer, monkeypatch, 1)
+
+    writer.save(website, {'last_content_hash': 'a' * 64})
+    writer.flush()
+    writer.save(website, {'last_content_hash': 'b' * 64})
+    assert writer.flush() == 1
+    assert stored_hash(website_id) == 'b' * 64
+
+
+def test_flush_gives_up_after_retries(writer, make_websites, monkeypatch):
+    website_id, other_id = make_websites(2)
+    fail_writes(writer, monkeypatch, 3)
+
+    writer.save(db.session.get(Website, website_id), {'last_content_hash': 'a' * 64},
+                change_record=ChangeRecord(website_id=website_id))
+    for _ in range(3):
+        assert writer.flush() == 0
+
+    # 放弃后缓冲区清空，调用方得知结果没有写入，且只通知一次
+    assert writer.flush() == 0
+    assert writer.take_unsaved([website_id, other_id]) == {website_id}
+    assert writer.take_unsaved([website_id]) == set()
+    assert stored_hash(website_id) is None
+    assert ChangeRecord.query.count() == 0
+
+
+def test_new_result_replaces_given_up_one(writer, make_websites, monkeypatch):
+    website_id = make_websites(1)[0]
+    website = db.session.get(Website, website_id)
+    fail_writes(writer, monkeypatch, 3)
+
+    writer.save(website, {'last_content_hash': 'a' * 64})
+    for _ in range(3):
+        writer.flush()
+
+    # 之后的检查结果写入成功，不再报告之前放弃的结果
+    writer.save(website, {'last_content_hash': 'b' * 64})
+    assert writer.flush() == 1
+    assert writer.take_unsaved([website_id]) == set()
+    assert stored_hash(website_id) == 'b' * 64
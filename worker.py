@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+网站监控系统检查进程
+领取到期网站的租约并执行检查，可在多台主机上同时运行多个
+"""
+
+from app import create_app
+from app.services.worker import MonitorWorker
+from app.services.metrics import start_metrics_server
+from config.config import Config
+
+# 创建Flask应用
+app = create_app()
+
+if __name__ == '__main__':
+    # 检查进程不提供HTTP服务，需要时单独暴露指标
+    if Config.METRICS_ENABLED and Config.METRICS_PORT:
+        start_metrics_server(Config.METRICS_PORT)
+
+    MonitorWorker(app).run()